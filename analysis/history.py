@@ -0,0 +1,132 @@
+import json
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+REMOVED = ""
+"""The field of the change that marks the entity as removed from the snapshot."""
+
+
+def get_snapshot(database: sqlite3.Connection, day: str | date, clamp: bool = False) -> tuple[int, int]:
+    """Get the latest snapshot taken on or before the day, or the first one if clamped, and its keyframe."""
+
+    row = database.execute(
+        "SELECT id, (SELECT max(id) FROM snapshots AS keyframes WHERE keyframe AND keyframes.id <= snapshots.id) "
+        "FROM snapshots WHERE taken_at <= ? "
+        "ORDER BY taken_at DESC LIMIT 1",
+        (str(day),),
+    ).fetchone()
+
+    # The first snapshot is always a keyframe
+    if not row and clamp:
+        row = database.execute("SELECT id, id FROM snapshots ORDER BY taken_at LIMIT 1").fetchone()
+
+    if not row:
+        raise ValueError(f"History does not contain any snapshot from {day} or earlier")
+
+    return row
+
+
+def load_history(
+    path: str | Path,
+    id: int,
+    fields: list[str],
+    start: str | date | None = None,
+    end: str | date | None = None,
+) -> pd.DataFrame:
+    """Load the values of the entity in each snapshot between the dates, created by the history command."""
+
+    with closing(sqlite3.connect(path)) as database:
+        # The history starts with the first snapshot if the start is before it
+        first, keyframe = get_snapshot(database, start or date.min, clamp=True)
+        last, _ = get_snapshot(database, end or date.max)
+
+        snapshots = database.execute(
+            "SELECT id, taken_at, keyframe FROM snapshots WHERE id BETWEEN ? AND ?", (keyframe, last)
+        ).fetchall()
+        dates = {snapshot: taken_at for snapshot, taken_at, _ in snapshots}
+        keyframes = {snapshot for snapshot, _, is_keyframe in snapshots if is_keyframe}
+
+        # The primary key starts with the entity, so only its own changes are read
+        placeholders = ", ".join("?" * len(fields))
+        rows = database.execute(
+            f"SELECT snapshot, field, value FROM changes WHERE entity = ? AND snapshot BETWEEN ? AND ? "
+            f"AND field IN ('{REMOVED}', {placeholders}) ORDER BY snapshot",
+            (id, keyframe, last, *fields),
+        ).fetchall()
+
+    # The changes are replayed from the keyframe, with removed entities having no values
+    values: dict[str, object] = {}
+    changes = iter(rows)
+    change = next(changes, None)
+    index, history = [], []
+
+    for snapshot in sorted(dates):
+        # Keyframes contain all values of the present entities, but do not mark the removed ones
+        if snapshot in keyframes:
+            values = {}
+
+        while change and change[0] == snapshot:
+            _, field, value = change
+            if field == REMOVED:
+                values = {}
+            elif value is None:
+                values.pop(field, None)
+            else:
+                values[field] = json.loads(value)
+            change = next(changes, None)
+
+        if snapshot >= first:
+            index.append(dates[snapshot])
+            history.append([values.get(field) for field in fields])
+
+    return pd.DataFrame(history, index=pd.DatetimeIndex(index, name="taken_at"), columns=fields)
+
+
+def get_values(database: sqlite3.Connection, field: str, day: str | date) -> pd.Series:
+    """Get the values of the field of all entities in the latest snapshot taken on or before the day."""
+
+    snapshot, keyframe = get_snapshot(database, day)
+
+    # The latest change of each entity since the keyframe contains its value, or marks it as removed
+    rows = database.execute(
+        f"SELECT entity, value, max(snapshot) FROM changes WHERE field IN ('{REMOVED}', ?) "
+        "AND snapshot BETWEEN ? AND ? GROUP BY entity",
+        (field, keyframe, snapshot),
+    )
+
+    return pd.Series(
+        {entity: json.loads(value) for entity, value, _ in rows if value is not None},
+        name=field,
+        dtype=object,
+    )
+
+
+def get_top_movers(
+    path: str | Path,
+    field: str,
+    start: str | date,
+    end: str | date,
+    amount: int = 10,
+    label: str | None = None,
+) -> pd.DataFrame:
+    """Get the entities whose numeric field increased the most between the dates, optionally with their label."""
+
+    with closing(sqlite3.connect(path)) as database:
+        before = get_values(database, field, start).astype(float)
+        after = get_values(database, field, end).astype(float)
+        labels = get_values(database, label, end) if label else None
+
+    # Only entities that are in both snapshots can be compared
+    movers = pd.DataFrame({"before": before, "after": after}).dropna()
+    movers["change"] = movers["after"] - movers["before"]
+    movers = movers.sort_values("change", ascending=False).head(amount)
+
+    if labels is not None:
+        movers.insert(0, label, labels.reindex(movers.index))
+
+    movers.index.name = "id"
+    return movers
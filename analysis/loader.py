@@ -0,0 +1,149 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as parquet
+from matplotlib.axes import Axes
+
+COLUMNAR_SUFFIXES = (".feather", ".parquet")
+"""The suffixes of columnar files, in order of preference."""
+
+EDGE_DTYPE = np.dtype([("source", "<i8"), ("target", "<i8"), ("type", "u1")])
+"""The fixed-width records of the edges file written by the graph command."""
+
+EDGE_TYPES = ("stargazers", "contributors", "followers")
+"""The edge types in the order of their codes in the edges file."""
+
+SCRAPER_PATH = Path(__file__).parent.parent.joinpath("scraper").joinpath("main.py")
+"""The scraper command line, whose analyze command creates the summaries."""
+
+LOCATION_COLUMNS = ["country_code", "latitude", "longitude"]
+"""The columns added to the users data by the geocode command."""
+
+
+def read_table(path: Path) -> pa.Table:
+    """Read the columnar file into the Arrow table, memory-mapping it if possible."""
+
+    match path.suffix:
+        case ".feather":
+            # Uncompressed Feather files are mapped directly, so the data is only paged in when used
+            with pa.memory_map(str(path)) as source:
+                return pa.ipc.open_file(source).read_all()
+        case ".parquet":
+            return parquet.read_table(path, memory_map=True)
+
+    raise ValueError(f"Unsupported columnar file {path}")
+
+
+def load_data(path: str | Path) -> pd.DataFrame:
+    """Load the scraped data, preferring the up-to-date columnar file next to the JSON file."""
+
+    path = Path(path)
+
+    for suffix in COLUMNAR_SUFFIXES:
+        columnar = path.with_suffix(suffix)
+        if columnar.exists() and (not path.exists() or columnar.stat().st_mtime >= path.stat().st_mtime):
+            # Dictionary columns become categorical columns and timestamps keep their type
+            return read_table(columnar).to_pandas(split_blocks=True, maps_as_pydicts="strict")
+
+    return pd.read_json(path)
+
+
+def load_summary(path: str | Path) -> dict[str, Any]:
+    """Load the groups of the summary next to the JSON file, running the analyze command if it is outdated."""
+
+    path = Path(path)
+    summary = path.with_suffix(".summary.json")
+
+    # The analyze command only applies the changed rows, so it is cheap to run when the data was refreshed
+    if not summary.exists() or summary.stat().st_mtime < path.stat().st_mtime:
+        subprocess.run([sys.executable, str(SCRAPER_PATH), "analyze", path.stem], check=True)
+
+    with summary.open(encoding="utf-8") as file:
+        return json.load(file)["groups"]
+
+
+def describe(column: dict[str, Any], name: str) -> pd.Series:
+    """Get the description of the numeric column in the summary, named like the column."""
+
+    return pd.Series(column["describe"], name=name, dtype=float)
+
+
+def plot_histogram(column: dict[str, Any], xlabel: str) -> Axes:
+    """Plot the histogram of the numeric column in the summary, with the logarithmic frequency."""
+
+    histogram = column["histogram"]
+    ax = pd.Series(histogram["edges"][:-1]).plot.hist(
+        bins=histogram["edges"],
+        weights=np.array(histogram["counts"]),
+        logy=True,
+        xlabel=xlabel,
+        ylabel="Frequency (log)",
+    )
+    return ax
+
+
+def get_counts(values: dict[str, int], name: str | None = None, integer: bool = False) -> pd.Series:
+    """Get the counts in the summary as the series indexed by the named column, optionally with integer values."""
+
+    counts = pd.Series(values, name="count", dtype=int)
+    counts.index.name = name
+    if integer:
+        counts.index = counts.index.astype(int)
+    return counts
+
+
+def describe_counts(counts: pd.Series) -> pd.Series:
+    """Get the description of the categorical column from its counts, like pandas describes text columns."""
+
+    return pd.Series(
+        {"count": counts.sum(), "unique": len(counts), "top": counts.idxmax(), "freq": counts.max()},
+        name=counts.index.name,
+        dtype=object,
+    )
+
+
+def add_locations(df: pd.DataFrame, summary: dict[str, Any]) -> pd.DataFrame:
+    """Geocode the locations of the users and count their countries, if the geocode command was not run."""
+
+    if set(LOCATION_COLUMNS).issubset(df.columns):
+        return df
+
+    # The geocoder loads its data on import, so it is only imported when needed
+    from geocode.geocode import Geocode
+
+    geocoder = Geocode()
+    geocoder.load()
+
+    # The matches are sorted by priority, so the first one is used
+    matches = geocoder.decode_parallel(df["location"].to_list())
+    locations = pd.DataFrame(
+        [match[0] if match else {} for match in matches], columns=LOCATION_COLUMNS, index=df.index
+    )
+    df = df.join(locations)
+
+    # The countries are only in the summary if the data was geocoded before it was summarized
+    for group, rows in (("all", df), *df.groupby("type")):
+        counts = rows["country_code"].value_counts()
+        summary[group]["categorical"].setdefault("country_code", counts.to_dict())
+
+    return df
+
+
+def load_graph(path: str | Path) -> pd.DataFrame:
+    """Load the edges crawled by the graph command, from the users to the repositories or followed users."""
+
+    edges = np.fromfile(path, dtype=EDGE_DTYPE)
+
+    return pd.DataFrame(
+        {
+            "source": edges["source"],
+            "target": edges["target"],
+            "type": pd.Categorical.from_codes(edges["type"], EDGE_TYPES),
+        }
+    )
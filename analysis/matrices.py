@@ -0,0 +1,97 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+SIMILARITY_CHUNK = 1024
+"""The number of rows whose similarities are computed at once, which bounds the memory of the products."""
+
+
+def load_matrix(path: str | Path, field: str) -> tuple[sparse.csr_array, pd.Index, pd.Index]:
+    """Load the sparse matrix of the field next to the JSON file, with the IDs of its rows and terms of its columns."""
+
+    path = Path(path).with_suffix(f".{field}.npz")
+
+    with np.load(path) as loaded:
+        ids, vocabulary = loaded["ids"], loaded["vocabulary"]
+
+    return sparse.load_npz(path), pd.Index(ids, name="id"), pd.Index(vocabulary, name=field)
+
+
+def get_cooccurrence(matrix: sparse.csr_array) -> sparse.csr_array:
+    """Count the rows that contain each pair of terms, with the diagonal counting the rows of each term."""
+
+    present = (matrix != 0).astype(np.int64)
+    return (present.T @ present).tocsr()
+
+
+def get_top_pairs(cooccurrence: sparse.csr_array, vocabulary: pd.Index, amount: int = 10) -> pd.Series:
+    """Get the pairs of different terms that occur together in the most rows."""
+
+    # The co-occurrence is symmetric, so each pair is only taken once from above the diagonal
+    upper = sparse.triu(cooccurrence, k=1, format="coo")
+    top = np.lexsort((upper.col, upper.row, -upper.data))[:amount]
+
+    index = pd.MultiIndex.from_arrays([vocabulary[upper.row[top]], vocabulary[upper.col[top]]])
+    return pd.Series(upper.data[top], index=index, name="count")
+
+
+def get_weighted_totals(
+    matrix: sparse.csr_array, vocabulary: pd.Index, weights: np.ndarray | pd.Series, share: bool = False
+) -> pd.Series:
+    """Sum the weights of the rows that contain each term, optionally split by the share of the term in the row."""
+
+    if share:
+        # Each row distributes its weight between its terms, such as stars between languages by their bytes
+        totals = np.asarray(matrix.sum(axis=1), dtype=float).ravel()
+        matrix = sparse.diags_array(1 / np.where(totals, totals, 1)) @ matrix
+    else:
+        matrix = (matrix != 0).astype(float)
+
+    totals = matrix.T @ np.asarray(weights, dtype=float)
+    return pd.Series(totals, index=vocabulary, name="total").sort_values(ascending=False)
+
+
+def get_similar(matrix: sparse.csr_array, ids: pd.Index, amount: int = 10) -> pd.DataFrame:
+    """Find the most similar rows of each row by the cosine similarity of their terms."""
+
+    # Rows are scaled to unit length, so their products are their cosine similarities
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=float).ravel())
+    normalized = (sparse.diags_array(1 / np.where(norms, norms, 1)) @ matrix.astype(float)).tocsr()
+    transposed = normalized.T.tocsr()
+
+    sources, targets, similarities = [], [], []
+
+    for start in range(0, normalized.shape[0], SIMILARITY_CHUNK):
+        # Only rows that share a term have a stored product, so the chunk stays sparse
+        product = (normalized[start : start + SIMILARITY_CHUNK] @ transposed).tocsr()
+
+        for offset in range(product.shape[0]):
+            row = start + offset
+            columns = product.indices[product.indptr[offset] : product.indptr[offset + 1]]
+            values = product.data[product.indptr[offset] : product.indptr[offset + 1]]
+
+            keep = columns != row
+            columns, values = columns[keep], values[keep]
+
+            # Only the top values are sorted, by their similarity and then by their rows
+            if len(values) > amount:
+                top = np.argpartition(-values, amount)[:amount]
+                columns, values = columns[top], values[top]
+            order = np.lexsort((columns, -values))
+
+            sources.append(np.full(len(order), row))
+            targets.append(columns[order])
+            similarities.append(values[order])
+
+    sources = np.concatenate(sources) if sources else np.empty(0, dtype=np.int64)
+    targets = np.concatenate(targets) if targets else np.empty(0, dtype=np.int64)
+
+    return pd.DataFrame(
+        {
+            "id": ids[sources],
+            "similar": ids[targets],
+            "similarity": np.concatenate(similarities) if similarities else np.empty(0),
+        }
+    )
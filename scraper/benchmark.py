@@ -0,0 +1,248 @@
+import argparse
+import resource
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Literal
+
+import orjson
+from github import Auth, Github
+from urllib3 import Retry
+
+from checkpoint import ScrapeState
+from manual import Repository, parse_repository, parse_repository_soup
+from metrics import Metrics
+from repositories import get_top_repositories
+from scheduler import TokenScheduler
+from transport import install_transport
+from users import Backend, get_top_users
+
+Kind = Literal["users", "repositories"]
+
+ORDERS = {"users": "followers", "repositories": "stars"}
+"""The order that is benchmarked for each kind of scraper."""
+
+
+@dataclass
+class ScrapeResult:
+    amount: int
+    """The requested amount of records."""
+
+    records: int
+    """The number of scraped records."""
+
+    seconds: float
+    """The time the scrape took."""
+
+    requests: int
+    """The number of completed requests."""
+
+    rate_limited: int
+    """The number of requests that were rejected due to rate limits."""
+
+    peak_memory: int
+    """The peak resident memory of the scraping process in bytes."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the result."""
+
+        return (
+            f"{self.amount}: {self.records} records in {self.seconds:.1f} s, "
+            f"{self.records / self.seconds:.1f} records/s, {self.requests / max(self.records, 1):.2f} requests/record, "
+            f"{self.rate_limited} rate limited, {self.peak_memory / 1024 / 1024:.1f} MiB peak memory"
+        )
+
+
+def measure(parse: Callable[[str, str], Repository], pages: list[tuple[str, str]], repeat: int) -> float:
+    """Measure the number of pages the parser processes per second."""
+
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for url, html in pages:
+            parse(url, html)
+
+    return len(pages) * repeat / (time.perf_counter() - start)
+
+
+def compare(pages: list[tuple[str, str]]) -> int:
+    """Compare the parsers field by field and report the differences."""
+
+    differences = 0
+
+    for url, html in pages:
+        expected = parse_repository_soup(url, html)
+        actual = parse_repository(url, html)
+
+        for field in fields(Repository):
+            if getattr(expected, field.name) != getattr(actual, field.name):
+                print(
+                    f"{url}: {field.name} differs: "
+                    f"{getattr(expected, field.name)!r} != {getattr(actual, field.name)!r}",
+                    file=sys.stderr,
+                )
+                differences += 1
+
+    return differences
+
+
+def benchmark_parsing(paths: list[Path], repeat: int) -> int:
+    """Check that both parsers produce the same results and compare their throughput."""
+
+    # The file name is used as the URL, as it is only copied to the result
+    pages = [(path.name, path.read_text(encoding="utf-8")) for path in paths]
+
+    differences = compare(pages)
+    print(f"Fields: {differences} differences in {len(pages)} pages")
+
+    for name, parse in (("BeautifulSoup", parse_repository_soup), ("XPath", parse_repository)):
+        print(f"{name}: {measure(parse, pages, repeat):.1f} pages/s")
+
+    return 1 if differences else 0
+
+
+def run_scrape(base_url: str, kind: Kind, amount: int, backend: Backend, workers: int) -> ScrapeResult:
+    """Run the real scraper against the server and measure it, in its own process."""
+
+    metrics = Metrics()
+    install_transport(TokenScheduler(["benchmark"]), None, metrics)
+
+    # The requests and GraphQL queries are not throttled, so the scraper itself is measured instead of the delays
+    github = Github(
+        auth=Auth.Token("benchmark"),
+        base_url=base_url,
+        per_page=100,
+        retry=Retry(total=3, status_forcelist=range(500, 600), allowed_methods={"GET", "POST"}),
+        pool_size=workers + 1,
+        seconds_between_requests=None,
+        seconds_between_writes=None,
+    )
+
+    data: Iterator
+    start = time.perf_counter()
+
+    match kind:
+        case "users":
+            data = get_top_users(github, "followers", amount, backend, workers, ScrapeState())
+        case "repositories":
+            data = get_top_repositories(github, "stars", amount, backend, workers, ScrapeState())
+
+    records = sum(1 for _ in data)
+    seconds = time.perf_counter() - start
+    totals = metrics.totals()
+
+    # The maximum resident size is reported in kilobytes on Linux
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return ScrapeResult(amount, records, seconds, totals.requests, totals.rate_limited, peak_memory)
+
+
+def start_server(arguments: list[str]) -> tuple[subprocess.Popen, str]:
+    """Start the replay server in its own process and wait until it is ready."""
+
+    server = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("replay.py")), "serve", "--port", "0", *arguments],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    # The server prints its address once it is ready
+    assert server.stdout
+    line = server.stdout.readline()
+    if not line.startswith("Serving on "):
+        server.kill()
+        raise RuntimeError("The replay server could not be started")
+
+    return server, line.removeprefix("Serving on ").strip()
+
+
+def benchmark_scraping(
+    kind: Kind,
+    amounts: list[int],
+    backend: Backend,
+    workers: int,
+    cassette: Path | None,
+    output: Path | None,
+    server_arguments: list[str],
+) -> int:
+    """Run the scraper against the local server at each amount and compare their throughput."""
+
+    # The synthetic population is larger than the largest amount, so the scrape does not run out of results
+    source = ["--cassette", str(cassette)] if cassette else ["--synthetic", str(2 * max(amounts))]
+    server, base_url = start_server([*source, *server_arguments])
+
+    results = []
+
+    try:
+        for amount in amounts:
+            # Each scrape runs in a new process, so the peak memory is measured separately
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(run_scrape, base_url, kind, amount, backend, workers).result()
+
+            print(f"{kind} by {ORDERS[kind]} ({backend}, {workers} workers) {result.summary()}")
+            results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+
+    if output:
+        with output.open("wb") as file:
+            file.write(orjson.dumps([asdict(result) for result in results], option=orjson.OPT_INDENT_2))
+
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_parsing = subparsers.add_parser("parsing", help="benchmark the HTML parsers on saved pages")
+    parser_parsing.add_argument("pages", type=Path, nargs="+", help="the saved repository pages")
+    parser_parsing.add_argument("--repeat", type=int, default=10, help="the number of passes over the pages")
+
+    parser_scraping = subparsers.add_parser(
+        "scraping",
+        help="benchmark the API scrapers on the local server",
+        epilog="other options, such as --latency or --search-limit, are passed to the replay server",
+    )
+    parser_scraping.add_argument("kind", choices=("users", "repositories"))
+    parser_scraping.add_argument(
+        "--amounts", type=int, nargs="+", default=[1000, 10000, 100000], help="the amounts of results"
+    )
+    parser_scraping.add_argument(
+        "--backend", choices=("rest", "graphql"), default="rest", help="the hydration backend"
+    )
+    parser_scraping.add_argument("--workers", type=int, default=1, help="the number of hydration workers")
+    parser_scraping.add_argument(
+        "--cassette", type=Path, help="replay the recorded cassette instead of synthetic data"
+    )
+    parser_scraping.add_argument("--output", type=Path, help="also write the results to the JSON file")
+
+    args, server_arguments = parser.parse_known_args()
+    if server_arguments and args.command != "scraping":
+        parser.error(f"unrecognized arguments: {' '.join(server_arguments)}")
+
+    match args.command:
+        case "parsing":
+            sys.exit(benchmark_parsing(args.pages, args.repeat))
+        case "scraping":
+            sys.exit(
+                benchmark_scraping(
+                    args.kind,
+                    args.amounts,
+                    args.backend,
+                    args.workers,
+                    args.cassette,
+                    args.output,
+                    server_arguments,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
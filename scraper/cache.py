@@ -0,0 +1,212 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+
+import orjson
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+MAX_SIZE = 512 * 1024 * 1024
+"""The maximum total size of cached bodies in bytes."""
+
+MAX_AGE = 30 * 24 * 60 * 60
+"""The maximum age of cached responses in seconds."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    headers BLOB NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+@dataclass
+class CachedResponse:
+    etag: str | None
+    """The entity tag of the response, if sent."""
+
+    last_modified: str | None
+    """The last modified date of the response, if sent."""
+
+    headers: dict[str, str]
+    """The original response headers."""
+
+    body: bytes
+    """The original response body."""
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Get the headers that make the request conditional on this response."""
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    """The number of requests answered with 304 Not Modified."""
+
+    misses: int = 0
+    """The number of requests that had to download the full body."""
+
+    stored: int = 0
+    """The number of responses stored to the cache."""
+
+    evicted: int = 0
+    """The number of responses evicted from the cache."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        return (
+            f"Cache: {self.hits} hits, {self.misses} misses ({ratio:.1%} hit ratio), "
+            f"{self.stored} stored, {self.evicted} evicted"
+        )
+
+
+class ResponseCache:
+    """A persistent cache of responses that are revalidated using conditional requests."""
+
+    def __init__(self, path: Path, scope: str, max_size: int = MAX_SIZE, max_age: int = MAX_AGE) -> None:
+        path.parent.mkdir(exist_ok=True, parents=True)
+
+        # Responses may differ between tokens, so they are only shared within the same scope
+        self.scope = hashlib.sha256(scope.encode()).hexdigest()
+        self.max_size = max_size
+        self.max_age = max_age
+        self.stats = CacheStats()
+
+        self.lock = threading.Lock()
+        self.database = sqlite3.connect(path, check_same_thread=False)
+        self.database.executescript(SCHEMA)
+
+    def key(self, url: str, headers: Mapping[str, str | bytes]) -> str:
+        """Get the cache key for the request."""
+
+        accept = headers.get("Accept", "")
+        if isinstance(accept, bytes):
+            accept = accept.decode()
+
+        return hashlib.sha256(f"{self.scope}\n{accept}\n{url}".encode()).hexdigest()
+
+    def lookup(self, key: str) -> CachedResponse | None:
+        """Get the cached response for the key, if it exists."""
+
+        with self.lock:
+            row = self.database.execute(
+                "SELECT etag, last_modified, headers, body FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+        if not row:
+            return None
+
+        etag, last_modified, headers, body = row
+        return CachedResponse(etag, last_modified, orjson.loads(headers), body)
+
+    def store(self, key: str, url: str, headers: Mapping[str, str], body: bytes) -> None:
+        """Store the response if it can be revalidated later."""
+
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+
+        if not etag and not last_modified:
+            return
+
+        now = time.time()
+
+        with self.lock, self.database:
+            self.database.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, orjson.dumps(dict(headers)), body, len(body), now, now),
+            )
+
+        self.stats.stored += 1
+
+    def touch(self, key: str) -> None:
+        """Mark the response as recently used and still valid."""
+
+        now = time.time()
+
+        with self.lock, self.database:
+            self.database.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+
+    def evict(self) -> None:
+        """Evict the expired responses and the least recently used ones above the size limit."""
+
+        with self.lock, self.database:
+            expired = self.database.execute(
+                "DELETE FROM responses WHERE stored_at < ?",
+                (time.time() - self.max_age,),
+            )
+
+            oversized = self.database.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS total FROM responses
+                    ) WHERE total > ?
+                )
+                """,
+                (self.max_size,),
+            )
+
+        self.stats.evicted += expired.rowcount + oversized.rowcount
+
+    def close(self) -> None:
+        """Evict the old responses and close the cache."""
+
+        self.evict()
+        self.database.close()
+
+
+def cached_get(session: requests.Session, url: str, cache: ResponseCache | None) -> requests.Response:
+    """Download the URL, revalidating the cached response if it exists."""
+
+    if not cache:
+        return session.get(url)
+
+    key = cache.key(url, session.headers)
+    cached = cache.lookup(key)
+
+    response = session.get(url, headers=cached.conditional_headers() if cached else None)
+
+    # The response has not changed, so we use the cached body
+    if cached and response.status_code == 304:
+        cache.stats.hits += 1
+        cache.touch(key)
+
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict({**cached.headers, **response.headers})
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = cached.body
+        return response
+
+    cache.stats.misses += 1
+
+    if response.status_code == 200:
+        cache.store(key, url, response.headers, response.content)
+
+    return response
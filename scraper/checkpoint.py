@@ -0,0 +1,86 @@
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+CHECKPOINT_INTERVAL = 100
+"""The number of records after which the checkpoint is saved."""
+
+
+@dataclass
+class ScrapeState:
+    previous: int | None = None
+    """The lowest known value of the ordering property, if already known."""
+
+    seen: set[int] = field(default_factory=set)
+    """The IDs of already scraped entities."""
+
+
+def load_checkpoint(stream: Path, checkpoint: Path, metadata: dict[str, Any]) -> ScrapeState:
+    """Load the state of the interrupted scrape from its stream and checkpoint."""
+
+    with checkpoint.open("rb") as file:
+        saved = orjson.loads(file.read())
+
+    if saved["metadata"] != metadata:
+        raise ValueError(f"Checkpoint was created for a different scrape: {saved['metadata']}")
+
+    # The records of the saved bound are lost without the stream, so the scrape starts again
+    if not stream.exists():
+        return ScrapeState()
+
+    # The scrape continues from the lowest known value, which also covers the interrupted window
+    state = ScrapeState(previous=saved["previous"])
+
+    # The seen IDs are rebuilt from the stream, as it may contain records written after the checkpoint
+    # The incomplete last line is removed, so the stream can be safely appended to
+    with stream.open("r+b") as file:
+        offset = 0
+
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+
+            try:
+                state.seen.add(orjson.loads(line)["id"])
+            except orjson.JSONDecodeError:
+                break
+
+            offset += len(line)
+
+        file.truncate(offset)
+
+    return state
+
+
+def save_checkpoint(checkpoint: Path, state: ScrapeState, metadata: dict[str, Any]) -> None:
+    """Atomically save the state of the scrape to the checkpoint."""
+
+    temporary = checkpoint.with_name(f"{checkpoint.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(orjson.dumps({"metadata": metadata, "previous": state.previous}))
+
+    os.replace(temporary, checkpoint)
+
+
+def compact_stream(stream: Path, output: Path) -> None:
+    """Atomically convert the JSONL stream into the JSON array."""
+
+    # The output is replaced at once, so an interrupted compaction keeps both the stream and the previous output
+    temporary = output.with_name(f"{output.name}.tmp")
+
+    # The lines are already serialized as compact JSON, so they do not need to be decoded
+    with stream.open("rb") as source, temporary.open("wb") as target:
+        target.write(b"[")
+
+        for index, line in enumerate(source):
+            if index:
+                target.write(b",")
+            target.write(line.rstrip(b"\n"))
+
+        target.write(b"]\n")
+
+    os.replace(temporary, output)
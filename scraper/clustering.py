@@ -0,0 +1,407 @@
+import os
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aliases (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    cluster TEXT NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+"""
+
+LEGAL_SUFFIXES = frozenset(
+    {
+        "ag",
+        "co",
+        "company",
+        "corp",
+        "corporation",
+        "gmbh",
+        "group",
+        "inc",
+        "incorporated",
+        "limited",
+        "llc",
+        "ltd",
+        "plc",
+        "sa",
+        "sas",
+        "srl",
+    }
+)
+"""The legal forms that are removed from the end of company names."""
+
+SEPARATORS = re.compile(r"\s*(?:[/|,;(]|\s&\s|\s-\s)\s*")
+"""The separators after which company names usually mention a team or another company."""
+
+PUNCTUATION = re.compile(r"[^\w\s]+")
+"""The characters that are replaced with spaces in the canonical forms."""
+
+NGRAM = 3
+"""The length of the character n-grams that similar keys are compared by."""
+
+MAX_BLOCK = 300
+"""The number of keys above which an n-gram is too common to find candidates with."""
+
+BATCH_PAIRS = 5_000_000
+"""The number of candidate pairs that are expanded at once."""
+
+MIN_LENGTH = 5
+"""The length of the shortest key that is compared with other keys, as short names are too ambiguous."""
+
+SIMILARITY = 0.75
+"""The Jaccard similarity of the n-grams above which two keys are assigned to the same cluster."""
+
+
+# == Canonicalization
+
+
+def canonicalize_homepage(value: str) -> str | None:
+    """Get the domain of the homepage, as homepages on the same domain belong to the same entity."""
+
+    value = value.strip().lower()
+    if "://" not in value:
+        value = f"http://{value}"
+
+    try:
+        host = urlsplit(value).hostname
+    except ValueError:
+        return None
+
+    return host.removeprefix("www.") if host and "." in host else None
+
+
+def canonicalize_company(value: str) -> str | None:
+    """Get the canonical form of the company name, without mentions, teams and legal forms."""
+
+    value = unicodedata.normalize("NFKC", value).lower().strip()
+
+    # Some companies are only given by the URL of their website
+    if "://" in value or value.startswith("www."):
+        domain = canonicalize_homepage(value)
+        return domain.split(".")[0] if domain else None
+
+    value = SEPARATORS.split(value, maxsplit=1)[0]
+    words = PUNCTUATION.sub(" ", value.replace("@", "")).split()
+
+    # The legal form may be repeated, such as in "Acme Co., Ltd."
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+
+    return " ".join(words) or None
+
+
+def canonicalize_location(value: str) -> str | None:
+    """Get the canonical form of the location, without punctuation."""
+
+    return " ".join(PUNCTUATION.sub(" ", unicodedata.normalize("NFKC", value).lower()).split()) or None
+
+
+@dataclass(frozen=True)
+class ClusterSpec:
+    column: str
+    """The column of the records whose values are clustered."""
+
+    canonicalize: Callable[[str], str | None]
+    """The function that converts the value into its canonical form."""
+
+    fuzzy: bool
+    """Whether similar keys are also assigned to the same cluster, instead of only equal ones."""
+
+
+SPECS = {
+    "company": ClusterSpec("company", canonicalize_company, fuzzy=True),
+    "location": ClusterSpec("location", canonicalize_location, fuzzy=True),
+    "homepage": ClusterSpec("homepage", canonicalize_homepage, fuzzy=False),
+}
+"""The clustered columns of the users, which are written back to the `{column}_cluster` columns."""
+
+
+def get_key(canonical: str) -> str:
+    """Get the key of the canonical form, so forms that only differ in spacing and accents are equal."""
+
+    key = canonical.replace(" ", "")
+    if key.isascii():
+        return key
+
+    decomposed = unicodedata.normalize("NFKD", key)
+    return "".join(character for character in decomposed if not unicodedata.combining(character))
+
+
+def get_ngrams(key: str) -> set[str]:
+    """Get the character n-grams of the key, including the ones at its boundaries."""
+
+    padded = f" {key} "
+    return {padded[start : start + NGRAM] for start in range(len(padded) - NGRAM + 1)}
+
+
+# == Matching
+
+
+def find_similar(
+    keys: list[str], ngrams: list[set[str]], new: list[int]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find the pairs of a new key and another similar key, and their similarity, using uncommon n-grams as blocks."""
+
+    count = len(keys)
+    sizes = np.fromiter((len(key_ngrams) for key_ngrams in ngrams), dtype=np.int64, count=count)
+    eligible = np.flatnonzero(np.fromiter((len(key) >= MIN_LENGTH for key in keys), dtype=bool, count=count))
+
+    # Each n-gram of each key is an entry, and the entries of each n-gram form its block
+    ids: dict[str, int] = {}
+    entry_keys = np.repeat(eligible, sizes[eligible])
+    entry_ngrams = np.fromiter(
+        (ids.setdefault(ngram, len(ids)) for index in eligible.tolist() for ngram in ngrams[index]),
+        dtype=np.int64,
+        count=len(entry_keys),
+    )
+
+    blocks = np.bincount(entry_ngrams, minlength=len(ids))
+    members = entry_keys[np.argsort(entry_ngrams, kind="stable")]
+    offsets = np.cumsum(blocks) - blocks
+
+    # Common n-grams would compare most keys with each other, so they are only stored as bitsets of each key
+    common = blocks > MAX_BLOCK
+    positions = np.cumsum(common) - 1
+    is_common = common[entry_ngrams]
+    bitsets = np.zeros((count, (int(common.sum()) + 63) // 64), dtype=np.uint64)
+    bits = positions[entry_ngrams[is_common]]
+    # The bitsets are contiguous, so the bits are set through their flat view
+    np.bitwise_or.at(
+        bitsets.reshape(-1),
+        entry_keys[is_common] * bitsets.shape[1] + bits // 64,
+        np.left_shift(np.uint64(1), (bits % 64).astype(np.uint64)),
+    )
+    skipped = np.bitwise_count(bitsets).sum(axis=1, dtype=np.int64)
+
+    is_new = np.zeros(count, dtype=bool)
+    is_new[new] = True
+    selected = np.flatnonzero(is_new[entry_keys] & ~is_common)
+    lengths = blocks[entry_ngrams[selected]]
+
+    # The pairs are expanded in batches to bound the memory, with all pairs of a key in the same batch
+    starts = (np.cumsum(lengths) - lengths) // BATCH_PAIRS
+    first = np.diff(entry_keys[selected], prepend=-1) != 0
+    batches = starts[first][np.cumsum(first) - 1]
+
+    results: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    for batch in np.unique(batches).tolist():
+        entries = selected[batches == batch]
+        batch_lengths = lengths[batches == batch]
+
+        # The blocks of the entries are expanded into the pairs of their key with each member
+        firsts = np.repeat(entry_keys[entries], batch_lengths)
+        indexes = np.arange(len(firsts)) - np.repeat(np.cumsum(batch_lengths) - batch_lengths, batch_lengths)
+        seconds = members[np.repeat(offsets[entry_ngrams[entries]], batch_lengths) + indexes]
+
+        # The pairs of two new keys only need to be compared once
+        keep = (firsts != seconds) & ~(is_new[seconds] & (seconds < firsts))
+        pairs, shared = np.unique(firsts[keep] * count + seconds[keep], return_counts=True)
+        firsts, seconds = np.divmod(pairs, count)
+
+        # Similar keys share at least the part of the n-grams of the larger key given by the similarity
+        larger = np.maximum(sizes[firsts], sizes[seconds])
+        possible = shared >= np.ceil(SIMILARITY * larger) - np.minimum(skipped[firsts], skipped[seconds])
+        firsts, seconds, shared = firsts[possible], seconds[possible], shared[possible]
+
+        shared += np.bitwise_count(bitsets[firsts] & bitsets[seconds]).sum(axis=1, dtype=np.int64)
+        similarities = shared / (sizes[firsts] + sizes[seconds] - shared)
+        similar = similarities >= SIMILARITY
+
+        results.append((firsts[similar], seconds[similar], similarities[similar]))
+
+    if not results:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    firsts, seconds, similarities = (np.concatenate(arrays) for arrays in zip(*results, strict=True))
+    return firsts, seconds, similarities
+
+
+class AliasTable:
+    """A persistent table of the keys assigned to each cluster, so the clusters stay stable between runs."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(exist_ok=True, parents=True)
+
+        self.database = sqlite3.connect(path)
+        self.database.executescript(SCHEMA)
+
+    def lookup(self, kind: str) -> dict[str, str]:
+        """Get the clusters of all keys of the kind."""
+
+        return dict(self.database.execute("SELECT key, cluster FROM aliases WHERE kind = ?", (kind,)))
+
+    def store(self, kind: str, aliases: dict[str, str]) -> None:
+        """Store the clusters of the new keys."""
+
+        with self.database:
+            self.database.executemany(
+                "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)",
+                ((kind, key, cluster) for key, cluster in aliases.items()),
+            )
+
+    def close(self) -> None:
+        """Close the table."""
+
+        self.database.close()
+
+
+@dataclass
+class ClusterStats:
+    values: int = 0
+    """The number of set values in the clustered columns."""
+
+    unique: int = 0
+    """The number of unique values, which are the only ones that are canonicalized."""
+
+    keys: int = 0
+    """The number of unique keys of the canonical forms."""
+
+    aliased: int = 0
+    """The number of keys whose cluster was already in the alias table."""
+
+    merged: int = 0
+    """The number of new keys that were assigned to the cluster of a similar key."""
+
+    clusters: int = 0
+    """The number of clusters that the values were assigned to."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return (
+            f"Clustering: {self.values} values, {self.unique} unique, {self.keys} keys, "
+            f"{self.aliased} aliased, {self.merged} merged, {self.clusters} clusters"
+        )
+
+
+def assign_clusters(
+    forms: Counter[str], spec: ClusterSpec, aliases: AliasTable, stats: ClusterStats
+) -> dict[str, str]:
+    """Assign the key of each canonical form to a cluster, named by the most common form of its keys."""
+
+    keys: dict[str, Counter[str]] = {}
+    for form, count in forms.items():
+        keys.setdefault(get_key(form), Counter())[form] = count
+
+    known = aliases.lookup(spec.column)
+    new = [key for key in keys if key not in known]
+
+    stats.keys += len(keys)
+    stats.aliased += len(keys) - len(new)
+
+    # Only the new keys are matched, so the existing clusters never change
+    parents = {key: key for key in new}
+
+    def find(key: str) -> str:
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    matched: dict[str, tuple[float, str]] = {}
+
+    if spec.fuzzy and new:
+        candidates = [*sorted(known.keys() - keys.keys()), *keys]
+        ngrams = [get_ngrams(key) for key in candidates]
+        indexes = [index for index, key in enumerate(candidates) if key in parents]
+
+        firsts, seconds, similarities = find_similar(candidates, ngrams, indexes)
+        for index, other, similarity in zip(
+            firsts.tolist(), seconds.tolist(), similarities.tolist(), strict=True
+        ):
+            key, match = candidates[index], candidates[other]
+            if match in known:
+                if similarity > matched.get(key, (0.0, ""))[0]:
+                    matched[key] = (similarity, known[match])
+            else:
+                parents[find(key)] = find(match)
+
+    # The new keys join the most similar existing cluster of any key they were merged with
+    best: dict[str, tuple[float, str]] = {}
+    for key, (similarity, cluster) in matched.items():
+        if similarity > best.get(find(key), (0.0, ""))[0]:
+            best[find(key)] = (similarity, cluster)
+
+    # Otherwise, the new clusters are named by the most common form of all their keys
+    groups: dict[str, Counter[str]] = {}
+    for key in new:
+        groups.setdefault(find(key), Counter()).update(keys[key])
+
+    added: dict[str, str] = {}
+    for key in new:
+        root = find(key)
+        if root in best:
+            added[key] = best[root][1]
+            stats.merged += 1
+        else:
+            added[key] = groups[root].most_common(1)[0][0]
+            stats.merged += root != key
+
+    aliases.store(spec.column, added)
+    known.update(added)
+
+    return {form: known[get_key(form)] for form in forms}
+
+
+# == Writing
+
+
+def cluster_file(path: Path, aliases: AliasTable) -> ClusterStats:
+    """Add the cluster of the company, location and homepage to each record in the data file."""
+
+    stats = ClusterStats()
+
+    with path.open("rb") as file:
+        records = orjson.loads(file.read())
+
+    for spec in SPECS.values():
+        # The values are factorized, so each unique value is only canonicalized and clustered once
+        codes: dict[str, int] = {"": 0}
+        inverse = np.fromiter(
+            (codes.setdefault(record.get(spec.column) or "", len(codes)) for record in records),
+            dtype=np.int64,
+            count=len(records),
+        )
+
+        unique = list(codes)[1:]
+        canonical = [spec.canonicalize(value) for value in unique]
+        counts = np.bincount(inverse, minlength=len(codes))
+
+        forms: Counter[str] = Counter()
+        for form, count in zip(canonical, counts[1:].tolist(), strict=True):
+            if form:
+                forms[form] += count
+
+        stats.values += int(counts[1:].sum())
+        stats.unique += len(unique)
+
+        clusters = assign_clusters(forms, spec, aliases, stats)
+        stats.clusters += len(set(clusters.values()))
+
+        names = np.array([None, *(clusters[form] if form else None for form in canonical)], dtype=object)
+        for record, name in zip(records, names[inverse].tolist(), strict=True):
+            record[f"{spec.column}_cluster"] = name
+
+    # The file is replaced atomically, so it is not corrupted if the stage is interrupted
+    temporary = path.with_name(f"{path.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(orjson.dumps(records))
+        file.write(b"\n")
+
+    os.replace(temporary, path)
+
+    return stats
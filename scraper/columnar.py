@@ -0,0 +1,110 @@
+import operator
+import types
+import typing
+from dataclasses import fields
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Literal
+
+import orjson
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as parquet
+
+from projection import Fields, Omitted, is_selected
+
+ColumnarFormat = Literal["feather", "parquet"]
+
+CATEGORICAL_FIELDS = {"type", "company", "location", "license", "language", "default_branch"}
+"""The low-cardinality string fields that are stored as dictionaries."""
+
+
+def get_arrow_type(name: str, annotation: Any) -> pa.DataType:
+    """Get the Arrow type for the dataclass field."""
+
+    # Optional fields are stored as nullable columns of the inner type, while omitted fields are left out
+    if isinstance(annotation, types.UnionType):
+        (annotation,) = (arg for arg in typing.get_args(annotation) if arg not in (type(None), Omitted))
+
+    origin = typing.get_origin(annotation) or annotation
+
+    if origin is bool:
+        return pa.bool_()
+    if origin is int:
+        return pa.int64()
+    if origin is str:
+        return pa.dictionary(pa.int32(), pa.string()) if name in CATEGORICAL_FIELDS else pa.string()
+    if origin is datetime:
+        return pa.timestamp("s", tz="UTC")
+    if origin is list:
+        return pa.list_(get_arrow_type(name, typing.get_args(annotation)[0]))
+    if origin is dict:
+        key, value = typing.get_args(annotation)
+        return pa.map_(get_arrow_type(name, key), get_arrow_type(name, value))
+
+    raise TypeError(f"Unsupported field type {annotation!r} of {name}")
+
+
+def get_arrow_schema(record_type: type, selected: Fields = None) -> pa.Schema:
+    """Get the Arrow schema derived from the record dataclass, optionally with only the selected fields."""
+
+    hints = typing.get_type_hints(record_type)
+    schema = pa.schema(
+        [
+            (field.name, get_arrow_type(field.name, hints[field.name]))
+            for field in fields(record_type)
+            if is_selected(selected, field.name)
+        ]
+    )
+
+    # The omitted fields are recorded, so they can be told apart from fields that were not scraped at all
+    if selected is not None:
+        omitted = [field.name for field in fields(record_type) if field.name not in selected]
+        schema = schema.with_metadata({"omitted": orjson.dumps(omitted)})
+
+    return schema
+
+
+def get_arrow_array(values: list[Any], arrow_type: pa.DataType) -> pa.Array:
+    """Convert the column of JSON values into the Arrow array of the type."""
+
+    # Strings are converted in bulk, which is much faster than converting each value in Python
+    if pa.types.is_timestamp(arrow_type):
+        return pa.array(values, pa.string()).cast(arrow_type)
+    if pa.types.is_dictionary(arrow_type):
+        return pa.array(values, arrow_type.value_type).dictionary_encode()
+
+    if pa.types.is_map(arrow_type):
+        values = [None if value is None else list(value.items()) for value in values]
+
+    return pa.array(values, arrow_type)
+
+
+def write_columnar(
+    stream: Path, output: Path, record_type: type, format: ColumnarFormat, selected: Fields = None
+) -> None:
+    """Convert the JSONL stream of records into the columnar file."""
+
+    schema = get_arrow_schema(record_type, selected)
+    get_values = operator.itemgetter(*schema.names)
+
+    with stream.open("rb") as file:
+        rows = [get_values(orjson.loads(line)) for line in file]
+
+    # Rows are transposed into columns, so each column can be converted at once
+    # The item getter returns the values themselves if there is only a single column
+    columns: Any
+    if len(schema.names) == 1:
+        columns = [rows]
+    else:
+        columns = zip(*rows, strict=True) if rows else ([] for _ in schema.names)
+
+    arrays = [get_arrow_array(list(values), field.type) for field, values in zip(schema, columns)]
+    table = pa.table(arrays, schema=schema)
+
+    match format:
+        case "feather":
+            # Uncompressed files can be memory-mapped without copying the data
+            feather.write_feather(table, output, compression="uncompressed")
+        case "parquet":
+            parquet.write_table(table, output, compression="zstd")
@@ -0,0 +1,22 @@
+import sys
+from typing import overload
+
+
+@overload
+def intern_string(value: str) -> str: ...
+
+
+@overload
+def intern_string(value: str | None) -> str | None: ...
+
+
+def intern_string(value: str | None) -> str | None:
+    """Intern the repeated string, so all records share the same object."""
+
+    return sys.intern(value) if value is not None else None
+
+
+def intern_keys(values: dict[str, int]) -> dict[str, int]:
+    """Intern the keys of the dictionary, so all records share the same key objects."""
+
+    return {sys.intern(key): value for key, value in values.items()}
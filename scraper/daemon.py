@@ -0,0 +1,302 @@
+import argparse
+import contextvars
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+import orjson
+from github import Auth, Consts, Github
+from urllib3 import Retry
+
+from cache import ResponseCache
+from scheduler import TokenScheduler
+
+Status = Literal["pending", "running", "done", "failed"]
+
+POLL_INTERVAL = 0.5
+"""The number of seconds between the checks of the queue for new jobs."""
+
+PROBE_FRESHNESS = 10 * 60
+"""The number of seconds for which the maximum value of the ordering property is reused between jobs."""
+
+
+@dataclass
+class DaemonStats:
+    done: int = 0
+    """The number of jobs that finished successfully."""
+
+    failed: int = 0
+    """The number of jobs that failed."""
+
+    probes: int = 0
+    """The number of maximum values that were reused instead of being probed again."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return f"Daemon: {self.done} done, {self.failed} failed, {self.probes} probes reused"
+
+
+class WarmClients:
+    """The token scheduler, response cache and API clients that all jobs of the daemon share."""
+
+    def __init__(self, tokens: list[str], cache: ResponseCache | None, connections: int) -> None:
+        self.auth = Auth.Token(tokens[0])
+        self.scheduler = TokenScheduler(tokens)
+        self.cache = cache
+        self.connections = connections
+
+        self.clients: dict[str, Github] = {}
+        self.probes: dict[tuple[str, str, str], tuple[float, int]] = {}
+        self.stats = DaemonStats()
+        self.lock = threading.Lock()
+
+    def get_client(self, base_url: str) -> Github:
+        """Get the client of the API, so the jobs reuse its connection pool and share its request pacing."""
+
+        with self.lock:
+            if base_url not in self.clients:
+                # Rate limits are handled by the scheduler, so only server errors are retried
+                retry = Retry(
+                    total=10,
+                    backoff_factor=1,
+                    status_forcelist=range(500, 600),
+                    allowed_methods={"GET", "POST"},
+                )
+
+                # The connections and the request spacing are shared by all jobs, which rotate between the tokens
+                self.clients[base_url] = Github(
+                    auth=self.auth,
+                    base_url=base_url,
+                    per_page=100,
+                    retry=retry,
+                    pool_size=self.connections + 1,
+                    seconds_between_requests=Consts.DEFAULT_SECONDS_BETWEEN_REQUESTS
+                    / len(self.scheduler.tokens),
+                )
+
+            return self.clients[base_url]
+
+    def get_max_value(self, base_url: str, command: str, order: Any) -> int:
+        """Get the maximum value of the ordering property, probing it again only once it is no longer fresh."""
+
+        key = (base_url, command, order)
+
+        with self.lock:
+            probed = self.probes.get(key)
+            if probed and probed[0] >= time.time() - PROBE_FRESHNESS:
+                self.stats.probes += 1
+                return probed[1]
+
+        # The scrapers are only loaded once a job needs them, so submitting jobs stays fast
+        from repositories import find_max_value as find_max_repository_value
+        from users import find_max_value as find_max_user_value
+        from users import get_params
+
+        # The searches start slightly above the maximum value, which covers the increases since the probe
+        github = self.get_client(base_url)
+        if command == "repositories":
+            value = find_max_repository_value(github, order)
+        else:
+            value = find_max_user_value(github, *get_params(order))
+
+        with self.lock:
+            self.probes[key] = (time.time(), value)
+
+        return value
+
+
+def get_dataset(args: argparse.Namespace) -> str:
+    """Get the dataset whose files the job writes, as the jobs of the same dataset need to run in turns."""
+
+    if args.command in ("repositories", "users"):
+        dataset = f"{args.command}-by-{args.order}"
+        return dataset if args.shard is None else f"{dataset}.shard-{args.shard}"
+
+    if args.command in ("geocode", "cluster"):
+        return f"users-by-{args.order}"
+
+    return str(getattr(args, "dataset", args.command))
+
+
+def write_job(path: Path, job: dict[str, Any]) -> None:
+    """Atomically write the job to the file."""
+
+    temporary = path.with_name(f"{path.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(orjson.dumps(job, option=orjson.OPT_INDENT_2))
+
+    os.replace(temporary, path)
+
+
+def submit_job(queue: Path, argv: list[str]) -> str:
+    """Add the job with the command line arguments to the queue, returning its name."""
+
+    for status in ("pending", "running", "done", "failed"):
+        queue.joinpath(status).mkdir(exist_ok=True, parents=True)
+
+    # Names are ordered by the time of submission, so the jobs are started in that order
+    name = f"{time.time_ns():020d}-{secrets.token_hex(4)}"
+    write_job(queue.joinpath("pending").joinpath(f"{name}.json"), {"argv": argv, "submitted": time.time()})
+
+    return name
+
+
+def wait_job(queue: Path, name: str, poll: float = POLL_INTERVAL) -> dict[str, Any]:
+    """Wait until the job is finished and get its result."""
+
+    while True:
+        for status in ("done", "failed"):
+            path = queue.joinpath(status).joinpath(f"{name}.json")
+            if path.exists():
+                with path.open("rb") as file:
+                    return {**orjson.loads(file.read()), "status": status}
+
+        time.sleep(poll)
+
+
+class Daemon:
+    """Runs the jobs from the queue directory concurrently, with the clients kept warm between them."""
+
+    def __init__(
+        self,
+        queue: Path,
+        clients: WarmClients,
+        parse: Callable[[list[str]], argparse.Namespace],
+        run: Callable[[argparse.Namespace], None],
+        jobs: int,
+    ) -> None:
+        self.queue = queue
+        self.parse = parse
+        self.run = run
+        self.jobs = jobs
+
+        self.stats = clients.stats
+        self.lock = clients.lock
+        self.stopping = threading.Event()
+
+        for status in ("pending", "running", "done", "failed"):
+            queue.joinpath(status).mkdir(exist_ok=True, parents=True)
+
+    def get_path(self, status: Status, name: str) -> Path:
+        """Get the path of the job file with the status."""
+
+        return self.queue.joinpath(status).joinpath(f"{name}.json")
+
+    def finish(self, name: str, job: dict[str, Any], error: str | None) -> None:
+        """Move the job to the finished jobs, with the time it finished and its error."""
+
+        job["finished"] = time.time()
+        if error:
+            job["error"] = error
+
+        running = self.get_path("running", name)
+        write_job(running, job)
+        os.replace(running, self.get_path("failed" if error else "done", name))
+
+        with self.lock:
+            if error:
+                self.stats.failed += 1
+            else:
+                self.stats.done += 1
+
+        if error:
+            print(f"Job {name}: failed, {error}", file=sys.stderr)
+        else:
+            print(f"Job {name}: done in {job['finished'] - job['started']:.1f} s", file=sys.stderr)
+
+    def execute(self, name: str, job: dict[str, Any], args: argparse.Namespace) -> None:
+        """Run the job and store its result."""
+
+        error = None
+
+        try:
+            self.run(args)
+        except SystemExit as exit:
+            # The argument errors are already printed by the parser
+            if exit.code:
+                error = f"exited with status {exit.code}"
+        except BaseException as exception:
+            traceback.print_exc()
+            error = f"{type(exception).__name__}: {exception}"
+
+        self.finish(name, job, error)
+
+    def serve(self, poll: float = POLL_INTERVAL) -> None:
+        """Run the jobs until the daemon is interrupted, then wait for the running jobs."""
+
+        # Jobs that were running when the previous daemon stopped are started again
+        for path in sorted(self.queue.joinpath("running").glob("*.json")):
+            os.replace(path, self.get_path("pending", path.stem))
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stopping.set())
+
+        running: dict[Future[None], str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="job") as executor:
+            while not self.stopping.is_set():
+                busy = set(running.values())
+
+                for path in sorted(self.queue.joinpath("pending").glob("*.json")):
+                    if len(running) >= self.jobs:
+                        break
+
+                    name = path.stem
+
+                    try:
+                        with path.open("rb") as file:
+                            job = orjson.loads(file.read())
+                    except FileNotFoundError:
+                        continue
+
+                    # Jobs with invalid arguments are failed without running them
+                    args: argparse.Namespace | None = None
+                    error = None
+                    try:
+                        args = self.parse(job["argv"])
+                    except SystemExit as exit:
+                        error = f"exited with status {exit.code}"
+
+                    # Jobs of the same dataset are started in turns, as they write the same files
+                    dataset = get_dataset(args) if args else None
+                    if dataset and dataset in busy:
+                        continue
+
+                    # Claiming the job fails if it was removed from the queue in the meantime
+                    try:
+                        os.replace(path, self.get_path("running", name))
+                    except FileNotFoundError:
+                        continue
+
+                    job["started"] = time.time()
+                    print(f"Job {name}: started {' '.join(job['argv'])}", file=sys.stderr)
+
+                    if args is None or dataset is None:
+                        self.finish(name, job, error)
+                        continue
+
+                    # Each job has its own context, so its requests are counted into its own report
+                    context = contextvars.copy_context()
+                    future = executor.submit(context.run, self.execute, name, job, args)
+                    running[future] = dataset
+                    busy.add(dataset)
+
+                if running:
+                    finished, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        del running[future]
+                else:
+                    self.stopping.wait(poll)
+
+            print(f"Stopping after {len(running)} running jobs", file=sys.stderr)
@@ -0,0 +1,130 @@
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from github.Repository import Repository as GithubRepository
+
+from cache import ResponseCache
+from hydration import map_ordered
+from manual import DEFAULT_DELAY, HostPacer, create_session, get_repository_details
+from projection import Omitted
+from scheduler import Resource, TokenScheduler
+
+WatchersCount = int | Omitted | None
+"""The watchers count of the repository, which is missing if it needs to be completed."""
+
+Languages = dict[str, int] | Omitted | None
+"""The languages of the repository, which are missing if they need to be completed."""
+
+OTHER_LANGUAGE = "Other"
+"""The language that the pages use for the remaining small languages, which the API lists separately."""
+
+
+@dataclass
+class FallbackStats:
+    api: int = 0
+    """The number of repositories that were completed using the API."""
+
+    html: int = 0
+    """The number of repositories that were completed from their HTML pages."""
+
+    failed: int = 0
+    """The number of pages that could not be downloaded or parsed, whose repositories used the API instead."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return f"Fallback: {self.api} completed using the API, {self.html} from pages, {self.failed} failed"
+
+
+def estimate_languages(percentages: dict[str, str], size: int) -> dict[str, int]:
+    """Estimate the bytes of each language from its percentage on the page and the repository size in kilobytes."""
+
+    return {
+        language: round(float(percentage.rstrip("%")) * size * 1024 / 100)
+        for language, percentage in percentages.items()
+        if language != OTHER_LANGUAGE
+    }
+
+
+class HtmlFallback:
+    """Completes repositories from their HTML pages while the remaining rate limit of all tokens is low."""
+
+    def __init__(
+        self,
+        scheduler: TokenScheduler,
+        threshold: int,
+        workers: int,
+        cache: ResponseCache | None = None,
+        delay: float | None = None,
+    ) -> None:
+        self.scheduler = scheduler
+        self.threshold = threshold
+        self.workers = workers
+        self.cache = cache
+
+        # Pages are not API requests, so they are paced by host instead of routed between the tokens
+        self.session = create_session(workers)
+        self.pacer = HostPacer(DEFAULT_DELAY / workers if delay is None else delay)
+
+        self.stats = FallbackStats()
+        self.lock = threading.Lock()
+
+    def is_active(self, resource: Resource) -> bool:
+        """Check whether the remaining requests of the resource fell below the threshold."""
+
+        return self.scheduler.remaining(resource) < self.threshold
+
+    def complete(
+        self,
+        repository: GithubRepository,
+        watchers_count: WatchersCount,
+        languages: Languages,
+        resource: Resource,
+    ) -> tuple[WatchersCount, Languages, list[str]]:
+        """Complete the missing properties from the page if the rate limit is low, with the fields it completed."""
+
+        if watchers_count is not None and languages is not None:
+            return watchers_count, languages, []
+
+        if not self.is_active(resource):
+            with self.lock:
+                self.stats.api += 1
+            return watchers_count, languages, []
+
+        self.pacer.wait(repository.html_url)
+
+        # Pages of some repositories differ in layout, so the API is used for them even if it waits for the reset
+        try:
+            details = get_repository_details(repository.html_url, self.cache, self.session)
+        except Exception:
+            with self.lock:
+                self.stats.failed += 1
+            return watchers_count, languages, []
+
+        fields = []
+        if watchers_count is None:
+            watchers_count = details.watchers_count
+            fields.append("watchers_count")
+        if languages is None:
+            languages = estimate_languages(details.languages, repository.size)
+            fields.append("languages")
+
+        with self.lock:
+            self.stats.html += 1
+        return watchers_count, languages, fields
+
+    def complete_batch(
+        self,
+        repositories: Iterable[tuple[GithubRepository, WatchersCount, Languages]],
+        resource: Resource,
+    ) -> list[tuple[WatchersCount, Languages, list[str]]]:
+        """Complete the missing properties of the batch, downloading its pages on the worker pool."""
+
+        return list(
+            map_ordered(
+                lambda item: self.complete(*item, resource),
+                repositories,
+                self.workers,
+            )
+        )
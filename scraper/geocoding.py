@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import unicodedata
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    key TEXT PRIMARY KEY,
+    country_code TEXT,
+    latitude REAL,
+    longitude REAL
+);
+"""
+
+
+@dataclass(frozen=True)
+class Location:
+    country_code: str
+    """The country code of the first match."""
+
+    latitude: float
+    """The latitude of the first match."""
+
+    longitude: float
+    """The longitude of the first match."""
+
+
+@dataclass
+class GeocodeStats:
+    locations: int = 0
+    """The number of records with a location."""
+
+    unique: int = 0
+    """The number of unique normalized locations."""
+
+    cached: int = 0
+    """The number of unique locations that were already in the cache."""
+
+    matched: int = 0
+    """The number of records whose location was matched."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return (
+            f"Geocoding: {self.locations} locations, {self.unique} unique, "
+            f"{self.cached} cached, {self.unique - self.cached} geocoded, {self.matched} matched"
+        )
+
+
+def normalize_location(value: str) -> str:
+    """Normalize the free-text location, so its variants share the same cache entry."""
+
+    # The geocoder matches names case-insensitively, so the case can be dropped as well
+    return " ".join(unicodedata.normalize("NFKC", value).split()).lower()
+
+
+class LocationCache:
+    """A persistent cache of geocoded locations, including the ones without a match."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(exist_ok=True, parents=True)
+
+        self.database = sqlite3.connect(path)
+        self.database.executescript(SCHEMA)
+
+    def lookup(self, keys: Iterable[str]) -> dict[str, Location | None]:
+        """Get the cached results for the keys, skipping the ones that are not cached."""
+
+        results: dict[str, Location | None] = {}
+
+        for key, country_code, latitude, longitude in self.database.execute(
+            "SELECT key, country_code, latitude, longitude FROM locations"
+            " WHERE key IN (SELECT value FROM json_each(?))",
+            (orjson.dumps(list(keys)),),
+        ):
+            results[key] = Location(country_code, latitude, longitude) if country_code else None
+
+        return results
+
+    def store(self, results: dict[str, Location | None]) -> None:
+        """Store the geocoded results."""
+
+        with self.database:
+            self.database.executemany(
+                "INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        (key, location.country_code, location.latitude, location.longitude)
+                        if location
+                        else (key, None, None, None)
+                    )
+                    for key, location in results.items()
+                ],
+            )
+
+    def close(self) -> None:
+        """Close the cache."""
+
+        self.database.close()
+
+
+def geocode_locations(
+    keys: set[str], cache: LocationCache, stats: GeocodeStats
+) -> dict[str, Location | None]:
+    """Geocode each normalized location once, using the cache for the already known ones."""
+
+    results = cache.lookup(keys)
+    missing = keys - results.keys()
+
+    stats.unique += len(keys)
+    stats.cached += len(results)
+
+    if missing:
+        # The geocoder is only installed with the analysis dependencies, and loading its data is slow
+        from geocode.geocode import Geocode
+
+        geocoder = Geocode()
+        geocoder.load()
+
+        geocoded: dict[str, Location | None] = {}
+        for key in sorted(missing):
+            # The matches are sorted by priority, so the first one is used
+            if matches := geocoder.decode(key):
+                geocoded[key] = Location(
+                    matches[0]["country_code"], matches[0]["latitude"], matches[0]["longitude"]
+                )
+            else:
+                geocoded[key] = None
+
+        cache.store(geocoded)
+        results.update(geocoded)
+
+    return results
+
+
+def geocode_file(path: Path, cache: LocationCache) -> GeocodeStats:
+    """Add the country code and coordinates of the location to each record in the data file."""
+
+    stats = GeocodeStats()
+
+    with path.open("rb") as file:
+        records = orjson.loads(file.read())
+
+    # Data scraped with the selected fields may not contain the locations at all
+    if any("location" not in record for record in records):
+        raise ValueError(f"The data file {path.name} does not contain the location field")
+
+    keys = [normalize_location(record["location"]) if record["location"] else None for record in records]
+    results = geocode_locations({key for key in keys if key}, cache, stats)
+
+    for record, key in zip(records, keys, strict=True):
+        location = results[key] if key else None
+
+        stats.locations += bool(key)
+        stats.matched += location is not None
+
+        record["country_code"] = location.country_code if location else None
+        record["latitude"] = location.latitude if location else None
+        record["longitude"] = location.longitude if location else None
+
+    # The file is replaced atomically, so it is not corrupted if the stage is interrupted
+    temporary = path.with_name(f"{path.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(orjson.dumps(records))
+        file.write(b"\n")
+
+    os.replace(temporary, path)
+
+    return stats
@@ -0,0 +1,360 @@
+import os
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+import orjson
+from github import Github, GithubException, UnknownObjectException
+from github.Requester import Requester
+
+from hydration import map_ordered
+from metrics import phase
+
+EdgeType = Literal["stargazers", "contributors", "followers"]
+
+REPOSITORY, USER = 0, 1
+"""The kinds of the nodes in the frontier."""
+
+EDGE_TYPES: dict[EdgeType, tuple[int, str]] = {
+    "stargazers": (REPOSITORY, "/repositories/{id}/stargazers"),
+    "contributors": (REPOSITORY, "/repositories/{id}/contributors"),
+    "followers": (USER, "/user/{id}/followers"),
+}
+"""The kind of the node that each edge type is listed from, and the path of its list."""
+
+EDGE_DTYPE = np.dtype([("source", "<i8"), ("target", "<i8"), ("type", "u1")])
+"""The fixed-width records of the edges file, from the user to the repository or the followed user."""
+
+NODE_DTYPE = np.dtype([("kind", "u1"), ("id", "<i8")])
+"""The records of the frontier file."""
+
+BATCH_EDGES = 100_000
+"""The number of edges after which the batch is appended to the edges file and the checkpoint is saved."""
+
+READ_EDGES = 10_000_000
+"""The number of edges that are read at once when the next level of the frontier is built."""
+
+
+def parse_edge_types(value: str) -> tuple[EdgeType, ...]:
+    """Parse the comma-separated edge types, keeping their order in the edges file."""
+
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    if unknown := names - EDGE_TYPES.keys():
+        raise ValueError(f"Unknown edge types {', '.join(sorted(unknown))}, expected {', '.join(EDGE_TYPES)}")
+
+    return tuple(name for name in EDGE_TYPES if name in names)
+
+
+def load_seeds(paths: list[Path]) -> np.ndarray:
+    """Get the unique repositories and users in the data files, which the crawl starts from."""
+
+    nodes: list[tuple[int, int]] = []
+
+    for path in paths:
+        with path.open("rb") as file:
+            records = orjson.loads(file.read())
+
+        kind = REPOSITORY if path.name.startswith("repositories") else USER
+        nodes.extend((kind, record["id"]) for record in records)
+
+    return np.unique(np.array(nodes, dtype=NODE_DTYPE))
+
+
+# == Visited Set
+
+
+class VisitedSet:
+    """A compact set of IDs, stored as the bitmap that grows with the largest ID."""
+
+    def __init__(self) -> None:
+        self.bits = np.zeros(0, dtype=np.uint8)
+
+    def add(self, ids: np.ndarray) -> np.ndarray:
+        """Add the IDs, returning the sorted unique ones that were not in the set yet."""
+
+        ids = np.unique(ids.astype(np.int64))
+        if not len(ids):
+            return ids
+
+        # The bitmap grows geometrically, so adding increasing IDs does not copy it each time
+        needed = int(ids[-1]) // 8 + 1
+        if needed > len(self.bits):
+            grown = np.zeros(max(needed, len(self.bits) * 2), dtype=np.uint8)
+            grown[: len(self.bits)] = self.bits
+            self.bits = grown
+
+        offsets = ids >> 3
+        masks = np.left_shift(1, ids & 7).astype(np.uint8)
+        new: np.ndarray = ids[(self.bits[offsets] & masks) == 0]
+
+        # Different IDs may share the same byte, so the bits need to be accumulated
+        np.bitwise_or.at(self.bits, offsets, masks)
+        return new
+
+
+# == Fetching
+
+
+def fetch_ids(requester: Requester, path: str, max_pages: int) -> tuple[list[int], int]:
+    """Fetch the IDs of the users in the paginated list, and the number of requests it took."""
+
+    ids: list[int] = []
+    requests = 0
+
+    for page in range(1, max_pages + 1):
+        requests += 1
+        try:
+            _, data = requester.requestJsonAndCheck("GET", path, parameters={"per_page": 100, "page": page})
+        except UnknownObjectException:
+            # The entity was deleted or made private since it was scraped
+            break
+        except GithubException as error:
+            # The contributors of the largest repositories cannot be listed
+            if error.status in (403, 451):
+                break
+            raise
+
+        # Empty repositories reply with no content instead of an empty list
+        items = data or []
+        ids.extend(item["id"] for item in items if "id" in item)
+
+        if len(items) < 100:
+            break
+
+    return ids, requests
+
+
+def expand_node(
+    requester: Requester, types: tuple[EdgeType, ...], max_pages: int, node: tuple[int, int]
+) -> tuple[np.ndarray, int]:
+    """Fetch the edges of the node, and the number of requests it took."""
+
+    kind, id = node
+    batches = []
+    requests = 0
+
+    for code, name in enumerate(EDGE_TYPES):
+        source_kind, path = EDGE_TYPES[name]
+        if name not in types or source_kind != kind:
+            continue
+
+        with phase(name):
+            ids, count = fetch_ids(requester, path.format(id=id), max_pages)
+
+        edges = np.empty(len(ids), dtype=EDGE_DTYPE)
+        edges["source"] = ids
+        edges["target"] = id
+        edges["type"] = code
+
+        batches.append(edges)
+        requests += count
+
+    return np.concatenate(batches) if batches else np.empty(0, dtype=EDGE_DTYPE), requests
+
+
+# == Crawling
+
+
+@dataclass
+class GraphState:
+    level: int = 0
+    """The level of the frontier that is currently being expanded."""
+
+    done: int = 0
+    """The number of nodes of the current level that were already expanded."""
+
+    level_offset: int = 0
+    """The number of edges that were written before the current level."""
+
+    written: int = 0
+    """The number of edges that were written to the edges file."""
+
+    requests: int = 0
+    """The number of requests that the crawl made."""
+
+
+@dataclass
+class GraphStats:
+    nodes: int = 0
+    """The number of nodes that were expanded in this run."""
+
+    edges: int = 0
+    """The number of edges that were written in this run."""
+
+    requests: int = 0
+    """The number of requests that were made in this run."""
+
+    levels: int = 0
+    """The number of levels that were finished."""
+
+    complete: bool = False
+    """Whether the crawl reached its depth, instead of stopping at its budget."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        status = "complete" if self.complete else "stopped at the budget"
+        return (
+            f"Graph: {self.nodes} nodes expanded, {self.edges} edges, {self.requests} requests, "
+            f"{self.levels} levels finished, {status}"
+        )
+
+
+def save_graph_checkpoint(checkpoint: Path, state: GraphState, metadata: dict[str, Any]) -> None:
+    """Atomically save the state of the crawl to the checkpoint."""
+
+    temporary = checkpoint.with_name(f"{checkpoint.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(orjson.dumps({"metadata": metadata, **asdict(state)}))
+
+    os.replace(temporary, checkpoint)
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """Atomically save the array to the NumPy file."""
+
+    temporary = path.with_name(f"{path.name}.tmp")
+
+    with temporary.open("wb") as file:
+        np.save(file, array)
+
+    os.replace(temporary, path)
+
+
+def read_sources(edges: Path, start: int, end: int) -> Iterator[np.ndarray]:
+    """Read the sources of the edges in the range in chunks, so large levels fit in bounded memory."""
+
+    if end <= start:
+        return
+
+    records = np.memmap(edges, dtype=EDGE_DTYPE, mode="r", shape=(end,))
+    for offset in range(start, end, READ_EDGES):
+        yield np.array(records["source"][offset : min(offset + READ_EDGES, end)])
+
+
+def crawl_graph(
+    github: Github,
+    directory: Path,
+    seeds: np.ndarray,
+    types: tuple[EdgeType, ...],
+    depth: int,
+    max_pages: int,
+    budget: int | None,
+    workers: int,
+    resume: bool,
+) -> GraphStats:
+    """Expand the edges of the seed nodes level by level, until the depth or the request budget is reached."""
+
+    stats = GraphStats()
+    directory.mkdir(exist_ok=True, parents=True)
+
+    edges = directory.joinpath("edges.bin")
+    checkpoint = directory.joinpath("checkpoint.json")
+    seeds_path = directory.joinpath("seeds.npy")
+    metadata: dict[str, Any] = {"edges": list(types), "max_pages": max_pages}
+
+    visited = VisitedSet()
+
+    if resume and checkpoint.exists():
+        with checkpoint.open("rb") as file:
+            saved = orjson.loads(file.read())
+
+        if saved.pop("metadata") != metadata:
+            raise ValueError("Checkpoint was created for a crawl of different edges")
+
+        state = GraphState(**saved)
+        seeds = np.load(seeds_path)
+        frontier = np.load(directory.joinpath(f"frontier-{state.level}.npy"))
+
+        # The edges written after the checkpoint are removed, as their nodes are expanded again
+        with edges.open("r+b") as file:
+            file.truncate(state.written * EDGE_DTYPE.itemsize)
+
+        # The visited users are rebuilt from the seeds and the users found in the previous levels
+        visited.add(seeds["id"][seeds["kind"] == USER])
+        for sources in read_sources(edges, 0, state.level_offset):
+            visited.add(sources)
+
+    else:
+        state = GraphState()
+        frontier = seeds
+        edges.unlink(missing_ok=True)
+        edges.touch()
+        for previous in directory.glob("frontier-*.npy"):
+            previous.unlink()
+
+        visited.add(seeds["id"][seeds["kind"] == USER])
+        save_array(seeds_path, seeds)
+        save_array(directory.joinpath("frontier-0.npy"), frontier)
+        save_graph_checkpoint(checkpoint, state, metadata)
+
+    requester = github._Github__requester  # type: ignore[attr-defined]
+    expand = partial(expand_node, requester, types, max_pages)
+
+    def get_nodes() -> Iterator[tuple[int, int]]:
+        # New nodes are only started while the budget of this run lasts, so the workers stop soon after it
+        for kind, id in frontier[state.done :].tolist():
+            if budget is not None and stats.requests >= budget:
+                return
+            yield kind, id
+
+    with edges.open("ab") as output:
+        while state.level < depth and len(frontier):
+            buffered: list[np.ndarray] = []
+            count = 0
+
+            for node_edges, requests in map_ordered(expand, get_nodes(), workers):
+                buffered.append(node_edges)
+                count += len(node_edges)
+                state.done += 1
+                state.requests += requests
+                stats.nodes += 1
+                stats.requests += requests
+
+                # The checkpoint is only saved after the edges of the expanded nodes are written
+                if count >= BATCH_EDGES:
+                    output.write(np.concatenate(buffered).tobytes())
+                    output.flush()
+                    state.written += count
+                    stats.edges += count
+                    buffered, count = [], 0
+                    save_graph_checkpoint(checkpoint, state, metadata)
+
+            if buffered:
+                output.write(np.concatenate(buffered).tobytes())
+                output.flush()
+                state.written += count
+                stats.edges += count
+            save_graph_checkpoint(checkpoint, state, metadata)
+
+            if state.done < len(frontier):
+                return stats
+
+            # The users that were found in this level and not visited before form the next level
+            found = [
+                visited.add(sources) for sources in read_sources(edges, state.level_offset, state.written)
+            ]
+            users = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+            frontier = np.empty(len(users), dtype=NODE_DTYPE)
+            frontier["kind"] = USER
+            frontier["id"] = users
+
+            state = GraphState(state.level + 1, 0, state.written, state.written, state.requests)
+            stats.levels += 1
+
+            # The frontier of each level is saved before the checkpoint that refers to it
+            save_array(directory.joinpath(f"frontier-{state.level}.npy"), frontier)
+            save_graph_checkpoint(checkpoint, state, metadata)
+            directory.joinpath(f"frontier-{state.level - 1}.npy").unlink()
+
+    # The finished crawl only keeps its edges
+    stats.complete = True
+    for path in (checkpoint, seeds_path, directory.joinpath(f"frontier-{state.level}.npy")):
+        path.unlink(missing_ok=True)
+
+    return stats
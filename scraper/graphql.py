@@ -0,0 +1,57 @@
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from itertools import islice
+from typing import Any, TypeVar
+
+from github.Requester import Requester
+
+T = TypeVar("T")
+
+BATCH_SIZE = 100
+"""The maximum number of nodes GraphQL API allows in a single query."""
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Splits the iterable into lists of at most the specified size."""
+
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parses the GraphQL datetime into the same format as PyGithub."""
+
+    # Python 3.10 does not support the "Z" suffix
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def query_graphql(requester: Requester, query: str, variables: dict[str, Any]) -> dict[str, Any]:
+    """Sends the query to the GraphQL API and returns its data."""
+
+    headers, response = requester.requestJsonAndCheck(
+        "POST",
+        requester.graphql_url,
+        input={"query": query, "variables": variables},
+    )
+
+    # Some nodes may fail without failing the whole query,
+    # so we only raise an exception if no data was returned
+    if response.get("data") is None:
+        raise requester.createException(400, headers, response)
+
+    data: dict[str, Any] = response["data"]
+    return data
+
+
+def fetch_nodes(requester: Requester, fragment: str, ids: list[str]) -> list[dict[str, Any] | None]:
+    """Fetches the nodes with the specified IDs and returns them in the same order."""
+
+    query = f"query($ids: [ID!]!) {{ nodes(ids: $ids) {{ {fragment} }} }}"
+    nodes: list[dict[str, Any] | None] = []
+
+    for batch in batched(ids, BATCH_SIZE):
+        data = query_graphql(requester, query, {"ids": batch})
+        nodes.extend(data["nodes"])
+
+    return nodes
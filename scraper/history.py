@@ -0,0 +1,155 @@
+import sqlite3
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    taken_at TEXT NOT NULL UNIQUE,
+    keyframe INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    entity INTEGER NOT NULL,
+    snapshot INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (entity, snapshot, field)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS changes_field ON changes (field, snapshot);
+"""
+
+KEYFRAME_INTERVAL = 30
+"""The number of snapshots after which all values are stored again, so lookups only need to replay a few deltas."""
+
+REMOVED = ""
+"""The field of the change that marks the entity as removed from the snapshot."""
+
+
+@dataclass
+class HistoryStats:
+    entities: int = 0
+    """The number of entities in the snapshot."""
+
+    added: int = 0
+    """The number of entities that were not in the previous snapshot."""
+
+    removed: int = 0
+    """The number of entities from the previous snapshot that are not in the new one."""
+
+    changes: int = 0
+    """The number of stored field values."""
+
+    keyframe: bool = False
+    """Whether all values of the snapshot were stored."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        kind = "keyframe" if self.keyframe else "delta"
+        return (
+            f"History: {self.entities} entities, {self.added} added, {self.removed} removed, "
+            f"{self.changes} values stored as {kind}"
+        )
+
+
+def encode_record(record: dict[str, Any]) -> dict[str, bytes]:
+    """Encode the values of the record, so equal values have equal encodings."""
+
+    return {
+        field: orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        for field, value in record.items()
+        if field != "id"
+    }
+
+
+def load_state(database: sqlite3.Connection) -> dict[int, dict[str, bytes]]:
+    """Reconstruct the encoded values of the latest snapshot from its keyframe and the following deltas."""
+
+    state: dict[int, dict[str, bytes]] = {}
+
+    keyframe = database.execute("SELECT max(id) FROM snapshots WHERE keyframe").fetchone()[0]
+    if keyframe is None:
+        return state
+
+    rows = database.execute(
+        "SELECT entity, field, value FROM changes WHERE snapshot >= ? ORDER BY snapshot",
+        (keyframe,),
+    )
+
+    for entity, field, value in rows:
+        if field == REMOVED:
+            state.pop(entity, None)
+        elif value is None:
+            state.get(entity, {}).pop(field, None)
+        else:
+            state.setdefault(entity, {})[field] = value
+
+    return state
+
+
+def add_snapshot(path: Path, history: Path, taken_at: date) -> HistoryStats:
+    """Store the data file in the history as the changes since the previous snapshot."""
+
+    stats = HistoryStats()
+
+    with path.open("rb") as file:
+        records = {record["id"]: encode_record(record) for record in orjson.loads(file.read())}
+
+    history.parent.mkdir(exist_ok=True, parents=True)
+    database = sqlite3.connect(history)
+    database.executescript(SCHEMA)
+
+    previous = database.execute("SELECT max(taken_at) FROM snapshots").fetchone()[0]
+    since = database.execute(
+        "SELECT count(*) FROM snapshots "
+        "WHERE id > (SELECT coalesce(max(id), 0) FROM snapshots WHERE keyframe)"
+    ).fetchone()[0]
+
+    # Deltas can only be applied forwards, so snapshots need to be added in order
+    if previous and previous >= taken_at.isoformat():
+        database.close()
+        raise ValueError(f"History already contains a snapshot from {previous}")
+
+    state = load_state(database)
+    stats.entities = len(records)
+    stats.keyframe = previous is None or since + 1 >= KEYFRAME_INTERVAL
+
+    changes: list[tuple[int, str, bytes | None]] = []
+
+    for entity, values in records.items():
+        old = state.get(entity)
+        stats.added += old is None
+
+        # Keyframes and new entities store all values, while others only store the changed ones
+        if stats.keyframe or old is None:
+            changes.extend((entity, field, value) for field, value in values.items())
+            continue
+
+        changes.extend((entity, field, value) for field, value in values.items() if old.get(field) != value)
+        changes.extend((entity, field, None) for field in old.keys() - values.keys())
+
+    # Keyframes do not contain removed entities at all, so they only need to be marked in deltas
+    removed = state.keys() - records.keys()
+    stats.removed = len(removed)
+    if not stats.keyframe:
+        changes.extend((entity, REMOVED, None) for entity in removed)
+
+    stats.changes = len(changes)
+
+    with database:
+        snapshot = database.execute(
+            "INSERT INTO snapshots (taken_at, keyframe) VALUES (?, ?)",
+            (taken_at.isoformat(), stats.keyframe),
+        ).lastrowid
+        database.executemany(
+            "INSERT INTO changes (entity, snapshot, field, value) VALUES (?, ?, ?, ?)",
+            ((entity, snapshot, field, value) for entity, field, value in changes),
+        )
+
+    database.close()
+
+    return stats
@@ -0,0 +1,75 @@
+import contextvars
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+PREFETCH_FACTOR = 2
+"""The number of pending items per worker."""
+
+
+def map_ordered(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    processes: bool = False,
+) -> Iterator[R]:
+    """Apply the function to items on a bounded worker pool and yield results in the original order."""
+
+    # Keep the original serial behaviour if there is only one worker
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    iterator = iter(items)
+    pending: deque[Future[R]] = deque()
+
+    # CPU-bound functions can run on processes instead, but they need to be picklable
+    executor: Executor
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hydration")
+
+    def submit(item: T) -> Future[R]:
+        # Threads run the function in a copy of the consumer context, so its requests are counted into the same metrics
+        if processes:
+            return executor.submit(func, item)
+        return executor.submit(contextvars.copy_context().run, func, item)
+
+    try:
+        # Items are only consumed when there is space in the queue, so pagination
+        # of the search results continues while workers are hydrating previous items
+        for item in iterator:
+            pending.append(submit(item))
+            if len(pending) >= workers * PREFETCH_FACTOR:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    finally:
+        # Cancel the remaining work if the consumer stopped early
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def hydrate_reusing(
+    items: list[T],
+    reuse: Callable[[T], R | None],
+    hydrate: Callable[[list[T]], Iterator[R]],
+) -> Iterator[tuple[R, bool]]:
+    """Hydrate the items that cannot be reused and yield all results in the original order, marking the reused ones."""
+
+    reused = [reuse(item) for item in items]
+
+    # Only the remaining items are hydrated, still ahead of the consumer
+    hydrated = hydrate([item for item, result in zip(items, reused, strict=True) if result is None])
+
+    for result in reused:
+        if result is not None:
+            yield result, True
+        else:
+            yield next(hydrated), False
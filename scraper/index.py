@@ -0,0 +1,368 @@
+import hashlib
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    row INTEGER PRIMARY KEY,
+    id INTEGER NOT NULL UNIQUE,
+    digest BLOB NOT NULL,
+    record BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT PRIMARY KEY,
+    encoding TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rankings (
+    field TEXT PRIMARY KEY,
+    rows BLOB NOT NULL
+);
+"""
+
+PREFIXES = ("topic", "language", "languages", "license")
+"""The prefixes of the indexed terms, for topics, main languages, all languages and licenses."""
+
+RANKING_FIELDS = ("stargazers_count", "watchers_count", "forks_count", "open_issues_count", "size")
+"""The fields whose orderings are stored, so the top results can be found without sorting."""
+
+ALL = "*"
+"""The term that contains all rows of the current data, which negations are computed against."""
+
+Mask = npt.NDArray[np.bool_]
+"""The boolean mask of the rows that contain a term or match a query."""
+
+TOKEN = re.compile(r'\s*(\(|\)|(?:[^\s()"]|"[^"]*"?)+)')
+"""The tokens of the query expression, where quoted values can contain spaces and parentheses."""
+
+
+# == Encoding
+
+
+def encode_rows(rows: np.ndarray, capacity: int) -> tuple[str, bytes]:
+    """Encode the sorted rows as the smaller of the bitmap and the gaps between them in the narrowest type."""
+
+    bitmap_size = (capacity + 7) // 8
+
+    gaps = np.diff(rows, prepend=0)
+    largest = int(gaps.max()) if len(gaps) else 0
+    dtype = np.uint8 if largest < 2**8 else np.uint16 if largest < 2**16 else np.uint32
+
+    if len(rows) * np.dtype(dtype).itemsize <= bitmap_size:
+        return f"gaps:{np.dtype(dtype).str}", gaps.astype(dtype).tobytes()
+
+    mask = np.zeros(capacity, dtype=bool)
+    mask[rows] = True
+    return "bitmap", np.packbits(mask).tobytes()
+
+
+def decode_mask(encoding: str, data: bytes, capacity: int) -> Mask:
+    """Decode the rows into the boolean mask of the capacity."""
+
+    if encoding == "bitmap":
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=capacity)
+        return bits.astype(bool)
+
+    mask = np.zeros(capacity, dtype=bool)
+    gaps = np.frombuffer(data, dtype=encoding.removeprefix("gaps:"))
+    mask[np.cumsum(gaps, dtype=np.int64)] = True
+    return mask
+
+
+# == Building
+
+
+def get_terms(record: dict[str, Any]) -> set[str]:
+    """Get the indexed terms of the repository record, which are matched case-insensitively."""
+
+    terms = {f"topic:{topic.lower()}" for topic in record.get("topics") or ()}
+    terms.update(f"languages:{language.lower()}" for language in record.get("languages") or ())
+    if language := record.get("language"):
+        terms.add(f"language:{language.lower()}")
+    if license := record.get("license"):
+        terms.add(f"license:{license.lower()}")
+    return terms
+
+
+@dataclass
+class IndexStats:
+    added: int = 0
+    """The number of records that were added to the index."""
+
+    changed: int = 0
+    """The number of records that were updated in the index."""
+
+    removed: int = 0
+    """The number of records that were removed from the index."""
+
+    terms: int = 0
+    """The number of postings lists that were rewritten."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return (
+            f"Index: {self.added} added, {self.changed} changed, {self.removed} removed, "
+            f"{self.terms} terms updated"
+        )
+
+
+def get_source(path: Path) -> str:
+    """Get the version of the data file, which changes whenever the file is written."""
+
+    status = path.stat()
+    return f"{status.st_size}:{status.st_mtime_ns}"
+
+
+def update_index(path: Path, database: sqlite3.Connection) -> IndexStats:
+    """Update the index to the data file, only rewriting the postings of the terms that changed."""
+
+    stats = IndexStats()
+    database.executescript(SCHEMA)
+
+    meta = dict(database.execute("SELECT key, value FROM meta"))
+    if meta.get("source") == get_source(path):
+        return stats
+
+    with path.open("rb") as file:
+        records = orjson.loads(file.read())
+
+    digests = {
+        record["id"]: hashlib.blake2b(
+            orjson.dumps(record, option=orjson.OPT_SORT_KEYS), digest_size=16
+        ).digest()
+        for record in records
+    }
+
+    previous = {id: (row, digest) for row, id, digest in database.execute("SELECT row, id, digest FROM rows")}
+    capacity = int(meta.get("capacity", 0))
+
+    # Rows are never reused, so the postings of unchanged records stay valid
+    changed = [id for id, (_, digest) in previous.items() if id in digests and digests[id] != digest]
+    removed = [id for id in previous if id not in digests]
+    added = [id for id in digests if id not in previous]
+
+    stats.added, stats.changed, stats.removed = len(added), len(changed), len(removed)
+
+    rows = {id: row for id, (row, _) in previous.items() if id in digests}
+    for row, id in enumerate(added, start=capacity):
+        rows[id] = row
+    capacity += len(added)
+
+    # The postings of the terms that the old and new records contain need to be updated
+    additions: dict[str, list[int]] = {}
+    removals: dict[str, list[int]] = {}
+
+    for id in changed + removed:
+        (record,) = database.execute("SELECT record FROM rows WHERE id = ?", (id,)).fetchone()
+        for term in get_terms(orjson.loads(record)):
+            removals.setdefault(term, []).append(previous[id][0])
+
+    by_id = {record["id"]: record for record in records}
+    for id in changed + added:
+        for term in get_terms(by_id[id]):
+            additions.setdefault(term, []).append(rows[id])
+
+    # The term of all rows always changes with the capacity
+    removals.setdefault(ALL, []).extend(previous[id][0] for id in removed)
+    additions.setdefault(ALL, []).extend(rows[id] for id in added)
+
+    with database:
+        for term in additions.keys() | removals.keys():
+            mask = load_mask(database, term, capacity)
+            mask[removals.get(term, [])] = False
+            # Changed records that still contain the term are removed and added again
+            mask[additions.get(term, [])] = True
+
+            if mask.any() or term == ALL:
+                encoding, data = encode_rows(np.flatnonzero(mask), capacity)
+                database.execute(
+                    "INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?)",
+                    (term, encoding, int(mask.sum()), data),
+                )
+            else:
+                database.execute("DELETE FROM postings WHERE term = ?", (term,))
+
+            stats.terms += 1
+
+        database.executemany("DELETE FROM rows WHERE id = ?", ((id,) for id in removed))
+        database.executemany(
+            "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+            ((rows[id], id, digests[id], orjson.dumps(by_id[id])) for id in changed + added),
+        )
+
+        # Orderings are cheap to sort again, with the IDs breaking the ties
+        live = np.array([rows[record["id"]] for record in records], dtype=np.uint32)
+        ids = np.array([record["id"] for record in records], dtype=np.int64)
+        for name in RANKING_FIELDS:
+            values = np.array([record.get(name) or 0 for record in records], dtype=np.int64)
+            order = live[np.lexsort((ids, -values))]
+            database.execute("INSERT OR REPLACE INTO rankings VALUES (?, ?)", (name, order.tobytes()))
+
+        database.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            (("source", get_source(path)), ("capacity", str(capacity))),
+        )
+
+    return stats
+
+
+def load_mask(database: sqlite3.Connection, term: str, capacity: int) -> Mask:
+    """Load the rows of the term as the boolean mask, which is empty if the term is not indexed."""
+
+    row = database.execute("SELECT encoding, data FROM postings WHERE term = ?", (term,)).fetchone()
+    if not row:
+        return np.zeros(capacity, dtype=bool)
+
+    return decode_mask(row[0], row[1], capacity)
+
+
+# == Querying
+
+
+@dataclass
+class Parser:
+    """The recursive descent parser of query expressions, where NOT binds tighter than AND, and AND than OR."""
+
+    tokens: list[str]
+    """The remaining tokens of the expression."""
+
+    terms: set[str] = field(default_factory=set)
+    """The terms that the expression uses."""
+
+    def peek(self) -> str | None:
+        return self.tokens[0] if self.tokens else None
+
+    def take(self) -> str:
+        if not self.tokens:
+            raise ValueError("Unexpected end of the query")
+        return self.tokens.pop(0)
+
+    def parse_or(self) -> Any:
+        node = self.parse_and()
+        while self.peek() == "OR":
+            self.take()
+            node = ("OR", node, self.parse_and())
+        return node
+
+    def parse_and(self) -> Any:
+        node = self.parse_not()
+
+        # Adjacent terms are also combined using AND
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            node = ("AND", node, self.parse_not())
+
+        return node
+
+    def parse_not(self) -> Any:
+        if self.peek() == "NOT":
+            self.take()
+            return ("NOT", self.parse_not())
+
+        token = self.take()
+
+        if token == "(":
+            node = self.parse_or()
+            if self.take() != ")":
+                raise ValueError("Expected a closing parenthesis")
+            return node
+
+        prefix, _, value = token.partition(":")
+
+        # Values with spaces, such as Jupyter Notebook, need to be quoted
+        if value.startswith('"'):
+            if len(value) < 2 or not value.endswith('"'):
+                raise ValueError(f"Unclosed quote in the term {token}")
+            value = value[1:-1]
+
+        if prefix not in PREFIXES or not value:
+            raise ValueError(
+                f"Invalid term {token}, expected one of {', '.join(f'{p}:VALUE' for p in PREFIXES)}"
+            )
+
+        term = f"{prefix}:{value.lower()}"
+        self.terms.add(term)
+        return term
+
+
+def parse_query(expression: str) -> tuple[Any, set[str]]:
+    """Parse the query expression into its tree and the terms it uses."""
+
+    parser = Parser(TOKEN.findall(expression))
+    tree = parser.parse_or()
+
+    if parser.tokens:
+        raise ValueError(f"Unexpected {parser.tokens[0]} in the query")
+
+    return tree, parser.terms
+
+
+def evaluate(tree: tuple[Any, ...] | str, masks: dict[str, Mask]) -> Mask:
+    """Evaluate the query tree using the masks of its terms."""
+
+    match tree:
+        case ("AND", left, right):
+            return evaluate(left, masks) & evaluate(right, masks)
+        case ("OR", left, right):
+            return evaluate(left, masks) | evaluate(right, masks)
+        case ("NOT", operand):
+            return masks[ALL] & ~evaluate(operand, masks)
+        case str(term):
+            return masks[term]
+
+    raise ValueError(f"Invalid query tree {tree}")
+
+
+@dataclass
+class QueryResult:
+    matches: int
+    """The number of records that match the query."""
+
+    records: list[dict[str, Any]]
+    """The top matching records by the ranking field."""
+
+    seconds: float
+    """The time the query took."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the result."""
+
+        return f"Query: {self.matches} matches, {len(self.records)} shown in {self.seconds * 1000:.1f} ms"
+
+
+def query_index(database: sqlite3.Connection, expression: str, sort: str, limit: int) -> QueryResult:
+    """Find the top records by the ranking field that match the query, only loading the used postings."""
+
+    start = time.perf_counter()
+    tree, terms = parse_query(expression)
+
+    capacity = int(database.execute("SELECT value FROM meta WHERE key = 'capacity'").fetchone()[0])
+
+    masks = {term: load_mask(database, term, capacity) for term in terms | {ALL}}
+    mask = evaluate(tree, masks)
+
+    # The ordering only contains the current rows, so the first matching rows are the top results
+    (ranking,) = database.execute("SELECT rows FROM rankings WHERE field = ?", (sort,)).fetchone()
+    order = np.frombuffer(ranking, dtype=np.uint32)
+    top = order[mask[order]][:limit].tolist()
+
+    placeholders = ", ".join("?" * len(top))
+    found = dict(database.execute(f"SELECT row, record FROM rows WHERE row IN ({placeholders})", top))
+    records = [orjson.loads(found[row]) for row in top]
+
+    return QueryResult(int(mask.sum()), records, time.perf_counter() - start)
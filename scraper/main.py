@@ -1,65 +1,782 @@
 import argparse
+import sqlite3
+import sys
+from collections.abc import Iterator
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import date
+from functools import partial
 from pathlib import Path
+from typing import Any
 
 import orjson
-from github import Auth, Github, enable_console_debug_logging
+from github import Auth, Consts, Github, enable_console_debug_logging
+from urllib3 import Retry
 
-from repositories import get_top_repositories
-from users import get_top_users
+from cache import ResponseCache
+from checkpoint import CHECKPOINT_INTERVAL, ScrapeState, compact_stream, load_checkpoint, save_checkpoint
+from daemon import Daemon, WarmClients, submit_job, wait_job
+from metrics import Metrics
+from projection import Fields, get_field_names, parse_fields, project
+from refresh import Snapshot
+from replay import CassetteRecorder
+from scheduler import TokenScheduler
+from sharding import ORDER_FIELDS, ShardPlan, load_plan, merge_shards, save_manifest, save_plan
+from store import FRESHNESS, EntityStore
+from transport import collect_metrics, install_transport
 
 
-def main() -> None:
-    # == Prepare the argument parser
+def get_parser() -> argparse.ArgumentParser:
+    """Get the parser of the command line arguments, which the daemon also uses for its jobs."""
 
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest="command")
 
     parser.add_argument("--debug", action="store_true", help="enable request debugging")
+    parser.add_argument(
+        "--live-stats", action="store_true", help="show the request statistics in the progress bar"
+    )
     parser.add_argument("--amount", type=int, default=1000, help="the amount of results")
+    parser.add_argument(
+        "--backend", choices=("rest", "graphql"), default="rest", help="the hydration backend"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="the number of hydration workers")
+    parser.add_argument(
+        "--html-fallback",
+        type=int,
+        metavar="THRESHOLD",
+        help="complete repositories from their pages while fewer API requests remain",
+    )
+    parser.add_argument(
+        "--html-delay",
+        type=float,
+        metavar="SECONDS",
+        help="the minimum seconds between the pages of the HTML fallback (default: 1 divided by the workers)",
+    )
+    parser.add_argument(
+        "--refresh-from", type=Path, help="reuse unchanged entities from the previous results"
+    )
+    parser.add_argument("--resume", action="store_true", help="resume the interrupted scrape")
+    parser.add_argument("--cache", type=Path, help="the HTTP cache file (default: cache/http.sqlite)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the HTTP cache")
+    parser.add_argument(
+        "--store", type=Path, help="the shared entity store file (default: cache/entities.sqlite)"
+    )
+    parser.add_argument("--no-store", action="store_true", help="disable the shared entity store")
+    parser.add_argument(
+        "--freshness",
+        type=float,
+        default=FRESHNESS / 60 / 60,
+        help="the hours for which stored entities are reused",
+    )
+    parser.add_argument("--base-url", default=Consts.DEFAULT_BASE_URL, help="the API base URL")
+    parser.add_argument("--auth", type=Path, help="the file with the API tokens (default: scraper/auth.txt)")
+    parser.add_argument("--record", type=Path, help="record the API responses into the cassette file")
+    parser.add_argument(
+        "--columnar", choices=("feather", "parquet"), help="also write the data to the columnar file"
+    )
+    parser.add_argument(
+        "--matrices",
+        action="store_true",
+        help="also write the repository languages and topics to sparse matrices",
+    )
 
     parser_repositories = subparsers.add_parser("repositories", help="scrape the top repositories")
     parser_repositories.add_argument("order", choices=("stars", "forks"))
+    parser_repositories.add_argument("--fields", help="the comma-separated fields to scrape (default: all)")
+    parser_repositories.add_argument(
+        "--shard", type=int, help="scrape the shard of the plan with this number"
+    )
 
     parser_users = subparsers.add_parser("users", help="scrape the top users")
     parser_users.add_argument("order", choices=("followers", "repositories"))
+    parser_users.add_argument("--fields", help="the comma-separated fields to scrape (default: all)")
+    parser_users.add_argument("--shard", type=int, help="scrape the shard of the plan with this number")
 
-    args = parser.parse_args()
+    parser_geocode = subparsers.add_parser("geocode", help="geocode the locations of the scraped users")
+    parser_geocode.add_argument("order", choices=("followers", "repositories"))
 
-    # == Prepare the API client
+    parser_cluster = subparsers.add_parser(
+        "cluster", help="cluster the companies, locations and homepages of the scraped users"
+    )
+    parser_cluster.add_argument("order", choices=("followers", "repositories"))
 
-    root = Path(__file__).parents[1]
+    parser_analyze = subparsers.add_parser("analyze", help="update the summary of the scraped data")
+    parser_analyze.add_argument(
+        "dataset",
+        choices=(
+            "users-by-followers",
+            "users-by-repositories",
+            "repositories-by-stars",
+            "repositories-by-forks",
+        ),
+    )
+
+    parser_plan = subparsers.add_parser("plan", help="split the scrape of the top results into shards")
+    parser_plan.add_argument("dataset", choices=tuple(ORDER_FIELDS))
+    parser_plan.add_argument("--shards", type=int, required=True, help="the number of shards")
+    parser_plan.add_argument("--fields", help="the comma-separated fields to scrape (default: all)")
+
+    parser_merge = subparsers.add_parser("merge", help="merge the scraped shards into the dataset")
+    parser_merge.add_argument("dataset", choices=tuple(ORDER_FIELDS))
+
+    parser_history = subparsers.add_parser(
+        "history", help="store the scraped data in the history of snapshots"
+    )
+    parser_history.add_argument("dataset", choices=tuple(ORDER_FIELDS))
+    parser_history.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        help="the date of the snapshot (default: today)",
+    )
+
+    parser_query = subparsers.add_parser("query", help="find the top repositories matching the query")
+    parser_query.add_argument("dataset", choices=("repositories-by-stars", "repositories-by-forks"))
+    parser_query.add_argument(
+        "expression", help="the terms, such as language:Rust AND topic:wasm AND NOT license:MIT"
+    )
+    parser_query.add_argument(
+        "--sort", default="stargazers_count", help="the ranking field (default: stargazers_count)"
+    )
+    parser_query.add_argument("--limit", type=int, default=10, help="the number of shown results")
+
+    parser_export = subparsers.add_parser("export", help="export the top stored entities into the dataset")
+    parser_export.add_argument("dataset", choices=tuple(ORDER_FIELDS))
+    parser_export.add_argument(
+        "--stale", action="store_true", help="also export the entities outside of the freshness window"
+    )
+
+    parser_graph = subparsers.add_parser(
+        "graph", help="crawl the stargazers, contributors and followers of the scraped entities"
+    )
+    parser_graph.add_argument("--depth", type=int, default=1, help="the number of expanded levels")
+    parser_graph.add_argument("--edges", help="the comma-separated edge types (default: all)")
+    parser_graph.add_argument("--max-pages", type=int, default=10, help="the pages of each list of edges")
+    parser_graph.add_argument("--budget", type=int, help="the maximum number of requests of this run")
+
+    parser_daemon = subparsers.add_parser(
+        "daemon", help="run the submitted jobs with the clients and connections kept warm"
+    )
+    parser_daemon.add_argument("--queue", type=Path, help="the job queue directory (default: cache/jobs)")
+    parser_daemon.add_argument("--jobs", type=int, default=4, help="the number of concurrent jobs")
+    parser_daemon.add_argument(
+        "--connections", type=int, default=8, help="the number of concurrent requests of all jobs"
+    )
+
+    parser_submit = subparsers.add_parser("submit", help="submit the job to the daemon")
+    parser_submit.add_argument("--queue", type=Path, help="the job queue directory (default: cache/jobs)")
+    parser_submit.add_argument("--wait", action="store_true", help="wait until the job is finished")
+    parser_submit.add_argument("job", nargs=argparse.REMAINDER, help="the arguments of the job")
+
+    return parser
+
+
+def load_tokens(path: Path) -> list[str]:
+    """Load the API tokens from the file, which may contain multiple tokens, one per line."""
+
+    with path.open(encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def get_store(args: argparse.Namespace, root: Path) -> EntityStore | None:
+    """Open the entity store that all scrapes share, unless it is disabled."""
+
+    if args.no_store:
+        return None
+
+    store_path = args.store or root.joinpath("cache").joinpath("entities.sqlite")
+    return EntityStore(store_path, args.freshness * 60 * 60)
+
+
+def get_fields(parser: argparse.ArgumentParser, args: argparse.Namespace, kind: str) -> Fields:
+    """Parse the fields selected for the kind of records, which are validated before anything is scraped."""
+
+    # The record types are only needed by the commands that scrape
+    from repositories import Repository
+    from users import User
 
-    with root.joinpath("scraper").joinpath("auth.txt").open(encoding="utf-8") as file:
-        token = file.read().strip()
-        auth = Auth.Token(token)
+    try:
+        return parse_fields(args.fields, Repository if kind == "repositories" else User)
+    except ValueError as error:
+        parser.error(str(error))
 
-    github = Github(auth=auth, per_page=100)
+
+@dataclass
+class Clients:
+    github: Github
+    """The API client, whose requests are routed by the scheduler."""
+
+    scheduler: TokenScheduler
+    """The scheduler of the tokens, which tracks their rate limits."""
+
+    cache: ResponseCache | None
+    """The HTTP cache, if it is enabled."""
+
+    recorder: CassetteRecorder | None
+    """The recorder of the responses, if they are recorded."""
+
+    shared: bool
+    """Whether the clients are shared with the other jobs of the daemon."""
+
+    def close(self, args: argparse.Namespace) -> None:
+        """Close the cache and the recorder, unless they are still used by the other jobs of the daemon."""
+
+        if self.cache and not self.shared:
+            self.cache.close()
+            print(self.cache.stats.summary(), file=sys.stderr)
+
+        if self.recorder:
+            self.recorder.close()
+            print(f"Recorded: {self.recorder.recorded} responses to {args.record}", file=sys.stderr)
+
+
+def get_clients(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    root: Path,
+    metrics: Metrics,
+    warm: WarmClients | None,
+    shard: int | None = None,
+) -> Clients:
+    """Prepare the API client, or reuse the warm clients of the daemon."""
+
+    if warm:
+        # The tokens, cache and recorder are shared by all jobs, so they are chosen when starting the daemon
+        if args.auth or args.cache or args.no_cache or args.record or args.debug:
+            parser.error(
+                "the --auth, --cache, --no-cache, --record and --debug options are set for the daemon"
+            )
+
+        # Jobs share the scheduler and the warm connections, while their requests are counted for their own report
+        collect_metrics(metrics)
+        return Clients(warm.get_client(args.base_url), warm.scheduler, warm.cache, None, True)
+
+    tokens = load_tokens(args.auth or root.joinpath("scraper").joinpath("auth.txt"))
+    auth = Auth.Token(tokens[0])
+
+    # Revalidate previously downloaded responses instead of downloading them again
+    cache = None
+    if not args.no_cache:
+        # Shards running on the same host use their own caches, so they do not wait for each other
+        default = f"http.shard-{shard}.sqlite" if shard is not None else "http.sqlite"
+        cache_path = args.cache or root.joinpath("cache").joinpath(default)
+        cache = ResponseCache(cache_path, scope="\n".join(sorted(tokens)))
+
+    # Route requests between the tokens based on their rate limits and count them for the report
+    recorder = CassetteRecorder(args.record) if args.record else None
+    scheduler = TokenScheduler(tokens)
+    install_transport(scheduler, cache, metrics, recorder)
+
+    # Rate limits are handled by the scheduler, so only server errors are retried
+    retry = Retry(
+        total=10, backoff_factor=1, status_forcelist=range(500, 600), allowed_methods={"GET", "POST"}
+    )
+
+    # The spacing is shared by all workers, while each rotated token has its own secondary rate limits
+    seconds_between_requests = Consts.DEFAULT_SECONDS_BETWEEN_REQUESTS / len(scheduler.tokens)
+
+    github = Github(
+        auth=auth,
+        base_url=args.base_url,
+        per_page=100,
+        retry=retry,
+        pool_size=max(args.workers, 1) + 1,
+        seconds_between_requests=seconds_between_requests,
+    )
 
     if args.debug:
         enable_console_debug_logging()
 
+    return Clients(github, scheduler, cache, recorder, False)
+
+
+# == Run the stages that do not need the API client
+
+
+def run_geocode(parser: argparse.ArgumentParser, args: argparse.Namespace, root: Path) -> None:
+    """Geocode the locations of the scraped users."""
+
+    # The geocoder is only installed with the analysis dependencies, so the stage is imported when used
+    from geocoding import LocationCache, geocode_file
+
+    locations = LocationCache(root.joinpath("cache").joinpath("locations.sqlite"))
+    try:
+        stats = geocode_file(root.joinpath("data").joinpath(f"users-by-{args.order}.json"), locations)
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        locations.close()
+
+    print(stats.summary(), file=sys.stderr)
+
+
+def run_cluster(args: argparse.Namespace, root: Path) -> None:
+    """Cluster the companies, locations and homepages of the scraped users."""
+
+    from clustering import AliasTable, cluster_file
+
+    aliases = AliasTable(root.joinpath("cache").joinpath("aliases.sqlite"))
+    stats = cluster_file(root.joinpath("data").joinpath(f"users-by-{args.order}.json"), aliases)
+    aliases.close()
+
+    print(stats.summary(), file=sys.stderr)
+
+
+def run_analyze(args: argparse.Namespace, root: Path) -> None:
+    """Update the summary of the scraped data."""
+
+    from summary import summarize_file
+
+    stats = summarize_file(
+        root.joinpath("data").joinpath(f"{args.dataset}.json"),
+        root.joinpath("data").joinpath(f"{args.dataset}.summary.json"),
+        root.joinpath("cache").joinpath("summaries").joinpath(f"{args.dataset}.json"),
+        args.dataset.split("-")[0],
+    )
+
+    print(stats.summary(), file=sys.stderr)
+
+
+def run_history(args: argparse.Namespace, root: Path) -> None:
+    """Store the scraped data in the history of snapshots."""
+
+    from history import add_snapshot
+
+    # The date is only resolved when the job runs, as the daemon parses the jobs using the same parser
+    stats = add_snapshot(
+        root.joinpath("data").joinpath(f"{args.dataset}.json"),
+        root.joinpath("data").joinpath("history").joinpath(f"{args.dataset}.sqlite"),
+        args.date or date.today(),
+    )
+
+    print(stats.summary(), file=sys.stderr)
+
+
+def run_query(parser: argparse.ArgumentParser, args: argparse.Namespace, root: Path) -> None:
+    """Find the top repositories matching the query."""
+
+    from index import RANKING_FIELDS, query_index, update_index
+
+    if args.sort not in RANKING_FIELDS:
+        parser.error(f"the ranking field needs to be one of {', '.join(RANKING_FIELDS)}")
+
+    # The index is updated first if the data file changed since it was built
+    index_path = root.joinpath("cache").joinpath("indexes").joinpath(f"{args.dataset}.sqlite")
+    index_path.parent.mkdir(exist_ok=True, parents=True)
+
+    with closing(sqlite3.connect(index_path)) as database:
+        stats = update_index(root.joinpath("data").joinpath(f"{args.dataset}.json"), database)
+        if stats.added or stats.changed or stats.removed:
+            print(stats.summary(), file=sys.stderr)
+
+        try:
+            result = query_index(database, args.expression, args.sort, args.limit)
+        except ValueError as error:
+            parser.error(str(error))
+
+    for match in result.records:
+        sys.stdout.buffer.write(orjson.dumps(match))
+        sys.stdout.buffer.write(b"\n")
+
+    print(result.summary(), file=sys.stderr)
+
+
+def run_export(parser: argparse.ArgumentParser, args: argparse.Namespace, root: Path) -> None:
+    """Export the top stored entities into the dataset."""
+
+    store = get_store(args, root)
+    if not store:
+        parser.error("the entity store is disabled")
+
+    output = root.joinpath("data").joinpath(f"{args.dataset}.json")
+    exported = store.export(
+        "repositories" if args.dataset.startswith("repositories") else "users",
+        ORDER_FIELDS[args.dataset],
+        args.amount,
+        output,
+        args.stale,
+    )
+    store.close()
+
+    print(f"Export: {exported} records to {output}", file=sys.stderr)
+
+
+def write_outputs(args: argparse.Namespace, stream: Path, output: Path, kind: str, fields: Fields) -> None:
+    """Compact the stream into the final JSON file, and optionally the typed columnar and matrix files."""
+
+    compact_stream(stream, output)
+
+    if args.columnar:
+        from columnar import write_columnar
+        from repositories import Repository
+        from users import User
+
+        record_type = Repository if kind == "repositories" else User
+        write_columnar(stream, output.with_suffix(f".{args.columnar}"), record_type, args.columnar, fields)
+
+    if args.matrices and kind == "repositories":
+        from matrices import write_matrices
+
+        for matrix_stats in write_matrices(stream, output):
+            print(matrix_stats.summary(), file=sys.stderr)
+
+    stream.unlink()
+
+
+def run_merge(args: argparse.Namespace, root: Path) -> None:
+    """Merge the scraped shards into the dataset."""
+
+    shards = root.joinpath("data").joinpath("shards")
+    plan_path = shards.joinpath(f"{args.dataset}.plan.json")
+    output = root.joinpath("data").joinpath(f"{args.dataset}.json")
+    stream = output.with_suffix(".jsonl")
+
+    stats = merge_shards(
+        plan_path, lambda index: shards.joinpath(f"{args.dataset}.shard-{index}.json"), stream
+    )
+
+    # The merged records are stored the same way as the records of a single scrape
+    plan = load_plan(plan_path)
+    write_outputs(
+        args, stream, output, args.dataset.split("-")[0], frozenset(plan.fields) if plan.fields else None
+    )
+
+    print(stats.summary(), file=sys.stderr)
+
+
+# == Run the stages that need the API client
+
+
+def run_plan(
+    parser: argparse.ArgumentParser, args: argparse.Namespace, root: Path, warm: WarmClients | None
+) -> None:
+    """Split the scrape of the top results into shards."""
+
+    from repositories import plan_repository_shards
+    from users import plan_user_shards
+
+    kind, _, order = args.dataset.split("-")
+
+    # The ordering field is needed to merge the shards, so it is always scraped
+    fields = get_fields(parser, args, kind)
+    if fields:
+        fields |= {ORDER_FIELDS[args.dataset]}
+
+    clients = get_clients(parser, args, root, Metrics(), warm)
+
+    match kind:
+        case "repositories":
+            planned = plan_repository_shards(clients.github, order, args.amount, args.shards)
+        case "users":
+            planned = plan_user_shards(clients.github, order, args.amount, args.shards)
+
+    plan_path = root.joinpath("data").joinpath("shards").joinpath(f"{args.dataset}.plan.json")
+    save_plan(plan_path, ShardPlan(args.dataset, args.amount, sorted(fields) if fields else None, planned))
+    clients.close(args)
+
+    total = sum(len(windows) for windows in planned)
+    print(f"Plan: {total} windows in {args.shards} shards to {plan_path}", file=sys.stderr)
+
+
+def run_graph(
+    parser: argparse.ArgumentParser, args: argparse.Namespace, root: Path, warm: WarmClients | None
+) -> None:
+    """Crawl the stargazers, contributors and followers of the scraped entities."""
+
+    from graph import EDGE_TYPES, crawl_graph, load_seeds, parse_edge_types
+
+    try:
+        edge_types = parse_edge_types(args.edges) if args.edges else tuple(EDGE_TYPES)
+    except ValueError as error:
+        parser.error(str(error))
+
+    # The graph starts from the entities of all scraped datasets
+    datasets = [root.joinpath("data").joinpath(f"{dataset}.json") for dataset in ORDER_FIELDS]
+    seeds = load_seeds([path for path in datasets if path.exists()])
+    if not len(seeds) and not args.resume:
+        parser.error("the graph needs at least one scraped dataset to start from")
+
+    metrics = Metrics()
+    clients = get_clients(parser, args, root, metrics, warm)
+
+    directory = root.joinpath("data").joinpath("graph")
+    try:
+        stats = crawl_graph(
+            clients.github,
+            directory,
+            seeds,
+            edge_types,
+            args.depth,
+            args.max_pages,
+            args.budget,
+            args.workers,
+            args.resume,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    report = directory.joinpath("report.json")
+    metrics.save(report)
+    print(f"Report: {report}", file=sys.stderr)
+
+    clients.close(args)
+    print(stats.summary(), file=sys.stderr)
+
+
+def run_scrape(
+    parser: argparse.ArgumentParser, args: argparse.Namespace, root: Path, warm: WarmClients | None
+) -> None:
+    """Scrape the top repositories or users."""
+
+    from fallback import HtmlFallback
+    from repositories import Repository, get_top_repositories
+    from users import User, get_top_users
+
+    fields = get_fields(parser, args, args.command)
+
+    # Shards scrape the windows and fields of the plan
+    shards = root.joinpath("data").joinpath("shards")
+    plan: ShardPlan | None = None
+    if args.shard is not None:
+        if args.fields:
+            parser.error("the fields of the shards are selected by the plan")
+
+        plan_path = shards.joinpath(f"{args.command}-by-{args.order}.plan.json")
+        plan = load_plan(plan_path)
+        if not 1 <= args.shard <= len(plan.shards):
+            parser.error(f"the plan only contains shards 1 to {len(plan.shards)}")
+
+        fields = frozenset(plan.fields) if plan.fields else None
+
+    # Entities hydrated by any scrape are stored, so the other scrapes can reuse them
+    store = get_store(args, root)
+
+    metrics = Metrics()
+    clients = get_clients(parser, args, root, metrics, warm, args.shard)
+
+    # == Prepare the output files
+
+    if plan:
+        output = shards.joinpath(f"{args.command}-by-{args.order}.shard-{args.shard}.json")
+    else:
+        output = root.joinpath("data").joinpath(f"{args.command}-by-{args.order}.json")
+    output.parent.mkdir(exist_ok=True, parents=True)
+
+    # Records are streamed to the JSONL file, so they are not lost if the scrape is interrupted
+    stream = output.with_suffix(".jsonl")
+    checkpoint = output.with_suffix(".checkpoint.json")
+    report = output.with_suffix(".report.json")
+    metadata: dict[str, Any] = {"command": args.command, "order": args.order}
+    if fields:
+        metadata["fields"] = sorted(fields)
+    if plan:
+        metadata["shard"] = args.shard
+
+    if args.resume and checkpoint.exists():
+        state = load_checkpoint(stream, checkpoint, metadata)
+    else:
+        state = ScrapeState()
+        stream.unlink(missing_ok=True)
+
+    # Load the previous results so unchanged entities do not need to be hydrated again
+    snapshot = Snapshot(args.refresh_from) if args.refresh_from else None
+
+    # The daemon reuses the recently probed maximum value, so small jobs do not need to probe it again
+    if warm and state.previous is None and not plan:
+        state.previous = warm.get_max_value(args.base_url, args.command, args.order)
+
     # == Run the correct scraper to collect the data
 
-    data: list
+    data: Iterator
+    record_type: type
+    live = metrics if args.live_stats else None
+
+    # Shards only scrape their planned windows, which contain the expected amount
+    amount = plan.get_amount(args.shard) if plan else args.amount
+    windows = [window for window, _ in plan.shards[args.shard - 1]] if plan else None
+
+    # Repositories are completed from their pages while the rate limit is low, instead of waiting for the reset
+    fallback = None
+    if args.html_fallback is not None:
+        fallback = HtmlFallback(
+            clients.scheduler, args.html_fallback, max(args.workers, 1), clients.cache, args.html_delay
+        )
 
     match args.command:
         case "repositories":
-            data = get_top_repositories(github, args.order, args.amount)
+            record_type = Repository
+            data = get_top_repositories(
+                clients.github,
+                args.order,
+                amount,
+                args.backend,
+                args.workers,
+                state,
+                snapshot,
+                live,
+                fields,
+                windows,
+                store,
+                fallback,
+            )
         case "users":
-            data = get_top_users(github, args.order, args.amount)
-        case _:
-            # This should not normally happen
-            raise KeyError("Unknown command")
+            record_type = User
+            data = get_top_users(
+                clients.github,
+                args.order,
+                amount,
+                args.backend,
+                args.workers,
+                state,
+                snapshot,
+                live,
+                fields,
+                windows,
+                store,
+            )
 
     # == Store the data to the correct file
 
-    output = root.joinpath("data").joinpath(f"{args.command}-by-{args.order}.json")
-    output.parent.mkdir(exist_ok=True, parents=True)
+    # Omitted fields are left out of the records instead of being written as nulls
+    names = get_field_names(record_type, fields) if fields else None
+
+    with stream.open("ab") as file:
+        for index, record in enumerate(data, start=1):
+            file.write(orjson.dumps(project(record, names) if names else record))
+            file.write(b"\n")
+            metrics.record()
+
+            # The checkpoint is only saved after the records are written
+            if index % CHECKPOINT_INTERVAL == 0:
+                file.flush()
+                save_checkpoint(checkpoint, state, metadata)
+
+    write_outputs(args, stream, output, args.command, fields)
+    checkpoint.unlink(missing_ok=True)
+
+    # The shard is only marked as finished after its records are stored
+    if plan:
+        save_manifest(output.with_suffix(".manifest.json"), plan_path, args.shard)
+
+    # == Report the statistics
+
+    metrics.save(report)
+    print(f"Report: {report}", file=sys.stderr)
+
+    if snapshot:
+        snapshot.finish(state.seen)
+        print(snapshot.stats.summary(), file=sys.stderr)
+
+    if fallback:
+        print(fallback.stats.summary(), file=sys.stderr)
+
+    if store:
+        store.close()
+        print(store.stats.summary(), file=sys.stderr)
+
+    clients.close(args)
+
+
+def run(parser: argparse.ArgumentParser, args: argparse.Namespace, warm: WarmClients | None = None) -> None:
+    """Run the command, optionally as a job of the daemon that shares its warm clients."""
+
+    root = Path(__file__).parents[1]
+
+    if warm and args.command in ("daemon", "submit"):
+        parser.error("the jobs of the daemon cannot control the daemon")
+
+    match args.command:
+        case "geocode":
+            run_geocode(parser, args, root)
+        case "cluster":
+            run_cluster(args, root)
+        case "analyze":
+            run_analyze(args, root)
+        case "history":
+            run_history(args, root)
+        case "query":
+            run_query(parser, args, root)
+        case "export":
+            run_export(parser, args, root)
+        case "merge":
+            run_merge(args, root)
+        case "plan":
+            run_plan(parser, args, root, warm)
+        case "graph":
+            run_graph(parser, args, root, warm)
+        case "repositories" | "users":
+            run_scrape(parser, args, root, warm)
+        case _:
+            parser.error("the command is required")
+
+
+def main() -> None:
+    parser = get_parser()
+    args = parser.parse_args()
+
+    root = Path(__file__).parents[1]
+
+    # == Submit the job to the daemon
+
+    if args.command == "submit":
+        queue = args.queue or root.joinpath("cache").joinpath("jobs")
+
+        # The arguments of the job may be separated from the options of the submission
+        job = args.job[1:] if args.job[:1] == ["--"] else args.job
+        if not job:
+            parser.error("the job needs a command")
+
+        name = submit_job(queue, job)
+        print(f"Submitted: job {name} to {queue}", file=sys.stderr)
+
+        if args.wait:
+            result = wait_job(queue, name)
+            if result["status"] == "failed":
+                print(f"Job {name}: failed, {result['error']}", file=sys.stderr)
+                sys.exit(1)
+            print(f"Job {name}: done in {result['finished'] - result['started']:.1f} s", file=sys.stderr)
+
+        return
+
+    # == Run the daemon
+
+    if args.command == "daemon":
+        queue = args.queue or root.joinpath("cache").joinpath("jobs")
+        tokens = load_tokens(args.auth or root.joinpath("scraper").joinpath("auth.txt"))
+
+        # The cache, scheduler and connections are created once and shared by all jobs
+        cache = None
+        if not args.no_cache:
+            cache_path = args.cache or root.joinpath("cache").joinpath("http.sqlite")
+            cache = ResponseCache(cache_path, scope="\n".join(sorted(tokens)))
+
+        recorder = CassetteRecorder(args.record) if args.record else None
+        warm = WarmClients(tokens, cache, max(args.connections, 1))
+        install_transport(warm.scheduler, cache, None, recorder)
+
+        if args.debug:
+            enable_console_debug_logging()
+
+        # Jobs use the API of the daemon unless they select another one
+        parser.set_defaults(base_url=args.base_url)
+
+        daemon = Daemon(queue, warm, parser.parse_args, partial(run, parser, warm=warm), max(args.jobs, 1))
+        print(f"Daemon: waiting for jobs in {queue}", file=sys.stderr)
+        daemon.serve()
+
+        print(warm.stats.summary(), file=sys.stderr)
+
+        if cache:
+            cache.close()
+            print(cache.stats.summary(), file=sys.stderr)
+
+        if recorder:
+            recorder.close()
+            print(f"Recorded: {recorder.recorded} responses to {args.record}", file=sys.stderr)
+
+        return
 
-    with output.open("wb") as file:
-        serialized = orjson.dumps(data)
-        file.write(serialized)
-        file.write(b"\n")
+    run(parser, args)
 
 
 if __name__ == "__main__":
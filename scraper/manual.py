@@ -1,9 +1,67 @@
+import argparse
+import os
 import sys
-from dataclasses import dataclass
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
 
 import orjson
 import requests
+import requests.adapters
 from bs4 import BeautifulSoup, Tag
+from lxml import etree, html as lxml_html
+from urllib3 import Retry
+
+from cache import ResponseCache, cached_get
+from hydration import map_ordered
+
+DEFAULT_DELAY = 1.0
+"""The default number of seconds for which each worker waits between requests to the same host."""
+
+
+def has_class(name: str) -> str:
+    """Gets the XPath condition that matches elements with the class."""
+
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Expressions are compiled once and evaluated on the already parsed tree,
+# instead of walking the whole document for each property
+
+XPATH_HEADER = etree.XPath("(//div[@id='repository-container-header'])[1]")
+XPATH_OWNER = etree.XPath(f"(.//span[{has_class('author')}])[1]")
+XPATH_NAME = etree.XPath("(.//strong[@itemprop='name'])[1]")
+
+XPATH_SIDEBAR = etree.XPath(f"(//div[{has_class('BorderGrid-cell')}])[1]/descendant::div[1]")
+XPATH_DESCRIPTION = etree.XPath("(.//*[count(preceding-sibling::*) = 1])[1]")
+XPATH_HOMEPAGE = etree.XPath(
+    f"(.//*[local-name() = 'svg'][{has_class('octicon-link')}])[1]/../descendant::a[@href][1]/@href"
+)
+XPATH_TOPICS = etree.XPath("(.//h3[. = 'Topics'])[1]/following-sibling::div[1]//a")
+XPATH_WATCHERS = etree.XPath("(.//a[contains(., ' watching')])[1]")
+
+XPATH_DEFAULT_BRANCH = etree.XPath("(//button[@id='branch-picker-repos-header-ref-selector'])[1]")
+XPATH_FILES = etree.XPath("(//nav[@aria-label='Repository files'])[1]")
+XPATH_LICENSE_UNKNOWN = etree.XPath("(.//span[contains(., 'License')])[1]")
+XPATH_LICENSE = etree.XPath("(.//span[contains(., ' license')])[1]")
+XPATH_LANGUAGES = etree.XPath(f"(//h2[{has_class('h4')}][. = 'Languages'])[1]/../descendant::ul[1]//li")
+XPATH_COMMITS = etree.XPath(
+    "(//table[@aria-labelledby='folders-and-files'])[1]/descendant::span[contains(., ' Commits')][1]"
+)
+
+XPATH_COUNTER = etree.XPath("(//span[@id=$id])[1]")
+XPATH_RELEASES = etree.XPath(f"(//a[contains(@href, 'releases')]//*[{has_class('Counter')}])[1]")
+XPATH_PACKAGES = etree.XPath(f"(//a[contains(@href, 'packages')]//*[{has_class('Counter')}])[1]")
+XPATH_CONTRIBUTORS = etree.XPath(
+    "(//a[substring(@href, string-length(@href) - 18) = 'graphs/contributors']"
+    f"//*[{has_class('Counter')}])[1]"
+)
 
 
 # mypy: ignore-errors
@@ -28,7 +86,7 @@ class Repository:
     license: str | None
     """The repository license, if detected."""
 
-    languages: dict[str, int]
+    languages: dict[str, str]
     """The all repository languages with percentages."""
 
     # == Social Properties
@@ -98,13 +156,126 @@ def get_number_from_counter(element: Tag | None) -> int:
     return parse_number(element["title"])
 
 
-def get_repository_details(url: str) -> Repository:
+def get_repository_details(
+    url: str,
+    cache: ResponseCache | None = None,
+    session: requests.Session | None = None,
+) -> Repository:
     """Gets the repository details by downloading and parsing the repository page."""
 
-    response = requests.get(url)
+    response = cached_get(session or requests.Session(), url, cache)
     response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, features="lxml")
+    return parse_repository(url, response.text)
+
+
+def get_text(elements: list) -> str | None:
+    """Gets the text of the first element, returns None if it does not exist."""
+
+    return str(elements[0].text_content()) if elements else None
+
+
+def get_number_from_counters(elements: list) -> int:
+    """Gets the number from the first counter, returns 0 if it does not exist."""
+
+    if not elements:
+        return 0
+
+    return parse_number(elements[0].attrib["title"])
+
+
+def parse_repository(url: str, html: str) -> Repository:
+    """Parses the repository details from the repository page using precompiled XPath expressions."""
+
+    document = lxml_html.document_fromstring(html)
+
+    # Get the repository properties from the header
+    header = XPATH_HEADER(document)[0]
+    owner = get_text(XPATH_OWNER(header)).strip()
+    name = get_text(XPATH_NAME(header)).strip()
+
+    # Get the repository sidebar
+    sidebar = XPATH_SIDEBAR(document)[0]
+
+    # Get the repository description from the sidebar
+    # If the description is not set, the text is displayed in italic
+    description = None
+    if (description_box := XPATH_DESCRIPTION(sidebar)) and (
+        "text-italic" not in description_box[0].get("class", "").split()
+    ):
+        description = get_text(description_box).strip()
+
+    # Get the repository homepage and topics from the sidebar
+    homepage = str(homepages[0]) if (homepages := XPATH_HOMEPAGE(sidebar)) else None
+    topics = [str(topic.text_content()).strip() for topic in XPATH_TOPICS(sidebar)]
+
+    # Get the default repository branch
+    default_branch = get_text(XPATH_DEFAULT_BRANCH(document)).strip()
+
+    # Get the repository license from the files navigation
+    files = XPATH_FILES(document)
+    if files and XPATH_LICENSE_UNKNOWN(files[0]):
+        # There is a license, but we could not classify it
+        license = "NOASSERTION"
+    elif files and (license_box := XPATH_LICENSE(files[0])):
+        # There is a license, and we could classify it
+        license = get_text(license_box).split(" ")[0]
+    else:
+        # There is no license detected
+        license = None
+
+    # Get the repository languages from the sidebar
+    languages = {}
+    for language_item in XPATH_LANGUAGES(document):
+        language_name, language_percentage = str(language_item.text_content()).strip().split("\n")
+        languages[language_name] = language_percentage
+
+    # Get the base repository counters
+    stargazers_count = get_number_from_counters(XPATH_COUNTER(document, id="repo-stars-counter-star"))
+    forks_count = get_number_from_counters(XPATH_COUNTER(document, id="repo-network-counter"))
+    open_issues_count = get_number_from_counters(XPATH_COUNTER(document, id="issues-repo-tab-count"))
+    open_prs_count = get_number_from_counters(XPATH_COUNTER(document, id="pull-requests-repo-tab-count"))
+    open_projects_count = get_number_from_counters(XPATH_COUNTER(document, id="projects-repo-tab-count"))
+
+    # Get the watchers and commits counts from their boxes
+    watchers_count = parse_number(get_text(XPATH_WATCHERS(sidebar)).split(" ")[0])
+    commits_count = parse_number(get_text(XPATH_COMMITS(document)).split(" ")[0])
+
+    # Get the releases, packages and contributors counts from the counters in the sidebar
+    releases_count = get_number_from_counters(XPATH_RELEASES(document))
+    packages_count = get_number_from_counters(XPATH_PACKAGES(document))
+    contributors_count = get_number_from_counters(XPATH_CONTRIBUTORS(document))
+
+    return Repository(
+        # == Basic Properties
+        owner=owner,
+        name=name,
+        url=url,
+        default_branch=default_branch,
+        license=license,
+        languages=languages,
+        # == Social Properties
+        description=description,
+        homepage=homepage,
+        topics=topics,
+        # == Counts Properties
+        stargazers_count=stargazers_count,
+        watchers_count=watchers_count,
+        forks_count=forks_count,
+        open_issues_count=open_issues_count,
+        open_prs_count=open_prs_count,
+        open_projects_count=open_projects_count,
+        commits_count=commits_count,
+        releases_count=releases_count,
+        packages_count=packages_count,
+        contributors_count=contributors_count,
+    )
+
+
+def parse_repository_soup(url: str, html: str) -> Repository:
+    """Parses the repository details from the repository page using BeautifulSoup, which is slower but simpler."""
+
+    soup = BeautifulSoup(html, features="lxml")
 
     # Get the repository properties from the header
     header = soup.find("div", {"id": "repository-container-header"})
@@ -210,14 +381,156 @@ def get_repository_details(url: str) -> Repository:
     )
 
 
+class HostPacer:
+    """Spaces the requests to the same host by the minimum delay."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.scheduled: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        """Wait until the request to the URL host can be sent."""
+
+        host = urlsplit(url).netloc
+
+        # Reserve the next slot for the host, so concurrent workers wait for different slots
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.scheduled.get(host, 0))
+            self.scheduled[host] = slot + self.delay
+
+        time.sleep(slot - now)
+
+
+def create_session(workers: int) -> requests.Session:
+    """Creates the keep-alive session with a connection pool for all workers."""
+
+    # Rate limits and server errors are retried, respecting the retry-after header
+    retry = Retry(total=5, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry, pool_connections=workers, pool_maxsize=workers)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_page(
+    session: requests.Session,
+    pacer: HostPacer,
+    cache: ResponseCache | None,
+    url: str,
+) -> tuple[str, str | None, str | None]:
+    """Downloads the repository page, returning the page or the error instead of raising it."""
+
+    pacer.wait(url)
+
+    try:
+        response = cached_get(session, url, cache)
+        response.raise_for_status()
+    except requests.RequestException as error:
+        return url, None, f"{type(error).__name__}: {error}"
+
+    return url, response.text, None
+
+
+def parse_page(page: tuple[str, str | None, str | None]) -> dict[str, Any]:
+    """Parses the downloaded page into the record, or the error record if it could not be parsed."""
+
+    url, html, error = page
+
+    if html is None:
+        return {"url": url, "error": error}
+
+    # Page layouts differ between repositories, so one broken page should not stop the batch
+    try:
+        return asdict(parse_repository(url, html))
+    except Exception as error:
+        return {"url": url, "error": f"{type(error).__name__}: {error}"}
+
+
+def get_bulk_repository_details(
+    urls: Iterable[str],
+    workers: int,
+    delay: float | None = None,
+    cache: ResponseCache | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Gets the details of many repositories, downloading and parsing the pages concurrently."""
+
+    session = create_session(workers)
+
+    # All pages are usually on the same host, so the default delay is shared by the workers
+    pacer = HostPacer(DEFAULT_DELAY / workers if delay is None else delay)
+
+    # Pages are downloaded on threads, while the CPU-bound parsing runs on processes
+    download = partial(download_page, session, pacer, cache)
+    pages = map_ordered(download, urls, workers)
+    yield from map_ordered(parse_page, pages, min(workers, os.cpu_count() or 1), processes=True)
+
+
+def read_urls(path: str) -> Iterator[str]:
+    """Reads the repository URLs from the file or standard input, one per line."""
+
+    file = sys.stdin if path == "-" else open(path, encoding="utf-8")
+
+    with file:
+        for line in file:
+            if url := line.strip():
+                yield url
+
+
 def main() -> None:
-    if len(sys.argv) != 2:
-        print("Usage: python scrapers/manual.py YOUR-REPOSITORY-URL", file=sys.stderr)
-        sys.exit(1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url", nargs="?", help="the repository URL")
+    parser.add_argument("--input", help="the file with repository URLs, one per line, or - for stdin")
+    parser.add_argument("--output", type=Path, help="the JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=8, help="the number of concurrent downloads")
+    parser.add_argument(
+        "--delay",
+        type=float,
+        help="the minimum seconds between requests to a host (default: 1 divided by the workers)",
+    )
+    parser.add_argument("--cache", action="store_true", help="use the HTTP cache for the single repository")
+    parser.add_argument("--no-cache", action="store_true", help="disable the HTTP cache for the repositories")
+
+    args = parser.parse_args()
+
+    if bool(args.url) == bool(args.input):
+        parser.error("either the repository URL or --input is required")
+
+    root = Path(__file__).parents[1]
+
+    # The cache is only used for a single repository if it is requested
+    use_cache = args.cache if args.url else not args.no_cache
+    cache = None
+    if use_cache:
+        cache = ResponseCache(root.joinpath("cache").joinpath("http.sqlite"), scope="anonymous")
+
+    if args.url:
+        details = get_repository_details(args.url, cache)
+        print(orjson.dumps(details, option=orjson.OPT_INDENT_2).decode())
+
+    else:
+        succeeded = failed = 0
+
+        # Results are streamed, so they are not lost if the batch is interrupted
+        with args.output.open("wb") if args.output else nullcontext(sys.stdout.buffer) as output:
+            for record in get_bulk_repository_details(read_urls(args.input), args.workers, args.delay, cache):
+                output.write(orjson.dumps(record))
+                output.write(b"\n")
+                output.flush()
+
+                if "error" in record:
+                    failed += 1
+                else:
+                    succeeded += 1
+
+        print(f"Repositories: {succeeded} succeeded, {failed} failed", file=sys.stderr)
 
-    url = sys.argv[1]
-    details = get_repository_details(url)
-    print(orjson.dumps(details, option=orjson.OPT_INDENT_2).decode())
+    if cache:
+        cache.close()
+        print(cache.stats.summary(), file=sys.stderr)
 
 
 if __name__ == "__main__":
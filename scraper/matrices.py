@@ -0,0 +1,118 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import orjson
+
+MATRIX_FIELDS: dict[str, type] = {"languages": np.int64, "topics": np.int32}
+"""The fields of the repositories that are written as sparse matrices, and the types of their values."""
+
+
+@dataclass
+class MatrixStats:
+    field: str
+    """The field of the records that the matrix was built from."""
+
+    rows: int = 0
+    """The number of records in the matrix."""
+
+    terms: int = 0
+    """The number of terms in the vocabulary."""
+
+    added: int = 0
+    """The number of terms that were added to the vocabulary of the previous matrix."""
+
+    nonzeros: int = 0
+    """The number of stored values in the matrix."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return (
+            f"Matrix {self.field}: {self.rows} rows, {self.terms} terms ({self.added} added), "
+            f"{self.nonzeros} values"
+        )
+
+
+def load_vocabulary(path: Path) -> list[str]:
+    """Load the vocabulary of the previous matrix, which is empty if it does not exist."""
+
+    if not path.exists():
+        return []
+
+    with np.load(path) as previous:
+        vocabulary: list[str] = previous["vocabulary"].tolist()
+
+    return vocabulary
+
+
+def get_weights(value: Any) -> dict[str, int]:
+    """Get the weights of the terms in the field, with each item of the list weighted by one."""
+
+    if isinstance(value, list):
+        return dict.fromkeys(value, 1)
+    return value or {}
+
+
+def write_matrix(records: list[dict[str, Any]], field: str, output: Path) -> MatrixStats:
+    """Write the field of the records into the CSR matrix file that SciPy can load, next to its vocabulary."""
+
+    stats = MatrixStats(field, len(records))
+    weights = [get_weights(record.get(field)) for record in records]
+
+    # Terms keep their columns from the previous matrix, so matrices of different scrapes can be compared
+    vocabulary = load_vocabulary(output)
+    added = sorted({term for row in weights for term in row}.difference(vocabulary))
+    vocabulary.extend(added)
+    columns = {term: column for column, term in enumerate(vocabulary)}
+
+    counts = np.fromiter((len(row) for row in weights), dtype=np.int64, count=len(weights))
+    indptr = np.zeros(len(weights) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    indices = np.fromiter(
+        (columns[term] for row in weights for term in row), dtype=np.int64, count=indptr[-1]
+    )
+    data: np.ndarray = np.fromiter(
+        (value for row in weights for value in row.values()), dtype=MATRIX_FIELDS[field], count=indptr[-1]
+    )
+
+    # The columns of each row are sorted, as SciPy expects from canonical matrices
+    order = np.lexsort((indices, np.repeat(np.arange(len(weights)), counts)))
+    indices, data = indices[order], data[order]
+
+    temporary = output.with_name(f"{output.name}.tmp")
+
+    with temporary.open("wb") as file:
+        np.savez_compressed(
+            file,
+            format=np.array(b"csr"),
+            shape=np.array([len(weights), len(vocabulary)], dtype=np.int64),
+            indptr=indptr,
+            indices=indices.astype(np.int32),
+            data=data,
+            _is_array=np.array(True),
+            vocabulary=np.array(vocabulary, dtype=str),
+            ids=np.array([record["id"] for record in records], dtype=np.int64),
+        )
+
+    os.replace(temporary, output)
+
+    stats.terms, stats.added, stats.nonzeros = len(vocabulary), len(added), len(data)
+    return stats
+
+
+def write_matrices(stream: Path, output: Path) -> list[MatrixStats]:
+    """Write the languages and topics of the JSONL stream of repositories into the matrix files."""
+
+    with stream.open("rb") as file:
+        records = [orjson.loads(line) for line in file]
+
+    # Fields that were not selected are left out of the records, so their matrices are not written
+    return [
+        write_matrix(records, field, output.with_suffix(f".{field}.npz"))
+        for field in MATRIX_FIELDS
+        if not records or field in records[0]
+    ]
@@ -0,0 +1,251 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+from urllib.parse import urlsplit
+
+import orjson
+from requests import Response
+
+from scheduler import Resource, get_resource
+
+Phase = Literal[
+    "probe",
+    "count",
+    "search",
+    "completion",
+    "repositories_count",
+    "watchers",
+    "languages",
+    "graphql",
+    "stargazers",
+    "contributors",
+    "followers",
+    "other",
+]
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""The upper bounds of the latency histogram buckets in seconds."""
+
+SAMPLE_INTERVAL = 100
+"""The number of records after which the request budget is sampled."""
+
+_local = threading.local()
+
+
+@contextmanager
+def phase(name: Phase) -> Iterator[None]:
+    """Attribute the requests made by the current thread to the scraper phase."""
+
+    previous = current_phase()
+    _local.phase = name
+
+    try:
+        yield
+    finally:
+        _local.phase = previous
+
+
+def current_phase() -> Phase:
+    """Get the scraper phase of the current thread."""
+
+    return getattr(_local, "phase", "other")
+
+
+def get_endpoint(verb: str, url: str) -> str:
+    """Get the endpoint of the request with the entity names replaced by placeholders."""
+
+    parts = urlsplit(url).path.strip("/").split("/")
+
+    # Enterprise servers serve the API under a prefix
+    if parts[:2] == ["api", "v3"]:
+        parts = parts[2:]
+
+    match parts:
+        case ["users", _, *rest]:
+            parts = ["users", "{user}", *rest]
+        case ["orgs", _, *rest]:
+            parts = ["orgs", "{org}", *rest]
+        case ["repos", _, _, *rest]:
+            parts = ["repos", "{owner}", "{repo}", *rest]
+        case ["repositories", _, *rest]:
+            parts = ["repositories", "{id}", *rest]
+        case ["user", _, *rest]:
+            parts = ["user", "{id}", *rest]
+
+    return f"{verb} /{'/'.join(parts)}"
+
+
+@dataclass
+class RequestStats:
+    requests: int = 0
+    """The number of sent requests, including the retried ones."""
+
+    retries: int = 0
+    """The number of requests retried due to server errors."""
+
+    rate_limited: int = 0
+    """The number of requests rejected due to rate limits."""
+
+    not_modified: int = 0
+    """The number of requests answered with 304 Not Modified."""
+
+    bytes_sent: int = 0
+    """The total size of request bodies."""
+
+    bytes_received: int = 0
+    """The total size of response bodies."""
+
+    latency: float = 0
+    """The total latency of requests in seconds."""
+
+    histogram: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    """The number of requests in each latency bucket, with the last one being unbounded."""
+
+    def observe(self, response: Response, sent: int, latency: float) -> None:
+        """Add the response to the statistics."""
+
+        retries = getattr(response.raw, "retries", None)
+
+        self.requests += 1
+        self.retries += len(retries.history) if retries else 0
+        self.not_modified += response.status_code == 304
+        self.bytes_sent += sent
+        self.bytes_received += len(response.content)
+        self.latency += latency
+        self.histogram[sum(latency > bound for bound in LATENCY_BUCKETS)] += 1
+
+    def merge(self, other: "RequestStats") -> None:
+        """Add the other statistics to these statistics."""
+
+        self.requests += other.requests
+        self.retries += other.retries
+        self.rate_limited += other.rate_limited
+        self.not_modified += other.not_modified
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.latency += other.latency
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram, strict=True)]
+
+    def to_json(self) -> dict[str, Any]:
+        """Get the JSON representation of the statistics."""
+
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "not_modified": self.not_modified,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "mean_latency": self.latency / self.requests if self.requests else 0,
+            "latency_histogram": dict(zip(labels, self.histogram, strict=True)),
+        }
+
+
+class Metrics:
+    """Collects the request statistics per scraper phase and endpoint."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+        self.stats: dict[tuple[Phase, str], RequestStats] = {}
+        self.budget: dict[Resource, int] = {}
+        self.records = 0
+
+        # The budget is sampled periodically to find the parts of the scrape that use the most of it
+        self.samples: list[dict[str, Any]] = []
+        self.sampled_budget: dict[Resource, int] = {}
+
+    def _get_stats(self, verb: str, url: str) -> RequestStats:
+        return self.stats.setdefault((current_phase(), get_endpoint(verb, url)), RequestStats())
+
+    def observe(self, verb: str, url: str, input: Any, response: Response, latency: float) -> None:
+        """Record the completed request."""
+
+        sent = len(input) if isinstance(input, str | bytes) else 0
+
+        with self.lock:
+            self._get_stats(verb, url).observe(response, sent, latency)
+
+            # Conditional requests do not count against the rate limit if the response has not changed
+            if response.status_code != 304:
+                resource = get_resource(urlsplit(url).path)
+                self.budget[resource] = self.budget.get(resource, 0) + 1
+
+    def observe_rate_limit(self, verb: str, url: str) -> None:
+        """Record that the request was rejected due to rate limits."""
+
+        with self.lock:
+            self._get_stats(verb, url).rate_limited += 1
+
+    def record(self) -> None:
+        """Record that another record was scraped."""
+
+        with self.lock:
+            self.records += 1
+
+            if self.records % SAMPLE_INTERVAL == 0:
+                used = {
+                    resource: count - self.sampled_budget.get(resource, 0)
+                    for resource, count in self.budget.items()
+                }
+
+                self.samples.append(
+                    {"records": self.records, "elapsed": time.perf_counter() - self.started, "budget": used}
+                )
+                self.sampled_budget = dict(self.budget)
+
+    def totals(self) -> RequestStats:
+        """Get the statistics of all requests."""
+
+        totals = RequestStats()
+        with self.lock:
+            for stats in self.stats.values():
+                totals.merge(stats)
+        return totals
+
+    def postfix(self) -> str:
+        """Get the short live summary for the progress bar."""
+
+        totals = self.totals()
+        per_record = totals.requests / self.records if self.records else 0
+        return f"{totals.requests} req, {per_record:.1f}/rec, {totals.retries + totals.rate_limited} retried"
+
+    def report(self) -> dict[str, Any]:
+        """Get the full report of the collected statistics."""
+
+        phases: dict[str, RequestStats] = {}
+        endpoints: dict[str, RequestStats] = {}
+
+        with self.lock:
+            for (name, endpoint), stats in sorted(self.stats.items()):
+                phases.setdefault(name, RequestStats()).merge(stats)
+                endpoints.setdefault(endpoint, RequestStats()).merge(stats)
+
+            budget = dict(self.budget)
+            samples = list(self.samples)
+
+        totals = self.totals()
+
+        return {
+            "elapsed": time.perf_counter() - self.started,
+            "records": self.records,
+            "requests_per_record": totals.requests / self.records if self.records else 0,
+            "totals": totals.to_json(),
+            "phases": {phase: stats.to_json() for phase, stats in phases.items()},
+            "endpoints": {endpoint: stats.to_json() for endpoint, stats in endpoints.items()},
+            "budget": budget,
+            "budget_samples": samples,
+        }
+
+    def save(self, path: Path) -> None:
+        """Write the report to the JSON file."""
+
+        with path.open("wb") as file:
+            file.write(orjson.dumps(self.report(), option=orjson.OPT_INDENT_2))
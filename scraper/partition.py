@@ -0,0 +1,139 @@
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from github import Github
+
+SEARCH_LIMIT = 1000
+"""The maximum number of results the search API returns for a single query."""
+
+MIN_FILL = 0.5
+"""The fraction of the search limit after which a window is considered large enough."""
+
+TARGET_FILL = 0.75
+"""The fraction of the search limit that the guessed windows are sized for."""
+
+GITHUB_FOUNDED = date(2007, 10, 1)
+"""The earliest possible creation date of any entity."""
+
+
+@dataclass(frozen=True)
+class Window:
+    low: int
+    """The lowest value of the ordering property in the window."""
+
+    high: int
+    """The highest value of the ordering property in the window."""
+
+    created: tuple[date, date] | None = None
+    """The range of creation dates in the window, if the window is split by dates."""
+
+    def query(self, qualifier: str) -> str:
+        """Get the search query for the window using the qualifier of the ordering property."""
+
+        query = f"{qualifier}:{self.low}..{self.high}"
+        if self.created:
+            query += f" created:{self.created[0].isoformat()}..{self.created[1].isoformat()}"
+        return query
+
+    def __str__(self) -> str:
+        if self.created:
+            return f"{self.low}-{self.high} ({self.created[0]}..{self.created[1]})"
+        return f"{self.low}-{self.high}"
+
+
+def count_results(github: Github, path: str, query: str) -> int:
+    """Get the total number of search results using a single request."""
+
+    # PaginatedList caps the total count at the search limit, so we need to request it directly
+    requester = github._Github__requester  # type: ignore[attr-defined]
+    _, data = requester.requestJsonAndCheck("GET", path, parameters={"q": query, "per_page": 1})
+    return int(data["total_count"])
+
+
+def find_window(count: Callable[[Window], int], high: int, guess: int | None = None) -> tuple[Window, int]:
+    """Find the widest window ending at the high value that fits within the search limit, trying the guess first."""
+
+    best: int | None = None
+    best_total = 0
+    start, end = 1, high - 1
+
+    # The guessed window usually fits and is large enough, so the search is not needed
+    if guess is not None:
+        total = count(Window(guess, high))
+
+        if total <= SEARCH_LIMIT:
+            if total >= SEARCH_LIMIT * MIN_FILL:
+                return Window(guess, high), total
+            best, best_total = guess, total
+            end = guess - 1
+        elif guess == high:
+            return Window(high, high), total
+        else:
+            start = guess + 1
+
+    # Dense values that cannot fit even on their own need to be split by dates
+    if best is None:
+        if (total := count(Window(high, high))) > SEARCH_LIMIT:
+            return Window(high, high), total
+        best, best_total = high, total
+
+    # Find the lowest value that still fits, stopping early if the window is large enough
+    while start <= end:
+        middle = (start + end) // 2
+        total = count(Window(middle, high))
+
+        if total <= SEARCH_LIMIT:
+            best, best_total = middle, total
+            if total >= SEARCH_LIMIT * MIN_FILL:
+                break
+            end = middle - 1
+        else:
+            start = middle + 1
+
+    return Window(best, high), best_total
+
+
+def split_by_created(
+    count: Callable[[Window], int],
+    window: Window,
+    start: date,
+    end: date,
+) -> Iterator[tuple[Window, int]]:
+    """Split the window by creation dates into windows that fit within the search limit."""
+
+    split = Window(window.low, window.high, (start, end))
+    total = count(split)
+
+    # Windows of a single day cannot be split further, so their results are truncated
+    if total <= SEARCH_LIMIT or start == end:
+        yield split, total
+        return
+
+    middle = start + (end - start) // 2
+    yield from split_by_created(count, window, start, middle)
+    yield from split_by_created(count, window, middle + timedelta(days=1), end)
+
+
+def plan_windows(count: Callable[[Window], int], high: int, amount: int) -> Iterator[Window]:
+    """Plan disjoint windows from the high value downwards that fit within the search limit and cover the amount."""
+
+    total = 0
+    guess = None
+
+    while high >= 1 and total < amount:
+        window, found = find_window(count, high, guess)
+
+        if found > SEARCH_LIMIT:
+            for split, split_found in split_by_created(count, window, GITHUB_FOUNDED, date.today()):
+                yield split
+                total += split_found
+        else:
+            yield window
+            total += found
+
+        high = window.low - 1
+
+        # Values get denser towards the low end slowly, so the next window is sized by the density of this one
+        width = (window.high - window.low + 1) * SEARCH_LIMIT * TARGET_FILL / max(found, 1)
+        guess = max(high - max(int(width), 1) + 1, 1)
@@ -0,0 +1,57 @@
+from dataclasses import fields as get_fields
+from enum import Enum
+from typing import Any, Final
+
+Fields = frozenset[str] | None
+"""The selected fields of the records, or None if all fields are selected."""
+
+REQUIRED_FIELDS = frozenset({"id"})
+"""The fields that are always selected, as records are identified by them."""
+
+
+class Omitted(Enum):
+    """The value of the field that was not selected, which is never written to the output."""
+
+    OMITTED = "OMITTED"
+
+    def __repr__(self) -> str:
+        return "OMITTED"
+
+
+OMITTED: Final = Omitted.OMITTED
+"""The marker of the omitted fields, which the record types allow for the fields that can be left out."""
+
+
+def parse_fields(value: str | None, record_type: type) -> Fields:
+    """Parse the comma-separated list of selected fields of the record type."""
+
+    if value is None:
+        return None
+
+    selected = {name.strip() for name in value.split(",") if name.strip()}
+    available = {field.name for field in get_fields(record_type)}
+
+    if unknown := selected - available:
+        raise ValueError(
+            f"Unknown fields {', '.join(sorted(unknown))}, available: {', '.join(sorted(available))}"
+        )
+
+    return frozenset(selected | REQUIRED_FIELDS)
+
+
+def is_selected(fields: Fields, name: str) -> bool:
+    """Check whether the field is selected."""
+
+    return fields is None or name in fields
+
+
+def get_field_names(record_type: type, fields: Fields) -> list[str]:
+    """Get the names of the selected fields, in the order of the record type."""
+
+    return [field.name for field in get_fields(record_type) if is_selected(fields, field.name)]
+
+
+def project(record: Any, names: list[str]) -> dict[str, Any]:
+    """Get the selected fields of the record, leaving out the omitted ones."""
+
+    return {name: getattr(record, name) for name in names}
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+
+@dataclass
+class RefreshStats:
+    reused: int = 0
+    """The number of entities carried over from the snapshot without expensive requests."""
+
+    refreshed: int = 0
+    """The number of entities from the snapshot that had to be hydrated again."""
+
+    added: int = 0
+    """The number of entities that were not in the snapshot."""
+
+    dropped: int = 0
+    """The number of entities from the snapshot that are not in the new results."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return (
+            f"Refresh: {self.reused} reused, {self.refreshed} refreshed, "
+            f"{self.added} added, {self.dropped} dropped"
+        )
+
+
+class Snapshot:
+    """The results of the previous scrape, indexed by entity IDs."""
+
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as file:
+            records = orjson.loads(file.read())
+
+        # Decoded records take several times more memory than their JSON, so they are kept serialized
+        # and only decoded when the entity is found again, which happens once per entity
+        # Strings are used instead of bytes, as the serialized bytes over-allocate their buffers
+        self.records: dict[int, str] = {record["id"]: orjson.dumps(record).decode() for record in records}
+        del records
+        self.reused: dict[int, bool] = {}
+        self.stats = RefreshStats()
+
+    def get(self, id: int) -> dict[str, Any] | None:
+        """Get the previous record of the entity, if it exists."""
+
+        record = self.records.get(id)
+        return orjson.loads(record) if record is not None else None
+
+    def record(self, id: int, reused: bool) -> None:
+        """Record whether the entity was reused or had to be hydrated again."""
+
+        self.reused[id] = reused
+
+    def finish(self, seen: set[int]) -> None:
+        """Compute the statistics for the entities in the results."""
+
+        # Workers may hydrate a few more entities than needed, so we only count the ones in the results
+        for id in seen:
+            if id not in self.records:
+                self.stats.added += 1
+            elif self.reused.get(id, False):
+                self.stats.reused += 1
+            else:
+                self.stats.refreshed += 1
+
+        self.stats.dropped = len(self.records.keys() - seen)
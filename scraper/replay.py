@@ -0,0 +1,658 @@
+import argparse
+import random
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Protocol
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import orjson
+
+from partition import SEARCH_LIMIT
+from scheduler import Resource, get_resource
+
+RECORDED_HEADERS = ("content-type", "link", "etag", "last-modified", "x-ratelimit-resource")
+"""The response headers that are stored in cassettes, as the rate limit headers are added by the server."""
+
+SEARCH_QUERY = re.compile(
+    r"^(?P<qualifier>followers|repos|stars|forks):(?:>(?P<above>\d+)|(?P<low>\d+)\.\.(?P<high>\d+))"
+    r"(?: created:(?P<start>[\d-]+)\.\.(?P<end>[\d-]+))?$"
+)
+"""The search queries that the synthetic server supports, which are the ones the scrapers use."""
+
+LANGUAGES = ("Python", "JavaScript", "TypeScript", "Go", "Rust", "C", "C++", "Java", "Shell", "HTML")
+"""The languages of the synthetic repositories."""
+
+LICENSES = ("MIT", "Apache-2.0", "GPL-3.0", "BSD-3-Clause", None)
+"""The licenses of the synthetic repositories."""
+
+PAGES_PREFIX = "/pages/"
+"""The path prefix of the synthetic repository pages, which imitate the website instead of the API."""
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<body>
+<div id="repository-container-header"><span class="author">{owner}</span><strong itemprop="name">{name}</strong></div>
+<button id="branch-picker-repos-header-ref-selector">{default_branch}</button>
+<table aria-labelledby="folders-and-files"><tr><td><span>{commits} Commits</span></td></tr></table>
+<div class="BorderGrid-cell"><div><h2>About</h2><p>{description}</p><a href="#">{watchers} watching</a></div></div>
+<div class="BorderGrid-cell"><h2 class="h4">Languages</h2><ul>{languages}</ul></div>
+</body>
+</html>
+"""
+"""The minimal repository page that the HTML scraper can parse."""
+
+Reply = tuple[int, dict[str, str], bytes]
+
+
+# == Recording
+
+
+def get_key(method: str, url: str, body: Any) -> str:
+    """Get the key that identifies the request in the cassette."""
+
+    if isinstance(body, bytes):
+        body = body.decode()
+
+    # GraphQL queries are compared by their content, so the formatting does not matter
+    if body:
+        try:
+            body = orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS).decode()
+        except orjson.JSONDecodeError:
+            pass
+
+    return f"{method} {url}\n{body or ''}"
+
+
+class CassetteRecorder:
+    """Records the API responses into the cassette, so they can be replayed without the network."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(exist_ok=True, parents=True)
+
+        self.file = path.open("ab")
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def record(
+        self,
+        origin: str,
+        verb: str,
+        url: str,
+        input: Any,
+        status: int,
+        headers: Mapping[str, str],
+        body: str,
+    ) -> None:
+        """Record the response to the request."""
+
+        interaction = {
+            "origin": origin,
+            "key": get_key(verb, url, input),
+            "status": status,
+            "headers": {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+            "body": body,
+        }
+
+        with self.lock:
+            self.file.write(orjson.dumps(interaction))
+            self.file.write(b"\n")
+            self.recorded += 1
+
+    def close(self) -> None:
+        """Close the cassette."""
+
+        self.file.close()
+
+
+# == Backends
+
+
+class Backend(Protocol):
+    def handle(self, method: str, url: str, body: bytes) -> Reply: ...
+
+
+def reply(status: int, data: Any, headers: dict[str, str] | None = None) -> Reply:
+    """Create the JSON reply."""
+
+    return status, {"Content-Type": "application/json; charset=utf-8", **(headers or {})}, orjson.dumps(data)
+
+
+class CassetteBackend:
+    """Replays the recorded responses, rewriting the recorded URLs to the server."""
+
+    def __init__(self, path: Path, origin: str) -> None:
+        self.interactions: dict[str, Reply] = {}
+        self.misses = 0
+
+        with path.open("rb") as file:
+            for line in file:
+                interaction = orjson.loads(line)
+                recorded = interaction["origin"]
+
+                headers = {
+                    name: value.replace(recorded, origin) for name, value in interaction["headers"].items()
+                }
+                body = interaction["body"].replace(recorded, origin).encode()
+
+                # Repeated requests are replayed with the latest response
+                self.interactions[interaction["key"]] = (interaction["status"], headers, body)
+
+    def handle(self, method: str, url: str, body: bytes) -> Reply:
+        if (recorded := self.interactions.get(get_key(method, url, body))) is not None:
+            return recorded
+
+        self.misses += 1
+        print(f"Not recorded: {method} {url}", file=sys.stderr)
+        return reply(404, {"message": "Not recorded in the cassette"})
+
+
+@dataclass
+class Ranking:
+    values: list[int]
+    """The negated values of the ordering property, sorted in ascending order."""
+
+    items: list[dict[str, Any]]
+    """The items in the order of their values."""
+
+    created: list[int]
+    """The creation dates of the items as ordinals."""
+
+
+def get_ranking(items: list[dict[str, Any]], key: str) -> Ranking:
+    """Sort the items by the property in descending order, as the search API does."""
+
+    ordered = sorted(items, key=lambda item: (-item[key], item["id"]))
+    return Ranking(
+        [-item[key] for item in ordered],
+        ordered,
+        [date.fromisoformat(item["created_at"][:10]).toordinal() for item in ordered],
+    )
+
+
+def get_power_law(rank: int, scale: int) -> int:
+    """Get the value of the long-tailed property at the rank, which becomes dense at high ranks."""
+
+    return 1000 + int(scale / (rank + 1) ** 0.8)
+
+
+class SyntheticBackend:
+    """Serves a deterministic synthetic population of users and repositories of the specified size."""
+
+    def __init__(self, amount: int, origin: str, seed: int = 0) -> None:
+        self.origin = origin
+        rng = random.Random(seed)
+
+        start = date(2008, 1, 1).toordinal()
+        days = date(2024, 1, 1).toordinal() - start
+
+        def timestamp() -> str:
+            return f"{date.fromordinal(start + rng.randrange(days)).isoformat()}T12:00:00Z"
+
+        repositories_ranks = list(range(amount))
+        rng.shuffle(repositories_ranks)
+
+        self.users: dict[str, dict[str, Any]] = {}
+        for rank in range(amount):
+            login = f"user{rank}"
+            self.users[login] = {
+                "login": login,
+                "id": rank + 1,
+                "node_id": f"U_{rank + 1}",
+                "type": "Organization" if rank % 7 == 0 else "User",
+                "html_url": f"https://github.com/{login}",
+                "url": f"{origin}/users/{login}",
+                "name": f"User {rank}",
+                "company": rng.choice(("@github", "Google", "Microsoft", None)),
+                "blog": rng.choice(("", f"https://{login}.dev")),
+                "location": rng.choice(("Ljubljana", "San Francisco", "Berlin", None)),
+                "email": rng.choice((None, f"{login}@example.com")),
+                "hireable": rng.choice((None, True)),
+                "bio": None,
+                "public_repos": get_power_law(repositories_ranks[rank], 20_000),
+                "public_gists": rng.randrange(100),
+                "followers": get_power_law(rank, 300_000),
+                "following": rng.randrange(500),
+                "created_at": timestamp(),
+                "updated_at": timestamp(),
+            }
+
+        forks_ranks = list(range(amount))
+        rng.shuffle(forks_ranks)
+
+        self.repositories: dict[str, dict[str, Any]] = {}
+        self.watchers: dict[str, int] = {}
+        self.languages: dict[str, dict[str, int]] = {}
+        for rank in range(amount):
+            owner = f"user{rank % max(amount // 10, 1)}"
+            name = f"repository{rank}"
+            full_name = f"{owner}/{name}"
+            license = rng.choice(LICENSES)
+
+            self.languages[full_name] = {
+                language: rng.randrange(1, 1_000_000)
+                for language in rng.sample(LANGUAGES, rng.randrange(1, 5))
+            }
+            self.repositories[full_name] = {
+                "id": rank + 1,
+                "node_id": f"R_{rank + 1}",
+                "name": name,
+                "full_name": full_name,
+                "owner": {"login": owner, "id": self.users[owner]["id"], "url": f"{origin}/users/{owner}"},
+                "html_url": f"{origin}{PAGES_PREFIX}{full_name}",
+                "url": f"{origin}/repos/{full_name}",
+                "description": f"Repository {rank}",
+                "homepage": rng.choice(("", f"https://{name}.dev")),
+                "size": rng.randrange(100_000),
+                "default_branch": rng.choice(("main", "master")),
+                "license": {"key": license.lower(), "spdx_id": license, "name": license} if license else None,
+                "language": max(self.languages[full_name], key=self.languages[full_name].__getitem__),
+                "topics": rng.sample(("cli", "web", "api", "database", "machine-learning"), rng.randrange(3)),
+                "stargazers_count": get_power_law(rank, 500_000),
+                "watchers_count": get_power_law(rank, 500_000),
+                "forks_count": get_power_law(forks_ranks[rank], 100_000),
+                "open_issues_count": rng.randrange(1000),
+                "has_issues": True,
+                "has_discussions": rng.choice((True, False)),
+                "has_wiki": True,
+                "has_pages": False,
+                "has_projects": True,
+                "has_downloads": True,
+                "fork": False,
+                "is_template": False,
+                "archived": False,
+                "created_at": timestamp(),
+                "updated_at": timestamp(),
+                "pushed_at": timestamp(),
+            }
+
+            # Watchers are not included in search results, so they are stored separately
+            self.watchers[full_name] = rng.randrange(1000)
+
+        users = list(self.users.values())
+        repositories = list(self.repositories.values())
+        self.names = list(self.repositories)
+
+        self.rankings = {
+            "followers": get_ranking(users, "followers"),
+            "repos": get_ranking(users, "public_repos"),
+            "stars": get_ranking(repositories, "stargazers_count"),
+            "forks": get_ranking(repositories, "forks_count"),
+        }
+
+    def handle(self, method: str, url: str, body: bytes) -> Reply:
+        parts = urlsplit(url)
+        parameters = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        segments = parts.path.strip("/").split("/")
+
+        match method, segments:
+            case "POST", ["graphql"]:
+                return self.graphql(orjson.loads(body))
+            case "GET", ["search", ("users" | "repositories") as kind]:
+                return self.search(kind, parameters)
+            case "GET", ["users", login] if login in self.users:
+                return reply(200, self.users[login])
+            case "GET", ["users", login, "repos"] if login in self.users:
+                return self.user_repositories(login, parameters)
+            case "GET", ["repos", owner, name] if f"{owner}/{name}" in self.repositories:
+                full_name = f"{owner}/{name}"
+                return reply(
+                    200, {**self.repositories[full_name], "subscribers_count": self.watchers[full_name]}
+                )
+            case "GET", ["repos", owner, name, "languages"] if f"{owner}/{name}" in self.repositories:
+                return reply(200, self.languages[f"{owner}/{name}"])
+            case "GET", ["pages", owner, name] if f"{owner}/{name}" in self.repositories:
+                return self.page(f"{owner}/{name}")
+            case "GET", ["repositories", id, "stargazers"] if self.is_node(id):
+                count = self.repositories[self.names[int(id) - 1]]["stargazers_count"]
+                return self.list_users(parts.path, int(id), count, parameters)
+            case "GET", ["repositories", id, "contributors"] if self.is_node(id):
+                return self.list_users(parts.path, -int(id), int(id) * 31 % 300, parameters)
+            case "GET", ["user", id, "followers"] if self.is_node(id):
+                count = self.users[f"user{int(id) - 1}"]["followers"]
+                return self.list_users(parts.path, int(id) + len(self.users), count, parameters)
+
+        return reply(404, {"message": "Not Found"})
+
+    def search(self, kind: str, parameters: dict[str, str]) -> Reply:
+        """Search the users or repositories, limiting the results as the search API does."""
+
+        if not (match := SEARCH_QUERY.match(parameters.get("q", ""))):
+            return reply(422, {"message": "Validation Failed"})
+
+        ranking = self.rankings[match["qualifier"]]
+        low = int(match["above"]) + 1 if match["above"] else int(match["low"])
+        high = sys.maxsize if match["above"] else int(match["high"])
+
+        start, end = bisect_left(ranking.values, -high), bisect_right(ranking.values, -low)
+        items = ranking.items[start:end]
+
+        if match["start"]:
+            first = date.fromisoformat(match["start"]).toordinal()
+            last = date.fromisoformat(match["end"]).toordinal()
+            items = [
+                item
+                for item, created in zip(items, ranking.created[start:end], strict=True)
+                if first <= created <= last
+            ]
+
+        page = int(parameters.get("page", 1))
+        per_page = min(int(parameters.get("per_page", 30)), 100)
+        available = min(len(items), SEARCH_LIMIT)
+
+        results = items[(page - 1) * per_page : min(page * per_page, available)]
+        if kind == "users":
+            fields = ("login", "id", "node_id", "type", "html_url", "url")
+            results = [{field: user[field] for field in fields} for user in results]
+
+        headers = {}
+        if page * per_page < available:
+            link = f"{self.origin}/search/{kind}?{urlencode({**parameters, 'page': page + 1})}"
+            headers["Link"] = f'<{link}>; rel="next"'
+
+        return reply(200, {"total_count": len(items), "incomplete_results": False, "items": results}, headers)
+
+    def user_repositories(self, login: str, parameters: dict[str, str]) -> Reply:
+        """List the repositories of the user, which the scrapers only use to count them."""
+
+        count = self.users[login]["public_repos"]
+        per_page = min(int(parameters.get("per_page", 30)), 100)
+        page = int(parameters.get("page", 1))
+
+        results = [{"id": index} for index in range((page - 1) * per_page, min(page * per_page, count))]
+
+        headers = {}
+        if count > per_page:
+            last = -(-count // per_page)
+            link = f"{self.origin}/users/{login}/repos?{urlencode({**parameters, 'page': last})}"
+            headers["Link"] = f'<{link}>; rel="last"'
+
+        return reply(200, results, headers)
+
+    def is_node(self, id: str) -> bool:
+        """Check whether the ID belongs to a synthetic user and repository, which share the same IDs."""
+
+        return id.isdigit() and 1 <= int(id) <= len(self.users)
+
+    def list_users(self, path: str, seed: int, count: int, parameters: dict[str, str]) -> Reply:
+        """List the deterministic users related to the entity, such as its stargazers or followers."""
+
+        amount = len(self.users)
+        count = min(count, amount)
+        per_page = min(int(parameters.get("per_page", 30)), 100)
+        page = int(parameters.get("page", 1))
+
+        # The large prime step visits distinct users for each index, unless the population is its multiple
+        ranks = [
+            (seed * 7919 + index * 104729) % amount
+            for index in range((page - 1) * per_page, min(page * per_page, count))
+        ]
+
+        fields = ("login", "id", "node_id", "type", "html_url", "url")
+        results = [{field: self.users[f"user{rank}"][field] for field in fields} for rank in ranks]
+
+        headers = {}
+        if page * per_page < count:
+            link = f"{self.origin}{path}?{urlencode({**parameters, 'page': page + 1})}"
+            headers["Link"] = f'<{link}>; rel="next"'
+
+        return reply(200, results, headers)
+
+    def page(self, full_name: str) -> Reply:
+        """Render the repository page with the properties that the API completes, and languages as percentages."""
+
+        repository = self.repositories[full_name]
+        total = sum(self.languages[full_name].values())
+
+        languages = "".join(
+            f"<li><span>{language}</span>\n<span>{size / total * 100:.1f}%</span></li>"
+            for language, size in sorted(self.languages[full_name].items(), key=lambda item: -item[1])
+        )
+
+        html = PAGE_TEMPLATE.format(
+            owner=repository["owner"]["login"],
+            name=repository["name"],
+            default_branch=repository["default_branch"],
+            commits=repository["id"] * 13 % 5000 + 1,
+            description=repository["description"],
+            watchers=self.watchers[full_name],
+            languages=languages,
+        )
+
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, html.encode()
+
+    def graphql(self, query: dict[str, Any]) -> Reply:
+        """Resolve the nodes of the users and repositories by their IDs."""
+
+        nodes: list[dict[str, Any] | None] = []
+        for id in query["variables"]["ids"]:
+            kind, _, number = id.partition("_")
+            index = int(number) - 1
+
+            match kind:
+                case "U" if 0 <= index < len(self.users):
+                    nodes.append(self.get_user_node(self.users[f"user{index}"]))
+                case "R" if 0 <= index < len(self.names):
+                    nodes.append(self.get_repository_node(self.names[index]))
+                case _:
+                    nodes.append(None)
+
+        return reply(200, {"data": {"nodes": nodes}})
+
+    def get_user_node(self, user: dict[str, Any]) -> dict[str, Any]:
+        """Get the GraphQL node of the user or organization."""
+
+        node = {
+            "__typename": user["type"],
+            "databaseId": user["id"],
+            "login": user["login"],
+            "url": user["html_url"],
+            "name": user["name"],
+            "websiteUrl": user["blog"] or None,
+            "email": user["email"] or "",
+            "location": user["location"],
+            "createdAt": user["created_at"],
+            "updatedAt": user["updated_at"],
+            "repositories": {"totalCount": user["public_repos"]},
+        }
+
+        # Organizations do not expose their followers and gists
+        if user["type"] == "User":
+            node["company"] = user["company"]
+            node["isHireable"] = bool(user["hireable"])
+            node["followers"] = {"totalCount": user["followers"]}
+            node["following"] = {"totalCount": user["following"]}
+            node["gists"] = {"totalCount": user["public_gists"]}
+
+        return node
+
+    def get_repository_node(self, full_name: str) -> dict[str, Any]:
+        """Get the GraphQL node of the repository."""
+
+        languages = sorted(self.languages[full_name].items(), key=lambda item: -item[1])
+        return {
+            "watchers": {"totalCount": self.watchers[full_name]},
+            "languages": {
+                "totalCount": len(languages),
+                "edges": [{"size": size, "node": {"name": name}} for name, size in languages],
+            },
+        }
+
+
+# == Server
+
+
+class RateLimiter:
+    """Counts the requests per resource in fixed windows and produces the rate limit headers."""
+
+    def __init__(self, limits: Mapping[Resource, int], window: float) -> None:
+        self.limits = limits
+        self.window = window
+        self.lock = threading.Lock()
+
+        self.resets: dict[Resource, float] = {}
+        self.used: dict[Resource, int] = {}
+
+    def acquire(self, resource: Resource) -> tuple[bool, dict[str, str]]:
+        """Count the request, returning whether it is allowed and its rate limit headers."""
+
+        with self.lock:
+            now = time.time()
+
+            if now >= self.resets.get(resource, 0):
+                self.resets[resource] = now + self.window
+                self.used[resource] = 0
+
+            limit = self.limits[resource]
+            allowed = self.used[resource] < limit
+            self.used[resource] += allowed
+
+            return allowed, {
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": str(limit - self.used[resource]),
+                "X-RateLimit-Used": str(self.used[resource]),
+                "X-RateLimit-Reset": str(int(self.resets[resource]) + 1),
+                "X-RateLimit-Resource": resource,
+            }
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    backend: Backend
+    """The backend that produces the responses."""
+
+    limiter: RateLimiter
+    """The rate limiter that produces the rate limit headers."""
+
+    latency: float
+    """The number of seconds each response is delayed by."""
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+    protocol_version = "HTTP/1.1"
+
+    # The headers and body are written separately, which would otherwise wait for delayed acknowledgements
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.respond(b"")
+
+    def do_POST(self) -> None:
+        self.respond(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+    def respond(self, body: bytes) -> None:
+        path = urlsplit(self.path).path
+
+        # The pages imitate the website, which does not count against the API rate limits
+        allowed, limits = True, dict[str, str]()
+        if not path.startswith(PAGES_PREFIX):
+            allowed, limits = self.server.limiter.acquire(get_resource(path))
+
+        if allowed:
+            status, headers, data = self.server.backend.handle(self.command, self.path, body)
+        else:
+            status, headers, data = reply(403, {"message": "API rate limit exceeded"})
+
+        time.sleep(self.server.latency)
+
+        self.send_response(status)
+        for name, value in {**headers, **limits}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Logging each request would slow down the benchmarks
+        pass
+
+
+def create_server(
+    port: int,
+    cassette: Path | None,
+    synthetic: int | None,
+    latency: float = 0.0,
+    limits: Mapping[Resource, int] | None = None,
+    window: float = 60.0,
+) -> ReplayServer:
+    """Create the server that replays the cassette or serves the synthetic population."""
+
+    server = ReplayServer(("127.0.0.1", port), ReplayHandler)
+    origin = f"http://127.0.0.1:{server.server_port}"
+
+    if cassette:
+        server.backend = CassetteBackend(cassette, origin)
+    elif synthetic:
+        server.backend = SyntheticBackend(synthetic, origin)
+    else:
+        raise ValueError("Either the cassette or the synthetic population is required")
+
+    server.limiter = RateLimiter(
+        limits or {"core": 1_000_000, "search": 1_000_000, "graphql": 1_000_000}, window
+    )
+    server.latency = latency
+
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_serve = subparsers.add_parser("serve", help="serve the API responses without the network")
+    source = parser_serve.add_mutually_exclusive_group(required=True)
+    source.add_argument("--cassette", type=Path, help="replay the responses recorded with --record")
+    source.add_argument("--synthetic", type=int, help="serve the synthetic population of this size")
+    parser_serve.add_argument("--port", type=int, default=8765, help="the port, or 0 to pick a free one")
+    parser_serve.add_argument(
+        "--latency", type=float, default=0.0, help="the delay of each response in seconds"
+    )
+    parser_serve.add_argument(
+        "--core-limit", type=int, default=1_000_000, help="the core requests per window"
+    )
+    parser_serve.add_argument(
+        "--search-limit", type=int, default=1_000_000, help="the search requests per window"
+    )
+    parser_serve.add_argument(
+        "--graphql-limit", type=int, default=1_000_000, help="the GraphQL requests per window"
+    )
+    parser_serve.add_argument("--window", type=float, default=60.0, help="the rate limit window in seconds")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "serve":
+            limits: dict[Resource, int] = {
+                "core": args.core_limit,
+                "search": args.search_limit,
+                "graphql": args.graphql_limit,
+            }
+            server = create_server(
+                args.port, args.cassette, args.synthetic, args.latency, limits, args.window
+            )
+
+            # The address is printed once the server is ready, so other processes can wait for it
+            print(f"Serving on http://127.0.0.1:{server.server_port}", flush=True)
+
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+
+                if isinstance(server.backend, CassetteBackend) and server.backend.misses:
+                    print(f"Replay: {server.backend.misses} requests were not recorded", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
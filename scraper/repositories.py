@@ -1,15 +1,44 @@
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Literal
+from functools import partial
+from itertools import chain
+from typing import Any, Literal
 
 from github import Github
+from github.Repository import Repository as GithubRepository
 from tqdm import tqdm
 
+from checkpoint import ScrapeState
+from compact import intern_keys, intern_string
+from fallback import HtmlFallback
+from graphql import BATCH_SIZE, batched, fetch_nodes, parse_datetime
+from hydration import hydrate_reusing, map_ordered
+from metrics import Metrics, phase
+from partition import Window, count_results, plan_windows
+from projection import OMITTED, Fields, Omitted, is_selected
+from refresh import Snapshot
+from sharding import plan_shards
+from store import EntityStore
+
 CHUNK_MARGIN = 50
-CHUNK_SIZE = float("inf")
 
+Backend = Literal["rest", "graphql"]
+
+# The search results already contain most of the properties,
+# so we only need to fetch the missing ones using GraphQL API
+REPOSITORY_FRAGMENT = """
+... on Repository {
+    watchers { totalCount }
+    languages(first: 100, orderBy: { field: SIZE, direction: DESC }) {
+        totalCount
+        edges { size node { name } }
+    }
+}
+"""
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class Repository:
     # == Basic Properties
 
@@ -37,7 +66,7 @@ class Repository:
     language: str | None
     """The main repository language, if detected."""
 
-    languages: dict[str, int]
+    languages: dict[str, int] | Omitted
     """The all repository languages with lines of code."""
 
     # == Social Properties
@@ -67,7 +96,7 @@ class Repository:
     stargazers_count: int
     """The number of repository stargazers."""
 
-    watchers_count: int
+    watchers_count: int | Omitted
     """The number of repository watchers."""
 
     forks_count: int
@@ -107,102 +136,394 @@ class Repository:
     is_archived: bool
     """Whether the repository is archived."""
 
+    # Source Properties
+
+    html_fields: list[str]
+    """The fields that were completed from the HTML page instead of the API, as its rate limit was low."""
+
 
 def find_max_value(github: Github, order: Literal["stars", "forks"]) -> int:
     """Find the maximum number of stars/forks any repository has."""
 
-    # We start the query from 1000 to make it slightly faster
-    query = github.search_repositories(query=f"{order}:>1000", sort=order, order="desc")
+    with phase("probe"):
+        # We start the query from 1000 to make it slightly faster
+        query = github.search_repositories(query=f"{order}:>1000", sort=order, order="desc")
+
+        match order:
+            case "stars":
+                return int(query[0].stargazers_count)
+            case "forks":
+                return int(query[0].forks_count)
+
+
+def build_repository(
+    repository: GithubRepository,
+    watchers_count: int | Omitted | None = None,
+    languages: dict[str, int] | Omitted | None = None,
+    html_fields: list[str] | None = None,
+) -> Repository:
+    """Build the repository from the REST API object, completing it as needed."""
+
+    # Watchers and languages are not included in search results
+    # If they are not provided, they are fetched using REST API
+    if watchers_count is None:
+        with phase("watchers"):
+            watchers_count = repository.subscribers_count
+    if languages is None:
+        with phase("languages"):
+            languages = repository.get_languages()
+
+    return Repository(
+        # == Basic Properties
+        id=repository.id,
+        owner=intern_string(repository.owner.login),
+        name=repository.name,
+        url=repository.html_url,
+        size=repository.size,
+        default_branch=intern_string(repository.default_branch),
+        license=intern_string(repository.license.spdx_id) if repository.license else None,
+        language=intern_string(repository.language or None),
+        languages=intern_keys(languages) if languages is not OMITTED else OMITTED,
+        # == Social Properties
+        description=repository.description or None,
+        homepage=repository.homepage or None,
+        topics=repository.topics,
+        # == Dates Properties
+        created_at=repository.created_at,
+        updated_at=repository.updated_at,
+        pushed_at=repository.pushed_at,
+        # == Counts Properties
+        stargazers_count=repository.stargazers_count,
+        watchers_count=watchers_count,
+        forks_count=repository.forks_count,
+        open_issues_count=repository.open_issues_count,
+        # == Features Properties
+        has_issues=repository.has_issues,
+        has_discussions=repository._rawData["has_discussions"],
+        has_wiki=repository.has_wiki,
+        has_pages=repository.has_pages,
+        has_projects=repository.has_projects,
+        has_downloads=repository.has_downloads,
+        # == Type Properties
+        is_fork=repository.fork,
+        is_template=repository.is_template,
+        is_archived=repository.archived,
+        # == Source Properties
+        html_fields=html_fields or [],
+    )
+
+
+def build_repository_graphql(
+    repository: GithubRepository, node: dict[str, Any], fields: Fields = None
+) -> Repository:
+    """Build the repository from the search result and the GraphQL API node."""
+
+    watchers_count = node["watchers"]["totalCount"] if is_selected(fields, "watchers_count") else OMITTED
+
+    languages: dict[str, int] | Omitted | None = None
+    if not is_selected(fields, "languages"):
+        languages = OMITTED
+    elif node["languages"]["totalCount"] <= len(node["languages"]["edges"]):
+        languages = {edge["node"]["name"]: edge["size"] for edge in node["languages"]["edges"]}
+
+    return build_repository(repository, watchers_count, languages)
+
+
+def reuse_stored_repository(
+    stored: dict[int, dict[str, Any]], repository: GithubRepository
+) -> Repository | None:
+    """Complete the repository from the store if it was hydrated within the freshness window."""
+
+    if not (previous := stored.get(repository.id)):
+        return None
+
+    # Properties completed from the page are only estimates, so they are fetched again
+    if previous.get("html_fields"):
+        return None
+
+    return build_repository(repository, previous["watchers_count"], previous["languages"])
+
+
+def reuse_repository(
+    repository: GithubRepository,
+    snapshot: Snapshot | None,
+    fields: Fields = None,
+) -> tuple[int | Omitted | None, dict[str, int] | Omitted | None]:
+    """Get the expensive properties from the snapshot that could not have changed since it was taken."""
+
+    # The properties that are not selected are never fetched
+    watchers_count: int | Omitted | None = None if is_selected(fields, "watchers_count") else OMITTED
+    languages: dict[str, int] | Omitted | None = None if is_selected(fields, "languages") else OMITTED
+
+    if not snapshot or not (previous := snapshot.get(repository.id)):
+        return watchers_count, languages
+
+    # Watchers can be reused if the repository was not updated at all,
+    # and languages can be reused if nothing was pushed to the repository
+    # The previous results may not contain them if they were scraped with fewer fields,
+    # and the properties completed from the page are only estimates, so they are fetched again
+    estimated = previous.get("html_fields") or ()
+    if watchers_count is None and "watchers_count" in previous and "updated_at" in previous:
+        if (
+            "watchers_count" not in estimated
+            and parse_datetime(previous["updated_at"]) == repository.updated_at
+        ):
+            watchers_count = previous["watchers_count"]
+
+    if languages is None and "languages" in previous and "pushed_at" in previous:
+        if "languages" not in estimated and parse_datetime(previous["pushed_at"]) == repository.pushed_at:
+            languages = previous["languages"]
+
+    return watchers_count, languages
+
+
+def build_repository_rest(
+    repository: GithubRepository,
+    snapshot: Snapshot | None,
+    fields: Fields = None,
+    fallback: HtmlFallback | None = None,
+) -> Repository:
+    """Build the repository using REST API, reusing the unchanged properties from the snapshot."""
+
+    with phase("completion"):
+        watchers_count, languages = reuse_repository(repository, snapshot, fields)
+
+        # Only the selected properties can be reused, so the omitted ones do not count
+        if snapshot:
+            selected = [value for value in (watchers_count, languages) if value is not OMITTED]
+            snapshot.record(repository.id, reused=bool(selected) and None not in selected)
+
+        # The missing properties are completed from the page instead while the rate limit is low
+        html_fields: list[str] = []
+        if fallback:
+            watchers_count, languages, html_fields = fallback.complete(
+                repository, watchers_count, languages, "core"
+            )
+
+        return build_repository(repository, watchers_count, languages, html_fields)
+
+
+def build_repositories_graphql(
+    repositories: list[GithubRepository],
+    snapshot: Snapshot | None,
+    fields: Fields = None,
+    fallback: HtmlFallback | None = None,
+) -> list[Repository]:
+    """Build the batch of repositories using a single GraphQL API query."""
+
+    reused = [reuse_repository(repository, snapshot, fields) for repository in repositories]
+
+    # The missing properties are completed from the pages instead while the rate limit is low
+    # The whole batch is hydrated by a single worker, so its pages are downloaded on their own pool
+    completed = (
+        fallback.complete_batch(
+            (
+                (repository, watchers_count, languages)
+                for repository, (watchers_count, languages) in zip(repositories, reused, strict=True)
+            ),
+            "graphql",
+        )
+        if fallback
+        else [(watchers_count, languages, []) for watchers_count, languages in reused]
+    )
+
+    # Only repositories whose properties could have changed need to be fetched
+    # Repositories completed from their pages are skipped, so their estimated properties are kept
+    changed = [
+        repository
+        for repository, (watchers_count, languages, html_fields) in zip(repositories, completed, strict=True)
+        if not html_fields and (watchers_count is None or languages is None)
+    ]
+
+    nodes: dict[int, dict[str, Any] | None] = {}
+    if changed:
+        ids = [repository._rawData["node_id"] for repository in changed]
+        with phase("graphql"):
+            fetched = fetch_nodes(changed[0]._requester, REPOSITORY_FRAGMENT, ids)
+        nodes = {repository.id: node for repository, node in zip(changed, fetched, strict=True)}
+
+    results = []
+
+    for repository, properties, (watchers_count, languages, html_fields) in zip(
+        repositories, reused, completed, strict=True
+    ):
+        # Only the selected properties can be reused, so the omitted ones do not count
+        if snapshot:
+            selected = [value for value in properties if value is not OMITTED]
+            snapshot.record(
+                repository.id, reused=bool(selected) and repository.id not in nodes and not html_fields
+            )
+
+        # Repositories that could not be fetched, or have too many languages, are built using REST API
+        if repository.id not in nodes:
+            results.append(build_repository(repository, watchers_count, languages, html_fields))
+        elif node := nodes[repository.id]:
+            results.append(build_repository_graphql(repository, node, fields))
+        else:
+            results.append(build_repository(repository, watchers_count, languages, html_fields))
+
+    return results
+
+
+def hydrate_repositories(
+    repositories: Iterable[GithubRepository],
+    backend: Backend,
+    workers: int,
+    snapshot: Snapshot | None = None,
+    fields: Fields = None,
+    fallback: HtmlFallback | None = None,
+) -> Iterator[Repository]:
+    """Hydrate the search results into repositories using the specified backend, preserving their order."""
+
+    match backend:
+        case "rest":
+            build = partial(build_repository_rest, snapshot=snapshot, fields=fields, fallback=fallback)
+            return map_ordered(build, repositories, workers)
+        case "graphql":
+            build_batch = partial(
+                build_repositories_graphql, snapshot=snapshot, fields=fields, fallback=fallback
+            )
+            return chain.from_iterable(map_ordered(build_batch, batched(repositories, BATCH_SIZE), workers))
+
+
+def count_repositories(github: Github, order: Literal["stars", "forks"], window: Window) -> int:
+    """Count the repositories in the window using a single search request."""
+
+    with phase("count"):
+        return count_results(github, "/search/repositories", window.query(order))
 
-    match order:
-        case "stars":
-            return int(query[0].stargazers_count)
-        case "forks":
-            return int(query[0].forks_count)
+
+def search_repositories(
+    github: Github, order: Literal["stars", "forks"], window: Window
+) -> tuple[Window, list[GithubRepository]]:
+    """Get all search results in the window."""
+
+    with phase("search"):
+        query = github.search_repositories(window.query(order), sort=order, order="desc")
+        return window, list(query)
+
+
+def plan_repository_shards(
+    github: Github, order: Literal["stars", "forks"], amount: int, shards: int
+) -> list[list[tuple[Window, int]]]:
+    """Plan the windows that cover the top repositories and split them between the shards."""
+
+    high = find_max_value(github, order)
+    return plan_shards(partial(count_repositories, github, order), high + CHUNK_MARGIN, amount, shards)
 
 
 def get_top_repositories(
     github: Github,
     order: Literal["stars", "forks"],
     amount: int,
-) -> list[Repository]:
-    """Get the top repositories by the specified order."""
+    backend: Backend = "rest",
+    workers: int = 1,
+    state: ScrapeState | None = None,
+    snapshot: Snapshot | None = None,
+    metrics: Metrics | None = None,
+    fields: Fields = None,
+    windows: list[Window] | None = None,
+    store: EntityStore | None = None,
+    fallback: HtmlFallback | None = None,
+) -> Iterator[Repository]:
+    """Get the top repositories by the specified order, skipping repositories that were already seen."""
+
+    # The state is updated as repositories are scraped, so the scrape can be resumed later
+    state = state or ScrapeState()
+
+    # Start from the maximum number of stars/forks any repository has, unless resuming
+    # Shards start from their highest planned window instead
+    if state.previous is None:
+        if windows is not None:
+            state.previous = max((window.high for window in windows), default=0)
+        else:
+            state.previous = find_max_value(github, order)
+
+    with tqdm(total=amount, initial=len(state.seen)) as pbar:
+        # The search API limits the maximum number of results to 1000
+        # To get more results, we need to query the API in windows that fit within the limit
+
+        while len(state.seen) < amount:
+            # Shards search their planned windows, while other scrapes plan them from the lowest known value
+            # We increase this slightly to account for possible increases
+            planned = (
+                windows
+                if windows is not None
+                else plan_windows(
+                    partial(count_repositories, github, order),
+                    state.previous + CHUNK_MARGIN,
+                    amount - len(state.seen),
+                )
+            )
 
-    # The maximum number of stars/forks any repository has
-    previous = find_max_value(github, order)
+            # Search the windows in parallel, but process them in order
+            searched = map_ordered(partial(search_repositories, github, order), planned, workers)
+            scraped = 0
+
+            for window, results in searched:
+                # Set the progress bar description
+                pbar.set_description(f"Chunk {window}")
+
+                # Skip repositories that were already seen in previous windows or runs
+                results = [result for result in results if result.id not in state.seen]
+
+                # Repositories hydrated by any scrape within the freshness window are completed from the store,
+                # while the other properties still come from the search results
+                stored = store.get_fresh("repositories", [result.id for result in results]) if store else {}
+
+                # Hydrate the repositories from the window
+                hydrated = hydrate_reusing(
+                    results,
+                    partial(reuse_stored_repository, stored),
+                    partial(
+                        hydrate_repositories,
+                        backend=backend,
+                        workers=workers,
+                        snapshot=snapshot,
+                        fields=fields,
+                        fallback=fallback,
+                    ),
+                )
 
-    repositories: dict[int, Repository] = {}
+                for repository, reused in hydrated:
+                    # The search results may contain duplicates across pages
+                    if repository.id in state.seen:
+                        continue
 
-    with tqdm(total=amount) as pbar:
-        # The search API limits the maximum number of results to 1000
-        # To get more results, we need to query the API in smaller chunks
+                    # Reused repositories are complete, while hydrated ones are only stored if all fields were selected
+                    if store and (reused or fields is None):
+                        store.put("repositories", repository, reused)
+                    if snapshot and reused:
+                        snapshot.record(repository.id, reused=True)
 
-        while len(repositories) < amount:
-            # We increase this slightly to account for possible increases
-            chunk_max = previous + CHUNK_MARGIN
-            chunk_min = max(chunk_max - CHUNK_SIZE, 1)
+                    # Add the repository to the result
+                    state.seen.add(repository.id)
+                    scraped += 1
 
-            # Set the progress bar description
-            pbar.set_description(f"Chunk {chunk_min}-{chunk_max}")
+                    # Update the lowest known repository
+                    match order:
+                        case "stars":
+                            value = repository.stargazers_count
+                        case "forks":
+                            value = repository.forks_count
 
-            # Query all repositories in the chunk range
-            query = github.search_repositories(
-                f"{order}:{chunk_min}..{chunk_max}",
-                sort=order,
-                order="desc",
-            )
+                    # Search results always contain the counts, even if they are omitted from the output
+                    state.previous = min(state.previous, value)
 
-            for repository in query:
-                # Add the repository to the result
-                repositories[repository.id] = Repository(
-                    # == Basic Properties
-                    id=repository.id,
-                    owner=repository.owner.login,
-                    name=repository.name,
-                    url=repository.html_url,
-                    size=repository.size,
-                    default_branch=repository.default_branch,
-                    license=repository.license.spdx_id if repository.license else None,
-                    language=repository.language or None,
-                    languages=repository.get_languages(),
-                    # == Social Properties
-                    description=repository.description or None,
-                    homepage=repository.homepage or None,
-                    topics=repository.topics,
-                    # == Dates Properties
-                    created_at=repository.created_at,
-                    updated_at=repository.updated_at,
-                    pushed_at=repository.pushed_at,
-                    # == Counts Properties
-                    stargazers_count=repository.stargazers_count,
-                    watchers_count=repository.subscribers_count,
-                    forks_count=repository.forks_count,
-                    open_issues_count=repository.open_issues_count,
-                    # == Features Properties
-                    has_issues=repository.has_issues,
-                    has_discussions=repository._rawData["has_discussions"],
-                    has_wiki=repository.has_wiki,
-                    has_pages=repository.has_pages,
-                    has_projects=repository.has_projects,
-                    has_downloads=repository.has_downloads,
-                    # == Type Properties
-                    is_fork=repository.fork,
-                    is_template=repository.is_template,
-                    is_archived=repository.archived,
-                )
+                    # Update the progress bar, optionally with the live request statistics
+                    pbar.update(len(state.seen) - pbar.n)
+                    if metrics:
+                        pbar.set_postfix_str(metrics.postfix(), refresh=False)
 
-                # Update the lowest known repository
-                match order:
-                    case "stars":
-                        previous = min(previous, repository.stargazers_count)
-                    case "forks":
-                        previous = min(previous, repository.forks_count)
+                    yield repository
 
-                # Update the progress bar
-                pbar.update(len(repositories) - pbar.n)
+                    # Stop if we are done
+                    if len(state.seen) == amount:
+                        return
 
-                # Break if we are done
-                if len(repositories) == amount:
-                    break
+                if store:
+                    store.commit()
 
-    return list(repositories.values())
+            # Stop if there are no more repositories to scrape, or the shard searched all its windows
+            if not scraped or windows is not None:
+                return
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Literal
+
+import orjson
+from github.Requester import Requester
+
+Resource = Literal["core", "search", "graphql"]
+
+SECONDARY_RATE_WAIT = 60
+"""The number of seconds to wait after a secondary rate limit without the retry-after header."""
+
+RESET_MARGIN = 1
+"""The number of seconds to wait after the reset time to account for clock differences."""
+
+
+@dataclass
+class Budget:
+    remaining: int | None = None
+    """The number of remaining requests, if known."""
+
+    reset: float = 0
+    """The time when the remaining requests are reset."""
+
+    blocked_until: float = 0
+    """The time until which the token is blocked due to a secondary rate limit."""
+
+    def available_at(self, now: float) -> float:
+        """Get the time when the budget can be used again."""
+
+        available = self.blocked_until
+        if self.remaining is not None and self.remaining <= 0 and self.reset > now:
+            available = max(available, self.reset + RESET_MARGIN)
+        return available
+
+    def headroom(self) -> float:
+        """Get the number of requests that can still be made, unknown budgets being preferred."""
+
+        return float("inf") if self.remaining is None else self.remaining
+
+
+def get_resource(url: str) -> Resource:
+    """Get the rate limit resource that the request URL counts against."""
+
+    if "/search/" in url:
+        return "search"
+    if url.endswith("/graphql"):
+        return "graphql"
+    return "core"
+
+
+class TokenScheduler:
+    """Routes requests to the token with the most remaining rate limit for each resource."""
+
+    def __init__(self, tokens: list[str]) -> None:
+        if not tokens:
+            raise ValueError("At least one token is required")
+
+        self.tokens = tokens
+        self.budgets: dict[tuple[str, Resource], Budget] = {}
+        self.lock = threading.Lock()
+
+    def budget(self, token: str, resource: Resource) -> Budget:
+        """Get the budget of the token for the resource."""
+
+        return self.budgets.setdefault((token, resource), Budget())
+
+    def remaining(self, resource: Resource) -> float:
+        """Get the number of requests that all tokens can still make before their reset, unknown being unlimited."""
+
+        with self.lock:
+            now = time.time()
+            budgets = [self.budget(token, resource) for token in self.tokens]
+
+            # Budgets whose reset has passed are full again, even though no response has reported it yet
+            return sum(budget.headroom() if budget.reset > now else float("inf") for budget in budgets)
+
+    def acquire(self, resource: Resource) -> str:
+        """Get the token with the most headroom, waiting until one becomes available."""
+
+        while True:
+            with self.lock:
+                now = time.time()
+                budgets = [(token, self.budget(token, resource)) for token in self.tokens]
+
+                available = [(token, budget) for token, budget in budgets if budget.available_at(now) <= now]
+                if available:
+                    token, budget = max(available, key=lambda item: item[1].headroom())
+
+                    # Reserve the request so concurrent requests are spread between tokens
+                    if budget.remaining is not None:
+                        budget.remaining -= 1
+
+                    return token
+
+                # All tokens are exhausted, so we wait until the first one is reset
+                wait = min(budget.available_at(now) for _, budget in budgets) - now
+
+            time.sleep(max(wait, 0))
+
+    def update(
+        self, token: str, resource: Resource, status: int, headers: Mapping[str, str], body: bytes
+    ) -> bool:
+        """Update the budget from the response, returning whether the request was rate limited."""
+
+        with self.lock:
+            now = time.time()
+
+            # The resource header is more accurate, but we only track the known ones
+            if headers.get("x-ratelimit-resource") in ("core", "search", "graphql"):
+                resource = headers["x-ratelimit-resource"]  # type: ignore[assignment]
+
+            budget = self.budget(token, resource)
+
+            if "x-ratelimit-remaining" in headers:
+                budget.remaining = int(float(headers["x-ratelimit-remaining"]))
+            if "x-ratelimit-reset" in headers:
+                budget.reset = float(headers["x-ratelimit-reset"])
+
+            if status not in (403, 429):
+                return False
+
+            # Primary rate limit, the budget is already exhausted until the reset
+            if budget.remaining == 0:
+                return True
+
+            # Secondary rate limit, we need to wait for the specified time
+            if "retry-after" in headers:
+                budget.blocked_until = now + float(headers["retry-after"])
+                return True
+
+            try:
+                message = orjson.loads(body).get("message", "")
+            except (orjson.JSONDecodeError, AttributeError):
+                message = ""
+
+            if Requester.isSecondaryRateLimitError(message):
+                budget.blocked_until = now + SECONDARY_RATE_WAIT
+                return True
+
+            return False
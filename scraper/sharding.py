@@ -0,0 +1,227 @@
+import hashlib
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from partition import SEARCH_LIMIT, Window, plan_windows
+
+PLAN_VERSION = 1
+"""The version of the shard plan, which needs to be created again if it changes."""
+
+ORDER_FIELDS = {
+    "repositories-by-stars": "stargazers_count",
+    "repositories-by-forks": "forks_count",
+    "users-by-followers": "followers_count",
+    "users-by-repositories": "public_repositories_count",
+}
+"""The field that orders the records of each dataset."""
+
+
+@dataclass
+class ShardPlan:
+    dataset: str
+    """The dataset that the shards scrape."""
+
+    amount: int
+    """The amount of results that the merged dataset contains."""
+
+    fields: list[str] | None
+    """The selected fields of the records, or None if all fields are selected."""
+
+    shards: list[list[tuple[Window, int]]]
+    """The windows that each shard searches, with their planned number of results."""
+
+    def get_amount(self, index: int) -> int:
+        """Get the number of results that the shard is expected to scrape."""
+
+        return sum(min(count, SEARCH_LIMIT) for _, count in self.shards[index - 1])
+
+
+def plan_shards(
+    count: Callable[[Window], int], high: int, amount: int, shards: int
+) -> list[list[tuple[Window, int]]]:
+    """Plan the windows that cover the amount and split them between the shards."""
+
+    # Each planned window was counted, so the counts are remembered for the plan
+    counts: dict[Window, int] = {}
+
+    def remember(window: Window) -> int:
+        counts[window] = count(window)
+        return counts[window]
+
+    windows = list(plan_windows(remember, high, amount))
+
+    # Every window contains at most the search limit and most of them are at least half full,
+    # so assigning them in turns keeps the shards balanced without moving the boundaries
+    return [[(window, counts[window]) for window in windows[index::shards]] for index in range(shards)]
+
+
+def save_plan(path: Path, plan: ShardPlan) -> None:
+    """Write the shard plan to the JSON file."""
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+
+    shards = [
+        [
+            {
+                "low": window.low,
+                "high": window.high,
+                "created": [day.isoformat() for day in window.created] if window.created else None,
+                "count": count,
+            }
+            for window, count in windows
+        ]
+        for windows in plan.shards
+    ]
+
+    with path.open("wb") as file:
+        file.write(
+            orjson.dumps(
+                {
+                    "version": PLAN_VERSION,
+                    "dataset": plan.dataset,
+                    "amount": plan.amount,
+                    "fields": plan.fields,
+                    "shards": shards,
+                },
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+
+
+def load_plan(path: Path) -> ShardPlan:
+    """Load the shard plan from the JSON file."""
+
+    with path.open("rb") as file:
+        saved = orjson.loads(file.read())
+
+    if saved["version"] != PLAN_VERSION:
+        raise ValueError(f"Plan was created by a different version: {saved['version']}")
+
+    shards = [
+        [
+            (
+                Window(
+                    item["low"],
+                    item["high"],
+                    (
+                        (date.fromisoformat(item["created"][0]), date.fromisoformat(item["created"][1]))
+                        if item["created"]
+                        else None
+                    ),
+                ),
+                item["count"],
+            )
+            for item in windows
+        ]
+        for windows in saved["shards"]
+    ]
+
+    return ShardPlan(saved["dataset"], saved["amount"], saved["fields"], shards)
+
+
+def get_plan_digest(path: Path) -> str:
+    """Get the digest of the plan file, which identifies the shards that belong to it."""
+
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def save_manifest(path: Path, plan: Path, index: int) -> None:
+    """Atomically mark the shard as finished, recording the plan it belongs to and when it finished."""
+
+    temporary = path.with_name(f"{path.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(
+            orjson.dumps(
+                {
+                    "plan": get_plan_digest(plan),
+                    "shard": index,
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                }
+            )
+        )
+
+    os.replace(temporary, path)
+
+
+@dataclass
+class MergeStats:
+    shards: int = 0
+    """The number of merged shards."""
+
+    records: int = 0
+    """The number of records in all shards."""
+
+    duplicates: int = 0
+    """The number of records that were scraped by more than one shard."""
+
+    written: int = 0
+    """The number of records written to the merged dataset."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return (
+            f"Merge: {self.records} records from {self.shards} shards, "
+            f"{self.duplicates} duplicates, {self.written} written"
+        )
+
+
+def merge_shards(plan_path: Path, get_shard_path: Callable[[int], Path], stream: Path) -> MergeStats:
+    """Merge the shard outputs into the JSONL stream of the top records, keeping the freshest copy of each record."""
+
+    stats = MergeStats()
+    plan = load_plan(plan_path)
+    digest = get_plan_digest(plan_path)
+
+    # All shards need to be finished and belong to the same plan, so the merge is deterministic
+    shards: list[tuple[str, int, Path]] = []
+    for index in range(1, len(plan.shards) + 1):
+        path = get_shard_path(index)
+        manifest = path.with_suffix(".manifest.json")
+
+        if not manifest.exists():
+            raise ValueError(
+                f"Shard {index} of {len(plan.shards)} has not finished: {manifest} does not exist"
+            )
+
+        with manifest.open("rb") as file:
+            saved = orjson.loads(file.read())
+
+        if saved["plan"] != digest:
+            raise ValueError(f"Shard {index} was scraped using a different plan: {path}")
+
+        shards.append((saved["finished_at"], index, path))
+
+    # Shards are applied from the oldest to the newest, so later copies replace the earlier ones
+    records: dict[int, dict[str, Any]] = {}
+
+    for _, _, path in sorted(shards):
+        with path.open("rb") as file:
+            data = orjson.loads(file.read())
+
+        stats.shards += 1
+        stats.records += len(data)
+
+        for record in data:
+            if record["id"] in records:
+                stats.duplicates += 1
+            records[record["id"]] = record
+
+    # The order does not depend on the shards, with the IDs breaking the ties
+    order = ORDER_FIELDS[plan.dataset]
+    top = sorted(records.values(), key=lambda record: (-record[order], record["id"]))[: plan.amount]
+
+    with stream.open("wb") as file:
+        for record in top:
+            file.write(orjson.dumps(record))
+            file.write(b"\n")
+
+    stats.written = len(top)
+    return stats
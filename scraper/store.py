@@ -0,0 +1,145 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+import orjson
+
+Kind = Literal["users", "repositories"]
+
+FRESHNESS = 24 * 60 * 60
+"""The default time in seconds for which a stored entity is reused instead of being hydrated again."""
+
+MAX_VARIABLES = 900
+"""The maximum number of IDs in a single lookup, below the variable limit of older SQLite builds."""
+
+RANKINGS: dict[Kind, tuple[str, ...]] = {
+    "users": ("followers_count", "public_repositories_count"),
+    "repositories": ("stargazers_count", "forks_count"),
+}
+"""The columns that each kind of entity is ranked by, which are stored and indexed next to the records."""
+
+
+def get_schema(kind: Kind) -> str:
+    """Get the schema of the table of the kind, with an index for each ranking column."""
+
+    columns = "".join(f"    {column} INTEGER NOT NULL,\n" for column in RANKINGS[kind])
+    indexes = "".join(
+        f"CREATE INDEX IF NOT EXISTS {kind}_{column} ON {kind} ({column} DESC, id);\n"
+        for column in RANKINGS[kind]
+    )
+
+    return (
+        f"CREATE TABLE IF NOT EXISTS {kind} (\n"
+        "    id INTEGER PRIMARY KEY,\n"
+        f"{columns}"
+        "    record BLOB NOT NULL,\n"
+        "    fetched_at REAL NOT NULL\n"
+        ");\n"
+        f"{indexes}"
+    )
+
+
+@dataclass
+class StoreStats:
+    reused: int = 0
+    """The number of entities reused from the store instead of being hydrated."""
+
+    stored: int = 0
+    """The number of newly hydrated entities written to the store."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return f"Store: {self.reused} reused, {self.stored} stored"
+
+
+class EntityStore:
+    """A persistent store of hydrated entities that is shared between all scrapes."""
+
+    def __init__(self, path: Path, freshness: float = FRESHNESS) -> None:
+        path.parent.mkdir(exist_ok=True, parents=True)
+
+        self.freshness = freshness
+        self.stats = StoreStats()
+
+        # Shards on the same host may write to the store at the same time
+        self.database = sqlite3.connect(path, timeout=60)
+        self.database.execute("PRAGMA journal_mode = WAL")
+        for kind in RANKINGS:
+            self.database.executescript(get_schema(kind))
+
+    def get_fresh(self, kind: Kind, ids: list[int]) -> dict[int, dict[str, Any]]:
+        """Get the stored records of the entities that were hydrated within the freshness window."""
+
+        fetched_after = time.time() - self.freshness
+        records: dict[int, dict[str, Any]] = {}
+
+        for start in range(0, len(ids), MAX_VARIABLES):
+            chunk = ids[start : start + MAX_VARIABLES]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.database.execute(
+                f"SELECT id, record FROM {kind} WHERE id IN ({placeholders}) AND fetched_at >= ?",
+                (*chunk, fetched_after),
+            )
+            records.update((id, orjson.loads(record)) for id, record in rows)
+
+        return records
+
+    def put(self, kind: Kind, record: Any, reused: bool = False) -> None:
+        """Store the record, keeping the time of the previous hydration if its expensive properties were reused."""
+
+        columns = RANKINGS[kind]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+
+        # The reused records may still contain fresher properties from the search results
+        self.database.execute(
+            f"INSERT INTO {kind} (id, {', '.join(columns)}, record, fetched_at) "
+            f"VALUES (?, {'?, ' * len(columns)}?, ?) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}, record = excluded.record"
+            f"{'' if reused else ', fetched_at = excluded.fetched_at'}",
+            (record.id, *(getattr(record, column) for column in columns), orjson.dumps(record), time.time()),
+        )
+
+        if reused:
+            self.stats.reused += 1
+        else:
+            self.stats.stored += 1
+
+    def commit(self) -> None:
+        """Commit the stored records, so other scrapes can reuse them."""
+
+        self.database.commit()
+
+    def export(self, kind: Kind, column: str, amount: int, output: Path, stale: bool = False) -> int:
+        """Write the top fresh stored records by the ranking column to the JSON file, using its index."""
+
+        if column not in RANKINGS[kind]:
+            raise ValueError(f"Unknown ranking column {column}")
+
+        # Entities that are no longer returned by any scrape would otherwise keep their outdated rank forever
+        fetched_after = float("-inf") if stale else time.time() - self.freshness
+        rows = self.database.execute(
+            f"SELECT record FROM {kind} WHERE fetched_at >= ? ORDER BY {column} DESC, id LIMIT ?",
+            (fetched_after, amount),
+        )
+
+        # The records are already serialized as compact JSON, so they do not need to be decoded
+        count = 0
+        with output.open("wb") as file:
+            file.write(b"[")
+            for (record,) in rows:
+                if count:
+                    file.write(b",")
+                file.write(record)
+                count += 1
+            file.write(b"]\n")
+
+        return count
+
+    def close(self) -> None:
+        """Commit the remaining records and close the database."""
+
+        self.database.commit()
+        self.database.close()
@@ -0,0 +1,383 @@
+import os
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import orjson
+
+HISTOGRAM_BINS = 50
+"""The number of bins in histograms of numeric columns."""
+
+QUANTILES = (0.25, 0.5, 0.75)
+"""The quantiles included in descriptions of numeric columns."""
+
+STATE_VERSION = 1
+"""The version of the summary state, which needs to be rebuilt if it changes."""
+
+ALL = "all"
+"""The name of the group that contains all rows."""
+
+
+def normalize_company(value: str) -> str:
+    """Normalize the company name, so its variants are counted together."""
+
+    return value.replace("@", "").strip().lower()
+
+
+@dataclass(frozen=True)
+class SummarySpec:
+    group_by: str | None
+    """The column that splits the rows into groups, in addition to the group of all rows."""
+
+    numeric: tuple[str, ...]
+    """The numeric columns that are described and counted in histograms."""
+
+    thresholds: dict[str, tuple[int, ...]]
+    """The values for which the number of larger values is counted, per numeric column."""
+
+    categorical: tuple[str, ...]
+    """The columns whose values are counted."""
+
+    presence: tuple[str, ...]
+    """The columns for which the number of set values is counted."""
+
+    years: tuple[str, ...]
+    """The datetime columns whose years are counted."""
+
+    normalizers: dict[str, Any] = field(default_factory=dict)
+    """The functions that normalize the categorical values before counting, per column."""
+
+
+SPECS = {
+    "users": SummarySpec(
+        group_by="type",
+        numeric=("followers_count", "following_count", "public_repositories_count", "public_gists_count"),
+        thresholds={
+            "followers_count": (5_000, 10_000, 50_000, 100_000),
+            "following_count": (100, 500, 1_000),
+        },
+        categorical=(
+            "type",
+            "company",
+            "company_cluster",
+            "location_cluster",
+            "homepage_cluster",
+            "country_code",
+        ),
+        presence=("name", "homepage", "email", "location", "company", "hireable"),
+        years=("created_at", "updated_at"),
+        normalizers={"company": normalize_company},
+    ),
+    "repositories": SummarySpec(
+        group_by=None,
+        numeric=("stargazers_count", "watchers_count", "forks_count", "open_issues_count", "size"),
+        thresholds={"stargazers_count": (10_000, 50_000, 100_000), "forks_count": (1_000, 5_000, 10_000)},
+        categorical=("language", "license"),
+        presence=("description", "homepage"),
+        years=("created_at", "updated_at", "pushed_at"),
+    ),
+}
+
+
+def restrict_spec(spec: SummarySpec, columns: set[str]) -> SummarySpec:
+    """Restrict the spec to the columns in the data, as the scrape may have omitted some of them."""
+
+    return replace(
+        spec,
+        group_by=spec.group_by if spec.group_by in columns else None,
+        numeric=tuple(column for column in spec.numeric if column in columns),
+        categorical=tuple(column for column in spec.categorical if column in columns),
+        presence=tuple(column for column in spec.presence if column in columns),
+        years=tuple(column for column in spec.years if column in columns),
+    )
+
+
+def get_row(spec: SummarySpec, record: dict[str, Any]) -> list[Any]:
+    """Get the values of the record that contribute to the summary."""
+
+    group = record[spec.group_by] if spec.group_by else None
+
+    categorical = []
+    for column in spec.categorical:
+        value = record.get(column)
+        if value is not None and (normalize := spec.normalizers.get(column)):
+            value = normalize(value)
+        categorical.append(value)
+
+    return [
+        group,
+        *(record[column] for column in spec.numeric),
+        *categorical,
+        *(record.get(column) not in (None, False) for column in spec.presence),
+        *(datetime.fromisoformat(record[column]).year for column in spec.years),
+    ]
+
+
+class Aggregates:
+    """The mergeable aggregates of one group, which can be updated by adding and removing rows."""
+
+    def __init__(self, spec: SummarySpec, state: dict[str, Any] | None = None) -> None:
+        self.spec = spec
+        state = state or {}
+
+        self.count: int = state.get("count", 0)
+        self.sorted = {
+            column: np.array(state.get("sorted", {}).get(column, []), dtype=np.int64)
+            for column in spec.numeric
+        }
+        self.sums: dict[str, float] = state.get("sums", dict.fromkeys(spec.numeric, 0.0))
+        self.squares: dict[str, float] = state.get("squares", dict.fromkeys(spec.numeric, 0.0))
+        self.counts: dict[str, dict[str, int]] = state.get(
+            "counts", {column: {} for column in spec.categorical}
+        )
+        self.present: dict[str, int] = state.get("present", dict.fromkeys(spec.presence, 0))
+        self.years: dict[str, dict[str, int]] = state.get("years", {column: {} for column in spec.years})
+
+    def update(self, rows: list[list[Any]], sign: int) -> None:
+        """Add the rows to the aggregates, or remove them if the sign is negative."""
+
+        if not rows:
+            return
+
+        spec = self.spec
+        columns = list(zip(*rows, strict=True))[1:]
+        offset = 0
+
+        self.count += sign * len(rows)
+
+        # Numeric columns are kept sorted, so the quantiles and histograms do not need a full pass
+        for column in spec.numeric:
+            values = np.sort(np.array(columns[offset], dtype=np.int64))
+            self.sums[column] += sign * float(values.sum())
+            self.squares[column] += sign * float(np.square(values, dtype=np.float64).sum())
+
+            current = self.sorted[column]
+            if sign > 0:
+                self.sorted[column] = np.insert(current, np.searchsorted(current, values), values)
+            else:
+                # Equal values need to remove different positions
+                ranks = np.arange(len(values)) - np.searchsorted(values, values)
+                self.sorted[column] = np.delete(current, np.searchsorted(current, values) + ranks)
+
+            offset += 1
+
+        for column in spec.categorical:
+            unique_values, unique_counts = np.unique(
+                [value for value in columns[offset] if value is not None], return_counts=True
+            )
+            merge_counts(self.counts[column], unique_values, unique_counts, sign)
+            offset += 1
+
+        for column in spec.presence:
+            self.present[column] += sign * int(np.count_nonzero(columns[offset]))
+            offset += 1
+
+        for column in spec.years:
+            unique_years, year_counts = np.unique(
+                np.array(columns[offset], dtype=np.int64), return_counts=True
+            )
+            merge_counts(self.years[column], unique_years, year_counts, sign)
+            offset += 1
+
+    def state(self) -> dict[str, Any]:
+        """Get the state of the aggregates that can be stored and updated later."""
+
+        return {
+            "count": self.count,
+            "sorted": self.sorted,
+            "sums": self.sums,
+            "squares": self.squares,
+            "counts": self.counts,
+            "present": self.present,
+            "years": self.years,
+        }
+
+    def summary(self) -> dict[str, Any]:
+        """Get the summary of the group that the notebooks render."""
+
+        return {
+            "count": self.count,
+            "numeric": {column: self.describe(column) for column in self.spec.numeric},
+            "categorical": {
+                column: dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+                for column, counts in self.counts.items()
+            },
+            "presence": {
+                column: {"with": present, "without": self.count - present}
+                for column, present in self.present.items()
+            },
+            "years": {column: dict(sorted(counts.items())) for column, counts in self.years.items()},
+        }
+
+    def describe(self, column: str) -> dict[str, Any]:
+        """Get the description, histogram and threshold counts of the numeric column."""
+
+        values = self.sorted[column]
+        count = len(values)
+
+        if not count:
+            return {"describe": {"count": 0}, "histogram": {"edges": [], "counts": []}, "thresholds": {}}
+
+        mean = self.sums[column] / count
+        variance = (self.squares[column] - count * mean * mean) / (count - 1) if count > 1 else 0.0
+
+        describe = {"count": count, "mean": mean, "std": max(variance, 0.0) ** 0.5, "min": int(values[0])}
+        for quantile in QUANTILES:
+            describe[f"{quantile:.0%}"] = get_quantile(values, quantile)
+        describe["max"] = int(values[-1])
+
+        # The bins match the ones that pandas uses, with the last bin including its right edge
+        first, last = float(values[0]), float(values[-1])
+        if first == last:
+            first, last = first - 0.5, last + 0.5
+        edges = np.linspace(first, last, HISTOGRAM_BINS + 1)
+        counts = np.diff(np.searchsorted(values, edges[1:-1], side="left"), prepend=0, append=count)
+
+        thresholds = {
+            str(threshold): count - int(np.searchsorted(values, threshold, side="right"))
+            for threshold in self.spec.thresholds.get(column, ())
+        }
+
+        return {
+            "describe": describe,
+            "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+            "thresholds": thresholds,
+        }
+
+
+def merge_counts(counts: dict[str, int], values: np.ndarray, amounts: np.ndarray, sign: int) -> None:
+    """Add the amounts of the values to the counts, removing the values that are no longer present."""
+
+    for value, amount in zip(values.tolist(), amounts.tolist(), strict=True):
+        key = str(value)
+        counts[key] = counts.get(key, 0) + sign * amount
+        if not counts[key]:
+            del counts[key]
+
+
+def get_quantile(values: np.ndarray, quantile: float) -> float:
+    """Get the quantile of the sorted values using linear interpolation."""
+
+    position = quantile * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return float(values[lower] + (values[upper] - values[lower]) * (position - lower))
+
+
+@dataclass
+class SummaryStats:
+    added: int = 0
+    """The number of rows that were added to the summary."""
+
+    removed: int = 0
+    """The number of rows that were removed from the summary."""
+
+    changed: int = 0
+    """The number of rows that were updated in the summary."""
+
+    def summary(self) -> str:
+        """Get the human-readable summary of the statistics."""
+
+        return f"Summary: {self.added} added, {self.changed} changed, {self.removed} removed"
+
+
+def summarize_file(path: Path, output: Path, state_path: Path, kind: str) -> SummaryStats:
+    """Update the summary of the data file, only applying the rows that changed since the previous summary."""
+
+    stats = SummaryStats()
+
+    # The data file is only read and compared with the state if it was replaced since the previous summary
+    modified = path.stat()
+    source = {"size": modified.st_size, "modified": modified.st_mtime_ns}
+    if output.exists() and state_path.exists():
+        with output.open("rb") as file:
+            previous_summary = orjson.loads(file.read())
+        if (
+            previous_summary.get("version") == STATE_VERSION
+            and previous_summary.get("kind") == kind
+            and previous_summary.get("source") == source
+        ):
+            return stats
+
+    with path.open("rb") as file:
+        records = orjson.loads(file.read())
+
+    spec = restrict_spec(SPECS[kind], set(records[0]) if records else set())
+    # The columns are compared with the stored state, so they are converted the same way
+    columns = orjson.loads(
+        orjson.dumps({name: value for name, value in asdict(spec).items() if name != "normalizers"})
+    )
+
+    rows = {record["id"]: get_row(spec, record) for record in records}
+    del records
+
+    # The previous state is only reused if it was created for the same kind of data and columns
+    state: dict[str, Any] = {}
+    if state_path.exists():
+        with state_path.open("rb") as file:
+            state = orjson.loads(file.read())
+        if (
+            state.get("version") != STATE_VERSION
+            or state.get("kind") != kind
+            or state.get("columns") != columns
+        ):
+            state = {}
+
+    previous: dict[str, list[Any]] = state.get("rows", {})
+    groups = {name: Aggregates(spec, group) for name, group in state.get("groups", {}).items()}
+
+    # Changed rows are removed with their previous values and added with the new ones
+    removed = [row for id, row in previous.items() if rows.get(int(id)) != row]
+    added = [row for id, row in rows.items() if previous.get(str(id)) != row]
+
+    stats.changed = sum(1 for id, row in rows.items() if str(id) in previous and previous[str(id)] != row)
+    stats.added = len(added) - stats.changed
+    stats.removed = len(removed) - stats.changed
+
+    for sign, changes in ((-1, removed), (1, added)):
+        by_group: dict[str, list[list[Any]]] = {ALL: changes}
+        if spec.group_by:
+            for row in changes:
+                by_group.setdefault(row[0], []).append(row)
+
+        for name, group_rows in by_group.items():
+            groups.setdefault(name, Aggregates(spec)).update(group_rows, sign)
+
+    groups = {name: group for name, group in groups.items() if group.count}
+
+    # Both files are replaced atomically, so they are not corrupted if the stage is interrupted
+    write_atomic(
+        state_path,
+        {
+            "version": STATE_VERSION,
+            "kind": kind,
+            "columns": columns,
+            "rows": rows,
+            "groups": {name: group.state() for name, group in groups.items()},
+        },
+    )
+    write_atomic(
+        output,
+        {
+            "version": STATE_VERSION,
+            "kind": kind,
+            "source": source,
+            "groups": {name: group.summary() for name, group in groups.items()},
+        },
+    )
+
+    return stats
+
+
+def write_atomic(path: Path, data: Any) -> None:
+    """Atomically write the data to the JSON file."""
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    temporary = path.with_name(f"{path.name}.tmp")
+
+    with temporary.open("wb") as file:
+        file.write(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+
+    os.replace(temporary, path)
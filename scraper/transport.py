@@ -0,0 +1,219 @@
+import threading
+import time
+from collections.abc import ItemsView, Mapping
+from contextvars import ContextVar
+from typing import Any, ClassVar
+
+import requests
+import requests.adapters
+from requests.structures import CaseInsensitiveDict
+from github.Requester import Requester
+from urllib3 import Retry
+
+from cache import ResponseCache
+from metrics import Metrics
+from replay import CassetteRecorder
+from scheduler import TokenScheduler, get_resource
+
+_metrics: ContextVar[Metrics | None] = ContextVar("metrics", default=None)
+
+
+class Response:
+    """A response in the format that PyGithub expects."""
+
+    def __init__(self, status: int, headers: Mapping[str, str], text: str) -> None:
+        self.status = status
+        self.headers = headers
+        self.text = text
+
+    def getheaders(self) -> ItemsView[str, str]:
+        return self.headers.items()
+
+    def read(self) -> str:
+        return self.text
+
+
+class Connection:
+    """A thread-safe connection that shares one pooled session per host."""
+
+    # PyGithub stores the pending request on the connection between the `request`
+    # and `getresponse` calls, which mixes up requests when the same client is used
+    # from multiple threads, so we store the pending request per thread instead
+
+    protocol: str
+    default_port: int
+
+    scheduler: TokenScheduler | None = None
+    cache: ResponseCache | None = None
+    metrics: Metrics | None = None
+    recorder: CassetteRecorder | None = None
+
+    _sessions: ClassVar[dict[tuple[str, str, int], requests.Session]] = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(
+        self,
+        host: str,
+        port: int | None = None,
+        strict: bool = False,
+        timeout: int | None = None,
+        retry: int | Retry | None = None,
+        pool_size: int | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self.host = host
+        self.port = port or self.default_port
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+        self.session = self._get_session(retry, pool_size)
+        self.local = threading.local()
+
+    @property
+    def origin(self) -> str:
+        """Get the origin of the requests, as it appears in the URLs of the responses."""
+
+        if self.port == self.default_port:
+            return f"{self.protocol}://{self.host}"
+        return f"{self.protocol}://{self.host}:{self.port}"
+
+    def _get_session(self, retry: int | Retry | None, pool_size: int | None) -> requests.Session:
+        """Get the shared session for this host, creating it if needed."""
+
+        key = (self.protocol, self.host, self.port)
+
+        with self._sessions_lock:
+            if key not in self._sessions:
+                session = requests.Session()
+                session.auth = Requester.noopAuth
+
+                adapter = requests.adapters.HTTPAdapter(
+                    max_retries=requests.adapters.DEFAULT_RETRIES if retry is None else retry,
+                    pool_connections=pool_size or requests.adapters.DEFAULT_POOLSIZE,
+                    pool_maxsize=pool_size or requests.adapters.DEFAULT_POOLSIZE,
+                )
+                session.mount(f"{self.protocol}://", adapter)
+
+                self._sessions[key] = session
+
+            return self._sessions[key]
+
+    def get_metrics(self) -> Metrics | None:
+        """Get the metrics of the current context, such as a job of the daemon, or the installed ones."""
+
+        return _metrics.get() or self.metrics
+
+    def request(self, verb: str, url: str, input: Any, headers: dict[str, str]) -> None:
+        self.local.request = (verb, url, input, headers)
+
+    def getresponse(self) -> Response:
+        verb, url, input, headers = self.local.request
+
+        if not self.cache or verb != "GET":
+            response = self._schedule(verb, url, input, headers)
+            return Response(response.status_code, response.headers, response.text)
+
+        # Make the request conditional if we already have the response
+        key = self.cache.key(f"{self.protocol}://{self.host}:{self.port}{url}", headers)
+        if cached := self.cache.lookup(key):
+            headers = {**headers, **cached.conditional_headers()}
+
+        response = self._schedule(verb, url, input, headers)
+
+        # The response has not changed, so we use the cached body
+        if cached and response.status_code == 304:
+            self.cache.stats.hits += 1
+            self.cache.touch(key)
+
+            # The cassette is replayed without the client cache, so it needs the full response
+            headers = CaseInsensitiveDict({**cached.headers, **response.headers})
+            if self.recorder:
+                self.recorder.record(self.origin, verb, url, input, 200, headers, cached.body.decode())
+
+            return Response(200, headers, cached.body.decode())
+
+        self.cache.stats.misses += 1
+
+        if response.status_code == 200:
+            self.cache.store(key, response.url, response.headers, response.content)
+
+        return Response(response.status_code, response.headers, response.text)
+
+    def _schedule(self, verb: str, url: str, input: Any, headers: dict[str, str]) -> requests.Response:
+        if not self.scheduler:
+            return self._send(verb, url, input, headers)
+
+        resource = get_resource(url.split("?")[0])
+
+        while True:
+            # Route the request to the token with the most headroom
+            token = self.scheduler.acquire(resource)
+            headers = {**headers, "Authorization": f"token {token}"}
+
+            response = self._send(verb, url, input, headers)
+
+            # Rate limited requests are not processed, so they can be retried with another token
+            if not self.scheduler.update(
+                token, resource, response.status_code, response.headers, response.content
+            ):
+                return response
+
+            if metrics := self.get_metrics():
+                metrics.observe_rate_limit(verb, url)
+
+    def _send(self, verb: str, url: str, input: Any, headers: dict[str, str]) -> requests.Response:
+        start = time.perf_counter()
+
+        response = self.session.request(
+            verb,
+            f"{self.protocol}://{self.host}:{self.port}{url}",
+            headers=headers,
+            data=input,
+            timeout=self.timeout,
+            verify=self.verify,
+            allow_redirects=False,
+        )
+
+        if metrics := self.get_metrics():
+            metrics.observe(verb, url, input, response, time.perf_counter() - start)
+        # Conditional responses are recorded with the cached body once it is known
+        if self.recorder and response.status_code != 304:
+            self.recorder.record(
+                self.origin, verb, url, input, response.status_code, response.headers, response.text
+            )
+
+        return response
+
+    def close(self) -> None:
+        # The session is shared with other connections, so we keep it open
+        pass
+
+
+class HTTPConnection(Connection):
+    protocol = "http"
+    default_port = 80
+
+
+class HTTPSConnection(Connection):
+    protocol = "https"
+    default_port = 443
+
+
+def install_transport(
+    scheduler: TokenScheduler | None = None,
+    cache: ResponseCache | None = None,
+    metrics: Metrics | None = None,
+    recorder: CassetteRecorder | None = None,
+) -> None:
+    """Make all PyGithub clients use the thread-safe connections, optionally with the scheduler, cache, metrics and recorder."""
+
+    Connection.scheduler = scheduler
+    Connection.cache = cache
+    Connection.metrics = metrics
+    Connection.recorder = recorder
+    Requester.injectConnectionClasses(HTTPConnection, HTTPSConnection)  # type: ignore[arg-type]
+
+
+def collect_metrics(metrics: Metrics) -> None:
+    """Count the requests of the current context into the metrics instead of the installed ones."""
+
+    _metrics.set(metrics)
@@ -1,18 +1,51 @@
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Literal
+from functools import partial
+from itertools import chain
+from typing import Any, Literal
 
 from github import Github
+from github.NamedUser import NamedUser
 from tqdm import tqdm
 
+from checkpoint import ScrapeState
+from compact import intern_string
+from graphql import BATCH_SIZE, batched, fetch_nodes, parse_datetime
+from hydration import hydrate_reusing, map_ordered
+from metrics import Metrics, phase
+from partition import Window, count_results, plan_windows
+from projection import OMITTED, Fields, Omitted, is_selected
+from refresh import Snapshot
+from sharding import plan_shards
+from store import EntityStore
+
 CHUNK_MARGIN = 50
-CHUNK_SIZE = float("inf")
 
 QueryParam = Literal["followers", "repos"]
 OrderParam = Literal["followers", "repositories"]
-
-
-@dataclass
+Backend = Literal["rest", "graphql"]
+
+SEARCH_FIELDS = frozenset({"id", "type", "username", "url"})
+"""The fields that are included in the search results, so they do not need any other requests."""
+
+USER_FRAGMENT = """
+__typename
+... on User {
+    databaseId login url name websiteUrl email company location isHireable createdAt updatedAt
+    followers { totalCount }
+    following { totalCount }
+    repositories(privacy: PUBLIC, ownerAffiliations: OWNER) { totalCount }
+    gists(privacy: PUBLIC) { totalCount }
+}
+... on Organization {
+    databaseId login url name websiteUrl email location createdAt updatedAt
+    repositories(privacy: PUBLIC, ownerAffiliations: OWNER) { totalCount }
+}
+"""
+
+
+@dataclass(slots=True, frozen=True)
 class User:
     # == Basic Properties
 
@@ -30,44 +63,44 @@ class User:
 
     # == Social Properties
 
-    name: str | None
+    name: str | None | Omitted
     """The account name, if set."""
 
-    homepage: str | None
+    homepage: str | None | Omitted
     """The account homepage, if set."""
 
-    email: str | None
+    email: str | None | Omitted
     """The account email, if set."""
 
-    company: str | None
+    company: str | None | Omitted
     """The account company, if set."""
 
-    location: str | None
+    location: str | None | Omitted
     """The account location, if set."""
 
-    hireable: bool
+    hireable: bool | Omitted
     """Whether the account is hireable."""
 
     # == Dates Properties
 
-    created_at: datetime
+    created_at: datetime | Omitted
     """The time the repository was created."""
 
-    updated_at: datetime
+    updated_at: datetime | Omitted
     """The time the repository was last updated."""
 
     # == Counts Properties
 
-    followers_count: int
+    followers_count: int | Omitted
     """The number of accounts that follow this account."""
 
-    following_count: int
+    following_count: int | Omitted
     """The number of accounts that this account follows."""
 
-    public_repositories_count: int
+    public_repositories_count: int | Omitted
     """The number of public repositories of this account."""
 
-    public_gists_count: int
+    public_gists_count: int | Omitted
     """The number of public gists of this account."""
 
 
@@ -78,88 +111,357 @@ def find_max_value(
 ) -> int:
     """Find the maximum number of followers/repositories any user has."""
 
-    # We start the query from 1000 to make it slightly faster
-    query = github.search_users(query=f"{query_param}:>1000", sort=order_param, order="desc")
+    with phase("probe"):
+        # We start the query from 1000 to make it slightly faster
+        query = github.search_users(query=f"{query_param}:>1000", sort=order_param, order="desc")
+
+        match order_param:
+            case "followers":
+                return int(query[0].followers)
+            case "repositories":
+                return int(query[0].get_repos().totalCount)
+
+
+def build_user(
+    user: NamedUser, public_repositories_count: int | Omitted | None = None, fields: Fields = None
+) -> User:
+    """Build the user from the REST API object, completing it as needed."""
+
+    # Repositories count needs another request, so it is only fetched if not provided
+    if public_repositories_count is None:
+        if is_selected(fields, "public_repositories_count"):
+            with phase("repositories_count"):
+                public_repositories_count = user.get_repos().totalCount
+        else:
+            public_repositories_count = OMITTED
+
+    # Accessing any of the profile properties fetches the whole profile, so they are only accessed if selected
+    def get(name: str, value: Callable[[], Any]) -> Any:
+        return value() if is_selected(fields, name) else OMITTED
+
+    return User(
+        # == Basic Properties
+        id=user.id,
+        type=intern_string(user.type),
+        username=user.login,
+        url=user.html_url,
+        # == Social Properties
+        name=get("name", lambda: user.name or None),
+        homepage=get("homepage", lambda: user.blog or None),
+        email=get("email", lambda: user.email or None),
+        company=get("company", lambda: intern_string(user.company or None)),
+        location=get("location", lambda: intern_string(user.location or None)),
+        hireable=get("hireable", lambda: bool(user.hireable)),
+        # == Dates Properties
+        created_at=get("created_at", lambda: user.created_at),
+        updated_at=get("updated_at", lambda: user.updated_at),
+        # == Counts Properties
+        followers_count=get("followers_count", lambda: user.followers),
+        following_count=get("following_count", lambda: user.following),
+        public_repositories_count=public_repositories_count,
+        public_gists_count=get("public_gists_count", lambda: user.public_gists),
+    )
+
+
+def build_user_graphql(
+    user: NamedUser, node: dict[str, Any], fields: Fields = None, followers_count: int | Omitted | None = None
+) -> User:
+    """Build the user from the GraphQL API node, optionally with the known followers of the organization."""
+
+    is_user = node["__typename"] == "User"
+
+    # GraphQL API does not expose followers of organizations, so we need to use REST API for them
+    if is_user:
+        followers_count = int(node["followers"]["totalCount"])
+    elif followers_count is None:
+        followers_count = user.followers if is_selected(fields, "followers_count") else OMITTED
+
+    return User(
+        # == Basic Properties
+        id=node["databaseId"],
+        type=intern_string(node["__typename"]),
+        username=node["login"],
+        url=node["url"],
+        # == Social Properties
+        name=node["name"] or None,
+        homepage=node["websiteUrl"] or None,
+        email=node["email"] or None,
+        company=intern_string(node["company"] or None) if is_user else None,
+        location=intern_string(node["location"] or None),
+        hireable=bool(node["isHireable"]) if is_user else False,
+        # == Dates Properties
+        created_at=parse_datetime(node["createdAt"]),
+        updated_at=parse_datetime(node["updatedAt"]),
+        # == Counts Properties
+        followers_count=followers_count,
+        following_count=node["following"]["totalCount"] if is_user else 0,
+        public_repositories_count=node["repositories"]["totalCount"],
+        public_gists_count=node["gists"]["totalCount"] if is_user else 0,
+    )
+
+
+def load_user(record: dict[str, Any]) -> User:
+    """Load the complete user from its stored record."""
+
+    return User(
+        **{
+            **record,
+            "type": intern_string(record["type"]),
+            "company": intern_string(record["company"]),
+            "location": intern_string(record["location"]),
+            "created_at": parse_datetime(record["created_at"]),
+            "updated_at": parse_datetime(record["updated_at"]),
+        }
+    )
+
+
+def reuse_stored_user(stored: dict[int, dict[str, Any]], user: NamedUser) -> User | None:
+    """Get the user from the store if it was hydrated within the freshness window."""
+
+    return load_user(stored[user.id]) if user.id in stored else None
+
+
+def reuse_user(user: NamedUser, snapshot: Snapshot | None) -> int | None:
+    """Get the repositories count from the snapshot if it could not have changed since it was taken."""
+
+    if not snapshot or not (previous := snapshot.get(user.id)):
+        return None
+
+    # The previous results may not contain the count if they were scraped with fewer fields
+    if "public_repositories_count" not in previous:
+        return None
+
+    # The profile is needed for other properties anyway, so we can compare its repositories count
+    if user.public_repos == previous["public_repositories_count"]:
+        return int(previous["public_repositories_count"])
+
+    return None
+
+
+def reuse_followers(node: dict[str, Any], snapshot: Snapshot | None) -> int | None:
+    """Get the followers of the organization from the snapshot if its profile was not updated since it was taken."""
+
+    if not snapshot or not (previous := snapshot.get(node["databaseId"])):
+        return None
+
+    # This is only a heuristic, as new followers do not always update the profile
+    if "followers_count" not in previous or "updated_at" not in previous:
+        return None
 
-    match order_param:
-        case "followers":
-            return int(query[0].followers)
-        case "repositories":
-            return int(query[0].get_repos().totalCount)
+    if parse_datetime(previous["updated_at"]) == parse_datetime(node["updatedAt"]):
+        return int(previous["followers_count"])
 
+    return None
 
-def get_top_users(
-    github: Github,
-    order: Literal["followers", "repositories"],
-    amount: int,
+
+def build_user_rest(user: NamedUser, snapshot: Snapshot | None, fields: Fields = None) -> User:
+    """Build the user using REST API, reusing the unchanged repositories count from the snapshot."""
+
+    with phase("completion"):
+        public_repositories_count = None
+        if is_selected(fields, "public_repositories_count"):
+            public_repositories_count = reuse_user(user, snapshot)
+
+        if snapshot:
+            snapshot.record(user.id, reused=public_repositories_count is not None)
+
+        return build_user(user, public_repositories_count, fields)
+
+
+def build_users_graphql(
+    users: list[NamedUser], snapshot: Snapshot | None, fields: Fields = None
 ) -> list[User]:
-    """Get the top users by the specified order."""
+    """Build the batch of users using a single GraphQL API query."""
+
+    # The query is not needed if only the properties from the search results are selected
+    if fields is not None and fields <= SEARCH_FIELDS:
+        return [build_user(user, fields=fields) for user in users]
+
+    # Users that could not be fetched are built using REST API
+    with phase("graphql"):
+        nodes = fetch_nodes(users[0]._requester, USER_FRAGMENT, [user.node_id for user in users])
+
+    # Organizations still need their followers from REST API, unless they were not updated since the snapshot
+    with phase("completion"):
+        built = []
+
+        for user, node in zip(users, nodes, strict=True):
+            followers_count = None
+            if node and node["__typename"] != "User" and is_selected(fields, "followers_count"):
+                followers_count = reuse_followers(node, snapshot)
+
+            if snapshot:
+                snapshot.record(user.id, reused=followers_count is not None)
+
+            built.append(
+                build_user_graphql(user, node, fields, followers_count)
+                if node
+                else build_user(user, fields=fields)
+            )
+
+        return built
+
+
+def hydrate_users(
+    users: Iterable[NamedUser],
+    backend: Backend,
+    workers: int,
+    snapshot: Snapshot | None = None,
+    fields: Fields = None,
+) -> Iterator[User]:
+    """Hydrate the search results into users using the specified backend, preserving their order."""
+
+    match backend:
+        case "rest":
+            build = partial(build_user_rest, snapshot=snapshot, fields=fields)
+            return map_ordered(build, users, workers)
+        case "graphql":
+            build_batch = partial(build_users_graphql, snapshot=snapshot, fields=fields)
+            return chain.from_iterable(map_ordered(build_batch, batched(users, BATCH_SIZE), workers))
+
+
+def get_params(order: Literal["followers", "repositories"]) -> tuple[QueryParam, OrderParam]:
+    """Get the search query and order params for the order, as they are not named consistently."""
 
-    # We need to rename the params correctly as they are not consistent
     query_param: QueryParam = "followers" if order == "followers" else "repos"
     order_param: OrderParam = "followers" if order == "followers" else "repositories"
+    return query_param, order_param
+
+
+def count_users(github: Github, query_param: QueryParam, window: Window) -> int:
+    """Count the users in the window using a single search request."""
+
+    with phase("count"):
+        return count_results(github, "/search/users", window.query(query_param))
+
+
+def search_users(
+    github: Github, query_param: QueryParam, order_param: OrderParam, window: Window
+) -> tuple[Window, list[NamedUser]]:
+    """Get all search results in the window."""
 
-    # The maximum number of stars/forks any user has
-    previous = find_max_value(github, query_param, order_param)
+    with phase("search"):
+        query = github.search_users(window.query(query_param), sort=order_param, order="desc")
+        return window, list(query)
 
-    users: dict[int, User] = {}
 
-    with tqdm(total=amount) as pbar:
+def plan_user_shards(
+    github: Github, order: Literal["followers", "repositories"], amount: int, shards: int
+) -> list[list[tuple[Window, int]]]:
+    """Plan the windows that cover the top users and split them between the shards."""
+
+    query_param, order_param = get_params(order)
+    high = find_max_value(github, query_param, order_param)
+    return plan_shards(partial(count_users, github, query_param), high + CHUNK_MARGIN, amount, shards)
+
+
+def get_top_users(
+    github: Github,
+    order: Literal["followers", "repositories"],
+    amount: int,
+    backend: Backend = "rest",
+    workers: int = 1,
+    state: ScrapeState | None = None,
+    snapshot: Snapshot | None = None,
+    metrics: Metrics | None = None,
+    fields: Fields = None,
+    windows: list[Window] | None = None,
+    store: EntityStore | None = None,
+) -> Iterator[User]:
+    """Get the top users by the specified order, skipping users that were already seen."""
+
+    # The state is updated as users are scraped, so the scrape can be resumed later
+    state = state or ScrapeState()
+
+    query_param, order_param = get_params(order)
+
+    # Start from the maximum number of followers/repositories any user has, unless resuming
+    # Shards start from their highest planned window instead
+    if state.previous is None:
+        if windows is not None:
+            state.previous = max((window.high for window in windows), default=0)
+        else:
+            state.previous = find_max_value(github, query_param, order_param)
+
+    with tqdm(total=amount, initial=len(state.seen)) as pbar:
         # The search API limits the maximum number of results to 1000
-        # To get more results, we need to query the API in smaller chunks
+        # To get more results, we need to query the API in windows that fit within the limit
 
-        while len(users) < amount:
+        while len(state.seen) < amount:
+            # Shards search their planned windows, while other scrapes plan them from the lowest known value
             # We increase this slightly to account for possible increases
-            chunk_max = previous + CHUNK_MARGIN
-            chunk_min = max(chunk_max - CHUNK_SIZE, 1)
+            planned = (
+                windows
+                if windows is not None
+                else plan_windows(
+                    partial(count_users, github, query_param),
+                    state.previous + CHUNK_MARGIN,
+                    amount - len(state.seen),
+                )
+            )
 
-            # Set the progress bar description
-            pbar.set_description(f"Chunk {chunk_min}-{chunk_max}")
+            # Search the windows in parallel, but process them in order
+            searched = map_ordered(partial(search_users, github, query_param, order_param), planned, workers)
+            scraped = 0
 
-            # Query all users in the chunk range
-            query = github.search_users(
-                f"{query_param}:{chunk_min}..{chunk_max}",
-                sort=order_param,
-                order="desc",
-            )
+            for window, results in searched:
+                # Set the progress bar description
+                pbar.set_description(f"Chunk {window}")
+
+                # Skip users that were already seen in previous windows or runs
+                results = [result for result in results if result.id not in state.seen]
+
+                # Users hydrated by any scrape within the freshness window are reused from the store
+                stored = store.get_fresh("users", [result.id for result in results]) if store else {}
 
-            for user in query:
-                # Add the user to the result
-                users[user.id] = User(
-                    # == Basic Properties
-                    id=user.id,
-                    type=user.type,
-                    username=user.login,
-                    url=user.html_url,
-                    # == Social Properties
-                    name=user.name or None,
-                    homepage=user.blog or None,
-                    email=user.email or None,
-                    company=user.company or None,
-                    location=user.location or None,
-                    hireable=bool(user.hireable),
-                    # == Dates Properties
-                    created_at=user.created_at,
-                    updated_at=user.updated_at,
-                    # == Counts Properties
-                    followers_count=user.followers,
-                    following_count=user.following,
-                    public_repositories_count=user.get_repos().totalCount,
-                    public_gists_count=user.public_gists,
+                # Hydrate the users from the window
+                hydrated = hydrate_reusing(
+                    results,
+                    partial(reuse_stored_user, stored),
+                    partial(
+                        hydrate_users, backend=backend, workers=workers, snapshot=snapshot, fields=fields
+                    ),
                 )
 
-                # Update the lowest known user
-                match order:
-                    case "followers":
-                        previous = min(previous, user.followers)
-                    case "repositories":
-                        previous = min(previous, user.get_repos().totalCount)
+                for user, reused in hydrated:
+                    # The search results may contain duplicates across pages
+                    if user.id in state.seen:
+                        continue
+
+                    # Reused users are complete, while hydrated ones are only stored if all fields were selected
+                    if store and (reused or fields is None):
+                        store.put("users", user, reused)
+                    if snapshot and reused:
+                        snapshot.record(user.id, reused=True)
+
+                    # Add the user to the result
+                    state.seen.add(user.id)
+                    scraped += 1
+
+                    # Update the lowest known user
+                    match order:
+                        case "followers":
+                            value = user.followers_count
+                        case "repositories":
+                            value = user.public_repositories_count
+
+                    # Omitted counts are not known, so the lowest value of the window is used instead
+                    state.previous = min(state.previous, window.low if value is OMITTED else value)
+
+                    # Update the progress bar, optionally with the live request statistics
+                    pbar.update(len(state.seen) - pbar.n)
+                    if metrics:
+                        pbar.set_postfix_str(metrics.postfix(), refresh=False)
+
+                    yield user
 
-                # Update the progress bar
-                pbar.update(len(users) - pbar.n)
+                    # Stop if we are done
+                    if len(state.seen) == amount:
+                        return
 
-                # Break if we are done
-                if len(users) == amount:
-                    break
+                if store:
+                    store.commit()
 
-    return list(users.values())
+            # Stop if there are no more users to scrape, or the shard searched all its windows
+            if not scraped or windows is not None:
+                return
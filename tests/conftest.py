@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The scraper modules import each other by their names, as they are run as scripts from their directory
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("scraper")))
@@ -0,0 +1,66 @@
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from cache import ResponseCache
+
+URL = "https://api.github.com/repos/octocat/hello-world"
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> Iterator[ResponseCache]:
+    cache = ResponseCache(tmp_path / "http.sqlite", scope="token", max_size=10)
+    yield cache
+    cache.database.close()
+
+
+def test_revalidate(cache: ResponseCache) -> None:
+    key = cache.key(URL, {"Accept": "application/json"})
+    cache.store(key, URL, {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, b"{}")
+
+    cached = cache.lookup(key)
+
+    assert cached is not None
+    assert cached.body == b"{}"
+    assert cached.conditional_headers() == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+
+
+def test_keys(cache: ResponseCache, tmp_path: Path) -> None:
+    other = ResponseCache(tmp_path / "other.sqlite", scope="other token")
+
+    # Responses depend on the token and the requested media type, besides the URL
+    assert cache.key(URL, {"Accept": b"application/json"}) == cache.key(URL, {"Accept": "application/json"})
+    assert cache.key(URL, {"Accept": "application/json"}) != cache.key(URL, {"Accept": "text/html"})
+    assert cache.key(URL, {}) != other.key(URL, {})
+
+    other.database.close()
+
+
+def test_without_validators(cache: ResponseCache) -> None:
+    key = cache.key(URL, {})
+    cache.store(key, URL, {"Content-Type": "application/json"}, b"{}")
+
+    assert cache.lookup(key) is None
+    assert cache.stats.stored == 0
+
+
+def test_evict(cache: ResponseCache) -> None:
+    keys = [cache.key(f"{URL}/{index}", {}) for index in range(4)]
+    for index, key in enumerate(keys):
+        cache.store(key, f"{URL}/{index}", {"ETag": str(index)}, b"1234")
+
+    # The least recently used responses above the size limit and the expired ones are evicted
+    cache.database.execute("UPDATE responses SET accessed_at = 0 WHERE key = ?", (keys[3],))
+    cache.database.execute(
+        "UPDATE responses SET stored_at = ? WHERE key = ?", (time.time() - 2 * cache.max_age, keys[2])
+    )
+    cache.touch(keys[0])
+    cache.evict()
+
+    assert [cache.lookup(key) is not None for key in keys] == [True, True, False, False]
+    assert cache.stats.evicted == 2
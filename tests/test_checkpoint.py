@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import orjson
+import pytest
+
+from checkpoint import ScrapeState, compact_stream, load_checkpoint, save_checkpoint
+
+METADATA = {"kind": "repositories", "order": "stars", "amount": 10}
+
+
+def test_resume(tmp_path: Path) -> None:
+    stream, checkpoint = tmp_path / "stream.jsonl", tmp_path / "checkpoint.json"
+    stream.write_bytes(b'{"id":1}\n{"id":2}\n')
+    save_checkpoint(checkpoint, ScrapeState(previous=500, seen={1}), METADATA)
+
+    # Records written after the checkpoint are still seen, as they are read from the stream
+    state = load_checkpoint(stream, checkpoint, METADATA)
+
+    assert state == ScrapeState(previous=500, seen={1, 2})
+    assert not checkpoint.with_name("checkpoint.json.tmp").exists()
+
+
+@pytest.mark.parametrize(
+    "tail", [b'{"id":3', b'{"id":3}', b"{not json}\n"], ids=["partial", "unterminated", "invalid"]
+)
+def test_incomplete_line(tmp_path: Path, tail: bytes) -> None:
+    stream, checkpoint = tmp_path / "stream.jsonl", tmp_path / "checkpoint.json"
+    stream.write_bytes(b'{"id":1}\n{"id":2}\n' + tail)
+    save_checkpoint(checkpoint, ScrapeState(previous=500), METADATA)
+
+    state = load_checkpoint(stream, checkpoint, METADATA)
+
+    assert state.seen == {1, 2}
+    assert stream.read_bytes() == b'{"id":1}\n{"id":2}\n'
+
+
+def test_missing_stream(tmp_path: Path) -> None:
+    checkpoint = tmp_path / "checkpoint.json"
+    save_checkpoint(checkpoint, ScrapeState(previous=500), METADATA)
+
+    assert load_checkpoint(tmp_path / "stream.jsonl", checkpoint, METADATA) == ScrapeState()
+
+
+def test_different_scrape(tmp_path: Path) -> None:
+    stream, checkpoint = tmp_path / "stream.jsonl", tmp_path / "checkpoint.json"
+    stream.write_bytes(b'{"id":1}\n')
+    save_checkpoint(checkpoint, ScrapeState(previous=500), METADATA)
+
+    with pytest.raises(ValueError):
+        load_checkpoint(stream, checkpoint, {**METADATA, "amount": 20})
+
+
+def test_compact_stream(tmp_path: Path) -> None:
+    stream, output = tmp_path / "stream.jsonl", tmp_path / "output.json"
+    stream.write_bytes(b'{"id":1,"name":"a"}\n{"id":2,"name":"b"}\n')
+    output.write_bytes(b"[]\n")
+
+    compact_stream(stream, output)
+
+    assert orjson.loads(output.read_bytes()) == [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["output.json", "stream.jsonl"]
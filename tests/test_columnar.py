@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import orjson
+import pyarrow as pa
+import pyarrow.feather as feather
+import pytest
+
+from columnar import get_arrow_schema, write_columnar
+from projection import parse_fields
+from repositories import Repository
+from users import User
+
+
+@pytest.mark.parametrize("record_type", [User, Repository], ids=["users", "repositories"])
+def test_schema(record_type: type) -> None:
+    schema = get_arrow_schema(record_type)
+
+    assert schema.field("id").type == pa.int64()
+    assert schema.metadata is None
+
+
+def test_write_projected(tmp_path: Path) -> None:
+    fields = parse_fields("location,followers_count,created_at", User)
+    stream = tmp_path.joinpath("users.jsonl")
+    stream.write_bytes(
+        orjson.dumps(
+            {"id": 1, "location": "Ljubljana", "followers_count": 5, "created_at": "2020-01-02T03:04:05Z"}
+        )
+        + b"\n"
+        + orjson.dumps(
+            {"id": 2, "location": None, "followers_count": 0, "created_at": "2021-01-01T00:00:00Z"}
+        )
+        + b"\n"
+    )
+
+    output = tmp_path.joinpath("users.feather")
+    write_columnar(stream, output, User, "feather", fields)
+    table = feather.read_table(output)
+
+    assert table.column_names == ["id", "location", "created_at", "followers_count"]
+    assert table.column("location").to_pylist() == ["Ljubljana", None]
+    assert table.column("followers_count").type == pa.int64()
+    assert b"username" in table.schema.metadata[b"omitted"]
@@ -0,0 +1,60 @@
+import sqlite3
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+import orjson
+import pytest
+
+import history
+from history import add_snapshot, encode_record, load_state
+
+
+def write(path: Path, records: list[dict[str, Any]]) -> Path:
+    path.write_bytes(orjson.dumps(records))
+    return path
+
+
+def get_state(path: Path) -> dict[int, dict[str, bytes]]:
+    database = sqlite3.connect(path)
+    try:
+        return load_state(database)
+    finally:
+        database.close()
+
+
+def test_keyframes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(history, "KEYFRAME_INTERVAL", 3)
+    database = tmp_path / "history.db"
+
+    snapshots = [
+        [{"id": 1, "stars": 10, "topics": ["a"]}, {"id": 2, "stars": 5}],
+        [{"id": 1, "stars": 11, "topics": ["a"]}, {"id": 2, "stars": 5}, {"id": 3, "stars": 1}],
+        [{"id": 1, "stars": 12}, {"id": 3, "stars": 1}],
+        [{"id": 1, "stars": 12}, {"id": 3, "stars": 2}],
+        [{"id": 1, "stars": 13}, {"id": 2, "stars": 6}, {"id": 3, "stars": 2}],
+    ]
+
+    stats = []
+    for day, records in enumerate(snapshots, start=1):
+        stats.append(add_snapshot(write(tmp_path / f"{day}.json", records), database, date(2024, 1, day)))
+
+        # The latest snapshot is always reconstructed exactly
+        assert get_state(database) == {record["id"]: encode_record(record) for record in records}
+
+    assert [stat.keyframe for stat in stats] == [True, False, False, True, False]
+    assert [(stat.added, stat.removed) for stat in stats] == [(2, 0), (1, 0), (0, 1), (0, 0), (1, 0)]
+
+    # Deltas only store the changed values, the removed fields and the removed entities
+    assert [stat.changes for stat in stats] == [3, 2, 3, 2, 2]
+
+
+def test_out_of_order(tmp_path: Path) -> None:
+    database = tmp_path / "history.db"
+    path = write(tmp_path / "data.json", [{"id": 1, "stars": 10}])
+    add_snapshot(path, database, date(2024, 1, 2))
+
+    with pytest.raises(ValueError):
+        add_snapshot(path, database, date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        add_snapshot(path, database, date(2024, 1, 2))
@@ -0,0 +1,106 @@
+import sqlite3
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import orjson
+import pytest
+
+from index import parse_query, query_index, update_index
+
+RECORDS = [
+    {"id": 1, "stargazers_count": 30, "language": "Python", "topics": ["cli"], "license": "MIT"},
+    {"id": 2, "stargazers_count": 20, "language": "Rust", "topics": ["cli", "tui"], "license": "MIT"},
+    {"id": 3, "stargazers_count": 10, "language": "Python", "topics": [], "license": None},
+    {"id": 4, "stargazers_count": 40, "language": None, "topics": ["docs"], "license": "Apache-2.0"},
+]
+
+
+@pytest.fixture
+def database() -> Iterator[sqlite3.Connection]:
+    database = sqlite3.connect(":memory:")
+    yield database
+    database.close()
+
+
+def write(path: Path, records: list[dict[str, Any]]) -> Path:
+    path.write_bytes(orjson.dumps(records))
+    return path
+
+
+def find(database: sqlite3.Connection, expression: str, limit: int = 10) -> list[int]:
+    return [record["id"] for record in query_index(database, expression, "stargazers_count", limit).records]
+
+
+def test_quoted_values() -> None:
+    tree, terms = parse_query('language:"Jupyter Notebook" OR NOT languages:"Vim Script" topic:cli')
+
+    assert tree == (
+        "OR",
+        "language:jupyter notebook",
+        ("AND", ("NOT", "languages:vim script"), "topic:cli"),
+    )
+    assert terms == {"language:jupyter notebook", "languages:vim script", "topic:cli"}
+
+
+def test_quoted_parentheses() -> None:
+    tree, _ = parse_query('(license:"Other (custom)")')
+
+    assert tree == "license:other (custom)"
+
+
+@pytest.mark.parametrize(
+    "expression", ['language:"Jupyter Notebook', 'language:""', "language:Jupyter Notebook"]
+)
+def test_invalid_values(expression: str) -> None:
+    with pytest.raises(ValueError):
+        parse_query(expression)
+
+
+@pytest.mark.parametrize(
+    ("expression", "ids"),
+    [
+        ("language:python", [1, 3]),
+        ("topic:cli language:rust", [2]),
+        ("topic:cli OR license:apache-2.0", [4, 1, 2]),
+        ("NOT topic:cli", [4, 3]),
+        ("NOT (language:python OR language:rust)", [4]),
+        ('language:"Python" NOT license:mit', [3]),
+        ("topic:missing", []),
+    ],
+)
+def test_query(database: sqlite3.Connection, tmp_path: Path, expression: str, ids: list[int]) -> None:
+    update_index(write(tmp_path / "data.json", RECORDS), database)
+
+    assert find(database, expression) == ids
+
+
+def test_limit(database: sqlite3.Connection, tmp_path: Path) -> None:
+    update_index(write(tmp_path / "data.json", RECORDS), database)
+    result = query_index(database, "NOT topic:docs", "stargazers_count", 2)
+
+    assert result.matches == 3
+    assert [record["id"] for record in result.records] == [1, 2]
+
+
+def test_update(database: sqlite3.Connection, tmp_path: Path) -> None:
+    path = write(tmp_path / "data.json", RECORDS)
+    stats = update_index(path, database)
+    assert (stats.added, stats.changed, stats.removed) == (4, 0, 0)
+
+    # Unchanged data files are not read again
+    assert update_index(path, database).terms == 0
+
+    records = [
+        {**RECORDS[0], "topics": []},
+        RECORDS[1],
+        {"id": 5, "stargazers_count": 50, "language": "Rust", "topics": ["cli"], "license": None},
+        RECORDS[3],
+    ]
+    stats = update_index(write(path, records), database)
+
+    assert (stats.added, stats.changed, stats.removed) == (1, 1, 1)
+    assert find(database, "topic:cli") == [5, 2]
+    assert find(database, "language:python") == [1]
+    assert find(database, "NOT language:rust") == [4, 1]
+    assert query_index(database, "topic:docs OR topic:cli", "stargazers_count", 10).matches == 3
@@ -0,0 +1,32 @@
+from dataclasses import fields
+from pathlib import Path
+
+import pytest
+
+from manual import Repository, parse_repository, parse_repository_soup
+
+PAGES = sorted(Path(__file__).parent.joinpath("pages").glob("*.html"))
+"""The saved repository pages that both parsers are compared on."""
+
+
+@pytest.mark.parametrize("path", PAGES, ids=[path.stem for path in PAGES])
+def test_parsers_match(path: Path) -> None:
+    html = path.read_text(encoding="utf-8")
+
+    expected = parse_repository_soup(path.name, html)
+    actual = parse_repository(path.name, html)
+
+    for field in fields(Repository):
+        assert getattr(actual, field.name) == getattr(expected, field.name), field.name
+
+
+def test_counter_without_title() -> None:
+    path = Path(__file__).parent.joinpath("pages").joinpath("psf-requests.html")
+    html = path.read_text(encoding="utf-8").replace(' title="52,011"', "")
+
+    # Both parsers reject the counters without their exact values
+    with pytest.raises(KeyError):
+        parse_repository_soup(path.name, html)
+
+    with pytest.raises(KeyError):
+        parse_repository(path.name, html)
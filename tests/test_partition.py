@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+from partition import GITHUB_FOUNDED, SEARCH_LIMIT, Window, find_window, plan_windows, split_by_created
+
+Entity = tuple[int, date]
+
+
+def get_population(amount: int) -> list[Entity]:
+    """Get the entities with a long tail of values, where the low values are shared by many entities."""
+
+    return [
+        (max(100_000 // (rank + 1), 1), GITHUB_FOUNDED + timedelta(days=rank % 5000))
+        for rank in range(amount)
+    ]
+
+
+class Search:
+    """A search over the entities which counts the results of every window and records the counted windows."""
+
+    def __init__(self, entities: list[Entity]) -> None:
+        self.entities = entities
+        self.counted: list[Window] = []
+
+    def __call__(self, window: Window) -> int:
+        self.counted.append(window)
+        return sum(
+            window.low <= value <= window.high
+            and (not window.created or window.created[0] <= created <= window.created[1])
+            for value, created in self.entities
+        )
+
+
+def test_windows_cover_amount() -> None:
+    entities = get_population(6000)
+    count = Search(entities)
+    windows = list(plan_windows(count, 100_000, 5000))
+
+    # The windows are disjoint and ordered from the highest values downwards
+    for previous, window in zip(windows, windows[1:]):
+        assert window.high < previous.low or (window.low, window.high) == (previous.low, previous.high)
+
+    assert all(count(window) <= SEARCH_LIMIT for window in windows)
+    assert sum(count(window) for window in windows) >= 5000
+
+
+def test_guess_skips_search() -> None:
+    entities = [(value, GITHUB_FOUNDED) for value in range(1, 10_001)]
+    count = Search(entities)
+
+    window, total = find_window(count, 10_000, guess=9_001)
+
+    assert window == Window(9_001, 10_000)
+    assert total == SEARCH_LIMIT
+    assert count.counted == [Window(9_001, 10_000)]
+
+
+def test_dense_value_split_by_created() -> None:
+    # More entities share the same value than a single search returns
+    entities = [(7, GITHUB_FOUNDED + timedelta(days=day)) for day in range(2500)]
+    count = Search(entities)
+
+    window, total = find_window(count, 7)
+    assert window == Window(7, 7)
+    assert total > SEARCH_LIMIT
+
+    splits = list(split_by_created(count, window, GITHUB_FOUNDED, GITHUB_FOUNDED + timedelta(days=3000)))
+
+    assert all(found <= SEARCH_LIMIT for _, found in splits)
+    assert sum(found for _, found in splits) == len(entities)
+
+    # The ranges of dates are contiguous, so no entity is counted twice
+    ranges = [split.created for split, _ in splits if split.created]
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert start == end + timedelta(days=1)
+
+    assert "created:" in splits[0][0].query("stars")
+
+
+def test_single_day_is_truncated() -> None:
+    entities = [(3, date(2020, 1, 1))] * (SEARCH_LIMIT + 10)
+    count = Search(entities)
+
+    splits = list(split_by_created(count, Window(3, 3), date(2020, 1, 1), date(2020, 1, 1)))
+
+    assert splits == [(Window(3, 3, (date(2020, 1, 1), date(2020, 1, 1))), SEARCH_LIMIT + 10)]
@@ -0,0 +1,42 @@
+import time
+
+from scheduler import TokenScheduler, get_resource
+
+
+def test_most_headroom() -> None:
+    scheduler = TokenScheduler(["a", "b"])
+    reset = str(time.time() + 3600)
+
+    scheduler.update("a", "core", 200, {"x-ratelimit-remaining": "10", "x-ratelimit-reset": reset}, b"")
+    scheduler.update("b", "core", 200, {"x-ratelimit-remaining": "12", "x-ratelimit-reset": reset}, b"")
+
+    # The acquired requests are reserved, so the tokens are used alternately once they are level
+    assert [scheduler.acquire("core") for _ in range(4)] == ["b", "b", "a", "b"]
+    assert scheduler.remaining("core") == 18
+
+
+def test_resources_are_separate() -> None:
+    scheduler = TokenScheduler(["a", "b"])
+    reset = str(time.time() + 3600)
+
+    scheduler.update("a", "search", 200, {"x-ratelimit-remaining": "0", "x-ratelimit-reset": reset}, b"")
+
+    assert scheduler.acquire("search") == "b"
+    assert scheduler.remaining("core") == float("inf")
+    assert get_resource("https://api.github.com/search/repositories") == "search"
+
+
+def test_rate_limited() -> None:
+    scheduler = TokenScheduler(["a", "b"])
+    reset = str(time.time() + 3600)
+
+    limited = scheduler.update(
+        "a", "core", 403, {"x-ratelimit-remaining": "0", "x-ratelimit-reset": reset}, b""
+    )
+    assert limited
+    assert scheduler.acquire("core") == "b"
+
+    # Secondary rate limits block the token even though its budget is not exhausted
+    assert scheduler.update("b", "core", 429, {"retry-after": "60"}, b"")
+    assert not scheduler.update("b", "core", 404, {}, b"")
+    assert scheduler.budget("b", "core").blocked_until > time.time() + 30
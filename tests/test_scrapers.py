@@ -0,0 +1,75 @@
+import threading
+from collections.abc import Iterator
+from itertools import islice
+from pathlib import Path
+
+import orjson
+import pytest
+from github import Github
+
+from checkpoint import CHECKPOINT_INTERVAL, ScrapeState, load_checkpoint, save_checkpoint
+from replay import create_server
+from repositories import get_top_repositories
+from users import get_top_users
+
+POPULATION = 2000
+"""The number of entities of each kind in the synthetic population."""
+
+
+@pytest.fixture(scope="module")
+def github() -> Iterator[Github]:
+    # The synthetic population is served locally, so the scrapers run without the network or tokens
+    server = create_server(0, None, POPULATION)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield Github(base_url=f"http://127.0.0.1:{server.server_port}", per_page=100, seconds_between_requests=0)
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_repositories(github: Github) -> None:
+    repositories = list(get_top_repositories(github, "stars", 250))
+    stars = [repository.stargazers_count for repository in repositories]
+
+    assert len({repository.id for repository in repositories}) == 250
+    assert stars == sorted(stars, reverse=True)
+
+
+def test_users(github: Github) -> None:
+    users = list(get_top_users(github, "followers", 150))
+    followers = [user.followers_count for user in users]
+
+    assert len({user.id for user in users}) == 150
+    assert followers == sorted(followers, reverse=True)
+
+
+def test_resume(github: Github, tmp_path: Path) -> None:
+    stream, checkpoint = tmp_path / "stream.jsonl", tmp_path / "checkpoint.json"
+    metadata = {"command": "repositories", "order": "stars"}
+    amount = 2 * CHECKPOINT_INTERVAL + 50
+
+    # The scrape is interrupted after the checkpoint, while writing a record
+    state = ScrapeState()
+    with stream.open("ab") as file:
+        for index, record in enumerate(
+            islice(get_top_repositories(github, "stars", amount, state=state), 150), 1
+        ):
+            file.write(orjson.dumps(record) + b"\n")
+            if index % CHECKPOINT_INTERVAL == 0:
+                file.flush()
+                save_checkpoint(checkpoint, state, metadata)
+        file.write(b'{"id":')
+
+    state = load_checkpoint(stream, checkpoint, metadata)
+    assert len(state.seen) == 150
+
+    with stream.open("ab") as file:
+        for record in get_top_repositories(github, "stars", amount, state=state):
+            file.write(orjson.dumps(record) + b"\n")
+
+    resumed = [orjson.loads(line)["id"] for line in stream.read_bytes().splitlines()]
+    expected = [repository.id for repository in get_top_repositories(github, "stars", amount)]
+
+    assert sorted(resumed) == sorted(expected)
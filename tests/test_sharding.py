@@ -0,0 +1,83 @@
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+import orjson
+import pytest
+
+from partition import SEARCH_LIMIT, Window
+from sharding import ShardPlan, load_plan, merge_shards, plan_shards, save_manifest, save_plan
+
+
+def count(window: Window) -> int:
+    # Every value from 1 to 100,000 is shared by ten entities
+    return (window.high - window.low + 1) * 10
+
+
+def write_shard(path: Path, plan: Path, index: int, records: list[dict[str, Any]]) -> None:
+    path.write_bytes(orjson.dumps(records))
+    save_manifest(path.with_suffix(".manifest.json"), plan, index)
+
+
+def test_plan(tmp_path: Path) -> None:
+    shards = plan_shards(count, 100_000, 5000, 3)
+    windows = [window for shard in shards for window, _ in shard]
+
+    assert len(shards) == 3
+    assert all(found == count(window) <= SEARCH_LIMIT for shard in shards for window, found in shard)
+    assert sum(found for shard in shards for _, found in shard) >= 5000
+    assert len({value for window in windows for value in range(window.low, window.high + 1)}) == sum(
+        window.high - window.low + 1 for window in windows
+    )
+
+    path = tmp_path / "plan.json"
+    plan = ShardPlan("repositories-by-stars", 5000, None, shards)
+    plan.shards[0][0] = (Window(5, 5, (date(2020, 1, 1), date(2020, 6, 30))), 10)
+    save_plan(path, plan)
+
+    assert load_plan(path) == plan
+
+
+def test_merge(tmp_path: Path) -> None:
+    plan = tmp_path / "plan.json"
+    save_plan(
+        plan, ShardPlan("repositories-by-stars", 3, None, [[(Window(11, 20), 2)], [(Window(1, 10), 2)]])
+    )
+
+    # The second shard finished later, so its copy of the duplicated record is kept
+    write_shard(
+        tmp_path / "1.json", plan, 1, [{"id": 1, "stargazers_count": 20}, {"id": 2, "stargazers_count": 11}]
+    )
+    write_shard(
+        tmp_path / "2.json", plan, 2, [{"id": 2, "stargazers_count": 12}, {"id": 3, "stargazers_count": 5}]
+    )
+
+    stream = tmp_path / "merged.jsonl"
+    stats = merge_shards(plan, lambda index: tmp_path / f"{index}.json", stream)
+
+    assert [orjson.loads(line) for line in stream.read_bytes().splitlines()] == [
+        {"id": 1, "stargazers_count": 20},
+        {"id": 2, "stargazers_count": 12},
+        {"id": 3, "stargazers_count": 5},
+    ]
+    assert (stats.shards, stats.records, stats.duplicates, stats.written) == (2, 4, 1, 3)
+
+
+def test_unfinished_shard(tmp_path: Path) -> None:
+    plan = tmp_path / "plan.json"
+    save_plan(
+        plan, ShardPlan("repositories-by-stars", 3, None, [[(Window(11, 20), 2)], [(Window(1, 10), 2)]])
+    )
+    write_shard(tmp_path / "1.json", plan, 1, [{"id": 1, "stargazers_count": 20}])
+
+    with pytest.raises(ValueError, match="has not finished"):
+        merge_shards(plan, lambda index: tmp_path / f"{index}.json", tmp_path / "merged.jsonl")
+
+    # Shards of a previous plan cannot be merged with the new ones
+    write_shard(tmp_path / "2.json", plan, 2, [{"id": 2, "stargazers_count": 5}])
+    save_plan(
+        plan, ShardPlan("repositories-by-stars", 4, None, [[(Window(11, 20), 2)], [(Window(1, 10), 2)]])
+    )
+
+    with pytest.raises(ValueError, match="different plan"):
+        merge_shards(plan, lambda index: tmp_path / f"{index}.json", tmp_path / "merged.jsonl")
@@ -0,0 +1,81 @@
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import orjson
+import pytest
+
+from store import MAX_VARIABLES, EntityStore
+
+
+@dataclass
+class Record:
+    id: int
+    stargazers_count: int
+    forks_count: int = 0
+    name: str = ""
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> EntityStore:
+    return EntityStore(tmp_path / "store.db", freshness=60)
+
+
+def age(store: EntityStore, id: int, seconds: float) -> None:
+    store.database.execute("UPDATE repositories SET fetched_at = ? WHERE id = ?", (time.time() - seconds, id))
+
+
+def test_fresh(store: EntityStore) -> None:
+    store.put("repositories", Record(1, 10, name="fresh"))
+    store.put("repositories", Record(2, 20, name="stale"))
+    age(store, 2, 120)
+
+    assert store.get_fresh("repositories", [1, 2, 3]) == {
+        1: {"id": 1, "stargazers_count": 10, "forks_count": 0, "name": "fresh"}
+    }
+    assert (store.stats.reused, store.stats.stored) == (0, 2)
+
+
+def test_reused_keeps_fetched_at(store: EntityStore) -> None:
+    store.put("repositories", Record(1, 10))
+    age(store, 1, 120)
+
+    # Reused records update their cheap properties, but are not considered freshly hydrated
+    store.put("repositories", Record(1, 15), reused=True)
+    assert store.get_fresh("repositories", [1]) == {}
+
+    store.put("repositories", Record(1, 16))
+    assert store.get_fresh("repositories", [1])[1]["stargazers_count"] == 16
+    assert (store.stats.reused, store.stats.stored) == (1, 2)
+
+
+def test_many_ids(store: EntityStore) -> None:
+    for id in range(1, 3 * MAX_VARIABLES + 2):
+        store.put("repositories", Record(id, id))
+
+    fresh = store.get_fresh("repositories", list(range(1, 3 * MAX_VARIABLES + 10)))
+
+    assert sorted(fresh) == list(range(1, 3 * MAX_VARIABLES + 2))
+
+
+def test_export(store: EntityStore, tmp_path: Path) -> None:
+    for id, stars, forks in [(1, 10, 3), (2, 30, 1), (3, 20, 2), (4, 40, 0)]:
+        store.put("repositories", Record(id, stars, forks))
+    age(store, 4, 120)
+
+    output = tmp_path / "output.json"
+
+    assert store.export("repositories", "stargazers_count", 2, output) == 2
+    assert [record["id"] for record in orjson.loads(output.read_bytes())] == [2, 3]
+
+    assert store.export("repositories", "forks_count", 10, output) == 3
+    assert [record["id"] for record in orjson.loads(output.read_bytes())] == [1, 3, 2]
+
+    # Stale records are only exported when requested
+    assert store.export("repositories", "stargazers_count", 10, output, stale=True) == 4
+    assert [record["id"] for record in orjson.loads(output.read_bytes())] == [4, 2, 3, 1]
+
+
+def test_unknown_column(store: EntityStore, tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        store.export("repositories", "name", 10, tmp_path / "output.json")
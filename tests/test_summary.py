@@ -0,0 +1,66 @@
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from summary import ALL, summarize_file
+
+
+def get_user(id: int, followers: int, type: str = "User", company: str | None = None) -> dict[str, Any]:
+    return {
+        "id": id,
+        "type": type,
+        "followers_count": followers,
+        "following_count": id % 7,
+        "company": company,
+        "location": "Prague" if id % 2 else None,
+        "created_at": f"{2010 + id % 5}-01-01T00:00:00+00:00",
+    }
+
+
+def write(path: Path, records: list[dict[str, Any]]) -> Path:
+    path.write_bytes(orjson.dumps(records))
+    return path
+
+
+def read(path: Path) -> Any:
+    return orjson.loads(path.read_bytes())["groups"]
+
+
+def test_incremental(tmp_path: Path) -> None:
+    users = [get_user(id, 1000 * id, company="@github" if id % 3 else "Microsoft") for id in range(1, 21)]
+    users[4]["type"] = "Organization"
+
+    path, output, state = tmp_path / "users.json", tmp_path / "summary.json", tmp_path / "state.json"
+    stats = summarize_file(write(path, users), output, state, "users")
+    assert (stats.added, stats.changed, stats.removed) == (20, 0, 0)
+
+    # Unchanged data files are not read again
+    assert summarize_file(path, output, state, "users").added == 0
+
+    # A user changes its followers and moves to the other group, another one is replaced by a new user
+    users[0] = get_user(1, 99_000, type="Organization", company="GitHub")
+    users[7] = get_user(21, 500)
+    stats = summarize_file(write(path, users), output, state, "users")
+    assert (stats.added, stats.changed, stats.removed) == (1, 1, 1)
+
+    # The updated summary is the same as the summary of the data file from scratch
+    fresh = tmp_path / "fresh.json"
+    summarize_file(path, fresh, tmp_path / "fresh-state.json", "users")
+    assert read(output) == read(fresh)
+    assert read(output)["Organization"]["count"] == 2
+
+
+def test_different_columns(tmp_path: Path) -> None:
+    path, output, state = tmp_path / "users.json", tmp_path / "summary.json", tmp_path / "state.json"
+    summarize_file(write(path, [get_user(id, id) for id in range(1, 6)]), output, state, "users")
+
+    # The state of other columns is not reused, so the removed column is not summarized anymore
+    users = [
+        {key: value for key, value in get_user(id, id).items() if key != "company"} for id in range(1, 6)
+    ]
+    stats = summarize_file(write(path, users), output, state, "users")
+
+    assert stats.added == 5
+    assert "company" not in read(output)[ALL]["categorical"]
+    assert "company" not in read(output)[ALL]["presence"]